@@ -1,14 +1,66 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from models.recommender import Recommender
-from fastapi.responses import HTMLResponse
+from utils.embeddings import BACKEND_ID, get_embedding_async, get_model_stats, warm_up
+from utils.embedding_store import EmbeddingStore
+from utils.bounded_executor import BoundedExecutor, ExecutorOverloaded
+from utils.metrics import REGISTRY, span, process_metrics
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi import Request
+from contextlib import asynccontextmanager, contextmanager
+from typing import List
+import asyncio
 import json
+import os
 
-app = FastAPI()
-recommender = Recommender('data/products.json')
+@asynccontextmanager
+async def lifespan(app):
+    # Load the model off the request path unless EMBEDDING_WARM_UP=0
+    if os.environ.get('EMBEDDING_WARM_UP', '1') != '0':
+        warm_up(background=True)
+    yield
+    executor.shutdown()
+    recommender.close()
+    embedding_store.close()
+
+app = FastAPI(lifespan=lifespan)
+embedding_store = EmbeddingStore('data/embedding_cache', BACKEND_ID)
+# Product embeddings may be held as float16 or int8; RECOMMENDER_RERANK top
+# candidates are then rescored with the float32 vectors in embedding_store
+recommender = Recommender(
+    'data/products.json',
+    embedding_store=embedding_store,
+    precision=os.environ.get('RECOMMENDER_PRECISION', 'float32'),
+    rerank=int(os.environ.get('RECOMMENDER_RERANK', 0)),
+)
+# Hot-reload products.json edits, re-embedding only new or changed products
+_reload_interval = float(os.environ.get('CATALOGUE_RELOAD_INTERVAL', 2.0))
+if _reload_interval > 0:
+    recommender.start_watching(_reload_interval)
+
+# Scoring and blocking I/O run here rather than on the event loop; encoding
+# is awaited on the micro-batching scheduler without holding a worker
+executor = BoundedExecutor(
+    max_workers=int(os.environ.get('RECOMMEND_WORKERS', min(32, (os.cpu_count() or 1) + 4))),
+    max_pending=int(os.environ.get('RECOMMEND_MAX_PENDING', 64)),
+)
+# Conversations per /recommend/batch request; larger batches get a 422
+MAX_BATCH_SIZE = int(os.environ.get('RECOMMEND_MAX_BATCH', 128))
+
+def _collect_app_metrics():
+    executor_stats = executor.get_stats()
+    store_stats = embedding_store.get_stats()
+    return process_metrics() + [
+        ('executor_pending_requests', 'gauge', 'Requests admitted and not finished', executor_stats['pending']),
+        ('executor_rejected_total', 'counter', 'Requests rejected with 503', executor_stats['rejected']),
+        ('embedding_store_entries', 'gauge', 'Vectors in the persistent embedding store', store_stats['entries']),
+        ('embedding_store_hits_total', 'counter', 'Embedding store hits', store_stats['hits']),
+        ('embedding_store_misses_total', 'counter', 'Embedding store misses', store_stats['misses']),
+    ]
+
+REGISTRY.register_collector('app', _collect_app_metrics)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
@@ -16,37 +68,110 @@ templates = Jinja2Templates(directory="templates")
 class RecommendRequest(BaseModel):
     conversation: list
 
+class BatchRecommendRequest(BaseModel):
+    conversations: List[List[str]] = Field(max_length=MAX_BATCH_SIZE)
+    top_k: int = 5
+
 class BoostRequest(BaseModel):
     product_id: int
     boost: float
 
+class BulkBoostRequest(BaseModel):
+    boosts: List[BoostRequest]
+
+class FileCache:
+    """JSON file contents cached until the file's mtime changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._data = None
+        self._lock = asyncio.Lock()
+
+    async def get(self):
+        mtime = os.path.getmtime(self.path)
+        if mtime != self._mtime:
+            async with self._lock:
+                if mtime != self._mtime:
+                    self._data = await asyncio.to_thread(self._read)
+                    self._mtime = mtime
+        return self._data
+
+    def _read(self):
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+sample_conversations_file = FileCache('data/conversations.json')
+
+@contextmanager
+def admitted():
+    try:
+        with executor.admit():
+            yield
+    except ExecutorOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": "1"})
+
 @app.post('/recommend')
-def recommend(req: RecommendRequest):
-    session_text = ' '.join(req.conversation)
-    # Simple category extraction
-    category = None
-    for msg in req.conversation:
-        for cat in set([p['category'] for p in recommender.products]):
-            if cat.lower() in msg.lower():
-                category = cat
-                break
-    results = recommender.recommend(session_text, category)
+async def recommend(req: RecommendRequest):
+    with admitted():
+        session_text = ' '.join(req.conversation)
+        category = recommender.extract_category(req.conversation)
+        with span('request_encode'):
+            session_emb = await get_embedding_async(session_text)
+        results = await executor.run(
+            recommender.recommend_for_embedding, session_emb, session_text, category
+        )
+    return {"recommendations": results}
+
+@app.post('/recommend/batch')
+async def recommend_batch(req: BatchRecommendRequest):
+    with admitted():
+        session_texts = [' '.join(conversation) for conversation in req.conversations]
+        categories = [recommender.extract_category(conversation) for conversation in req.conversations]
+        results = await executor.run(recommender.recommend_many, session_texts, categories, req.top_k)
     return {"recommendations": results}
 
 @app.post('/seller/boost')
-def seller_boost(req: BoostRequest):
-    recommender.update_seller_boost(req.product_id, req.boost)
+async def seller_boost(req: BoostRequest):
+    with admitted():
+        await executor.run(recommender.update_seller_boost, req.product_id, req.boost)
     return {"status": "success"}
 
+@app.post('/seller/boost/bulk')
+async def seller_boost_bulk(req: BulkBoostRequest):
+    with admitted():
+        boosts = {item.product_id: item.boost for item in req.boosts}
+        unknown = await executor.run(recommender.update_seller_boosts, boosts)
+    return {"status": "success", "updated": len(boosts) - len(unknown), "unknown_ids": unknown}
+
+@app.post('/catalogue/reload')
+async def reload_catalogue():
+    with admitted():
+        summary = await executor.run(recommender.reload)
+    return {"status": "success", **summary}
+
 @app.get('/products')
-def get_products():
+async def get_products():
     return recommender.get_products()
 
 @app.get("/", response_class=HTMLResponse)
-def index(request: Request):
+async def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @app.get("/sample_conversations")
-def sample_conversations():
-    with open('data/conversations.json', 'r') as f:
-        return json.load(f)
+async def sample_conversations():
+    return await sample_conversations_file.get()
+
+@app.get("/executor_stats")
+async def executor_stats():
+    return executor.get_stats()
+
+@app.get("/health")
+async def health():
+    # Answers while the model is still loading; "model.loaded" tells when it is ready
+    return {"status": "ok", "model": get_model_stats(), "products": len(recommender.products)}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus text format: stage latencies, encoder batches, caches, catalogue and memory
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -1,40 +1,268 @@
+import os
 import json
+import hashlib
+import logging
+import threading
 import numpy as np
 from utils.embeddings import get_embedding, get_embeddings
-from utils.scoring import cosine_similarity, compute_score, normalize
+from utils.scoring import compute_scores, normalize_array
+from utils.category_matcher import CategoryMatcher
+from utils.boost_log import BoostLog
+from utils.metrics import REGISTRY, span
+from utils.quantization import check_precision, quantize_rows, dequantize_rows, quantized_scores, STORAGE_DTYPES
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_SYNONYMS_PATH = 'data/category_synonyms.json'
+
+class Catalogue:
+    """One immutable snapshot of the products and their scoring arrays.
+
+    Requests read self.catalogue once and use that snapshot throughout, so a
+    reload can swap in a new one without locks on the read path.
+    """
+
+    def __init__(self, products, texts, content_hashes, embedding_codes, embedding_scales):
+        self.products = products
+        self.texts = texts
+        self.content_hashes = content_hashes
+        # Normalized embeddings, stored as float32, float16 or scaled int8 codes
+        self.embedding_codes = embedding_codes
+        self.embedding_scales = embedding_scales
+        # Columnar copies of the scoring inputs so recommend() is one vectorized expression
+        self.stock = np.array([p['stock'] for p in products], dtype=np.float64)
+        self.pop = normalize_array([p['popularity'] for p in products])
+        self.stock_score = normalize_array(self.stock)
+        self.recency = normalize_array([p['recency'] for p in products])
+        self.personal = normalize_array([p['personal'] for p in products])
+        self.seller_boost = np.array([p.get('seller_boost', 0.0) for p in products], dtype=np.float64)
+        self.row_by_id = {p['id']: row for row, p in enumerate(products)}
+        # Category -> product rows, so filtered requests only touch their subset
+        category_rows = {}
+        for row, product in enumerate(products):
+            category_rows.setdefault(product['category'].lower(), []).append(row)
+        self.category_index = {category: np.array(rows, dtype=np.int64) for category, rows in category_rows.items()}
+        self.category_matcher = CategoryMatcher.from_file(
+            sorted({p['category'] for p in products}), CATEGORY_SYNONYMS_PATH
+        )
 
 class Recommender:
-    def __init__(self, products_path):
-        with open(products_path, 'r') as f:
-            self.products = json.load(f)
-        self.product_texts = [p['title'] + ' ' + p['description'] for p in self.products]
-        self.product_embeddings = get_embeddings(self.product_texts)
+    def __init__(self, products_path, embedding_store=None, boost_log=None, precision='float32', rerank=0):
+        # precision: product embedding storage ('float32', 'float16' or 'int8')
+        # rerank: rescore this many top candidates with float32 vectors from
+        # embedding_store when precision is reduced (0 disables it)
+        self.products_path = products_path
+        self.embedding_store = embedding_store
+        self.precision = check_precision(precision)
+        self.rerank = rerank
+        self.boost_log = boost_log if boost_log is not None else BoostLog(products_path)
+        self.catalogue = None
+        self._mtime = None
+        self._lock = threading.Lock()  # serializes reloads and boost writes
+        self._watcher = None
+        self._stop_watching = threading.Event()
+        self.reloads = 0
+        self.reload()
+        REGISTRY.register_collector('recommender', self._collect_metrics)
+
+    @property
+    def products(self):
+        return self.catalogue.products
+
+    @property
+    def product_embeddings(self):
+        # Normalized, and dequantized when stored at reduced precision
+        return dequantize_rows(self.catalogue.embedding_codes, self.catalogue.embedding_scales)
+
+    def reload(self):
+        """Re-read products_path, re-embedding only new or changed products.
+
+        Returns {'added', 'changed', 'removed', 'encoded'} counts. In-flight
+        requests keep the snapshot they started with.
+        """
+        with span('reload'):
+            return self._reload()
+
+    def _reload(self):
+        mtime = _mtime(self.products_path)
+        with open(self.products_path, 'r') as f:
+            products = json.load(f)
+        texts = [p['title'] + ' ' + p['description'] for p in products]
+        hashes = [hashlib.sha1(text.encode('utf-8')).digest() for text in texts]
+
+        old = self.catalogue
+        reused, old_rows = [], []
+        if old is not None:
+            for row, product in enumerate(products):
+                old_row = old.row_by_id.get(product['id'])
+                if old_row is not None and old.content_hashes[old_row] == hashes[row]:
+                    reused.append(row)
+                    old_rows.append(old_row)
+        reused_set = set(reused)
+        todo = [row for row in range(len(products)) if row not in reused_set]
+        encoded = np.empty((0, 0), dtype=np.float32)
+        if todo:
+            todo_texts = [texts[row] for row in todo]
+            if self.embedding_store is not None:
+                # Warm start: only products whose text changed are re-encoded
+                encoded = self.embedding_store.get_embeddings(todo_texts, get_embeddings)
+            else:
+                encoded = get_embeddings(todo_texts)
+            encoded = _unit_rows(np.asarray(encoded, dtype=np.float32).reshape(len(todo), -1))
+
+        # Unchanged products keep their stored codes, new ones are quantized
+        dimension = encoded.shape[1] if todo else (old.embedding_codes.shape[1] if old is not None else 0)
+        codes = np.zeros((len(products), dimension), dtype=STORAGE_DTYPES[self.precision])
+        scales = np.ones(len(products), dtype=np.float32) if self.precision == 'int8' else None
+        if reused:
+            codes[reused] = old.embedding_codes[old_rows]
+            if scales is not None:
+                scales[reused] = old.embedding_scales[old_rows]
+        if todo:
+            new_codes, new_scales = quantize_rows(encoded, self.precision)
+            codes[todo] = new_codes
+            if scales is not None:
+                scales[todo] = new_scales
+
+        with self._lock, self.boost_log._file_lock():
+            # Boosts logged but not yet compacted into products_path, read
+            # under the lock so none applied during the reload are lost. A
+            # compaction since the read folded the log into products_path and
+            # truncated it, so take the boosts from the file as it is now.
+            if _mtime(self.products_path) != mtime:
+                with open(self.products_path, 'r') as f:
+                    current = {p['id']: p['seller_boost'] for p in json.load(f) if 'seller_boost' in p}
+                for product in products:
+                    if product['id'] in current:
+                        product['seller_boost'] = current[product['id']]
+            logged = self.boost_log.replay()
+            for product in products:
+                if product['id'] in logged:
+                    product['seller_boost'] = logged[product['id']]
+            self.catalogue = Catalogue(products, texts, hashes, codes, scales)
+            self._mtime = mtime
+            self.reloads += 1
+
+        old_ids = set(old.row_by_id) if old is not None else set()
+        new_ids = {p['id'] for p in products}
+        summary = {
+            'added': len(new_ids - old_ids),
+            'changed': len(todo) - len(new_ids - old_ids),
+            'removed': len(old_ids - new_ids),
+            'encoded': len(todo),
+        }
+        if old is not None:
+            logger.info(f'Reloaded {self.products_path}: {summary}')
+        return summary
+
+    def reload_if_changed(self):
+        """Reload when products_path's mtime moved; cheap enough to poll."""
+        if _mtime(self.products_path) == self._mtime:
+            return None
+        return self.reload()
+
+    def start_watching(self, interval=2.0):
+        """Poll products_path in a daemon thread and hot-reload on change."""
+        if self._watcher is not None:
+            return
+        def watch():
+            while not self._stop_watching.wait(interval):
+                try:
+                    self.reload_if_changed()
+                except Exception as e:  # e.g. a half-edited file; keep serving the old one
+                    logger.warning(f'Catalogue reload failed: {e}')
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=watch, name='catalogue-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._stop_watching.set()
+            self._watcher.join()
+            self._watcher = None
+
+    def extract_category(self, conversation):
+        return self.catalogue.category_matcher.extract(conversation)
 
     def recommend(self, session_text, category=None, top_k=5):
-        session_emb = get_embedding(session_text)
-        candidates = []
-        for idx, product in enumerate(self.products):
-            if product['stock'] <= 0:
-                continue
-            if category and product['category'].lower() != category.lower():
+        with span('encode'):
+            session_emb = get_embedding(session_text)
+        return self.recommend_for_embedding(session_emb, session_text, category, top_k)
+
+    def recommend_for_embedding(self, session_emb, session_text, category=None, top_k=5):
+        # Scoring only, for callers that encoded session_text themselves
+        catalogue = self.catalogue
+        rows = _candidate_rows(catalogue, category)
+        if len(rows) == 0:
+            return []
+        query = _unit(np.asarray(session_emb, dtype=np.float32))
+        with span('score'):
+            sims = self._similarities(catalogue, rows, query, category)
+            rounded = np.round(_score(catalogue, sims, rows, category), 2)
+        with span('format'):
+            return self._format(catalogue, rows, rounded, session_text, top_k)
+
+    def recommend_many(self, session_texts, categories=None, top_k=5):
+        # One encoder batch and one matrix-matrix product per category group
+        session_texts = list(session_texts)
+        if not session_texts:
+            return []
+        categories = list(categories) if categories is not None else [None] * len(session_texts)
+        with span('batch_encode'):
+            session_embs = np.asarray(get_embeddings(session_texts), dtype=np.float32)
+        queries = np.stack([_unit(emb) for emb in session_embs], axis=1)
+
+        catalogue = self.catalogue
+        results = [[] for _ in session_texts]
+        by_category = {}
+        for col, category in enumerate(categories):
+            by_category.setdefault(category.lower() if category else None, []).append(col)
+        for category, cols in by_category.items():
+            rows = _candidate_rows(catalogue, category)
+            if len(rows) == 0:
                 continue
-            sim = normalize(cosine_similarity(session_emb, self.product_embeddings[idx]))
-            cat_match = 1.0 if category and product['category'].lower() == category.lower() else 0.5
-            pop = normalize(product['popularity'])
-            stock = normalize(product['stock'])
-            recency = normalize(product['recency'])
-            personal = normalize(product['personal'])
-            seller_boost = product.get('seller_boost', 0.0)
-            score = compute_score(sim, cat_match, pop, stock, recency, personal, seller_boost)
-            candidates.append({
-                'id': product['id'],
-                'title': product['title'],
-                'category': product['category'],
-                'score': float(round(score, 2)),  # Ensure score is a native float
-                'reason': self._reason(session_text, product)
-            })
-        candidates.sort(key=lambda x: x['score'], reverse=True)
-        return candidates[:top_k]
+            with span('batch_score'):
+                sims = self._similarities(catalogue, rows, queries[:, cols], category)
+                rounded = np.round(_score(catalogue, sims, rows, category), 2)
+            for j, col in enumerate(cols):
+                results[col] = self._format(catalogue, rows, rounded[:, j], session_texts[col], top_k)
+        return results
+
+    def _similarities(self, catalogue, rows, queries, category):
+        # Cosine similarity of candidate rows with a (d,) query or (d, m) queries
+        scales = catalogue.embedding_scales[rows] if catalogue.embedding_scales is not None else None
+        sims = quantized_scores(catalogue.embedding_codes[rows], scales, queries)
+        if self.rerank and self.precision != 'float32' and self.embedding_store is not None:
+            with span('rerank'):
+                sims = self._rerank(catalogue, rows, sims, queries, category)
+        return sims
+
+    def _rerank(self, catalogue, rows, sims, queries, category):
+        # Exact float32 similarities for the best candidates of each query,
+        # read from the embedding store instead of kept in memory
+        scores = _score(catalogue, sims, rows, category)
+        if len(rows) > self.rerank:
+            top = np.unique(np.argpartition(-scores, self.rerank - 1, axis=0)[:self.rerank])
+        else:
+            top = np.arange(len(rows))
+        store = self.embedding_store
+        vectors = store.lookup([store.key(catalogue.texts[row]) for row in rows[top]])
+        found = [i for i, vector in enumerate(vectors) if vector is not None]
+        if found:
+            exact = _unit_rows(np.stack([vectors[i] for i in found]).astype(np.float32)) @ queries
+            sims = sims.copy()
+            sims[top[found]] = exact
+        return sims
+
+    def _format(self, catalogue, rows, rounded, session_text, top_k):
+        products = catalogue.products
+        return [{
+            'id': products[rows[pos]]['id'],
+            'title': products[rows[pos]]['title'],
+            'category': products[rows[pos]]['category'],
+            'score': float(rounded[pos]),  # Ensure score is a native float
+            'reason': self._reason(session_text, products[rows[pos]])
+        } for pos in _top_k_stable(rounded, top_k)]
 
     def _reason(self, session_text, product):
         if 'running' in session_text.lower() and 'shoes' in product['title'].lower():
@@ -46,11 +274,84 @@ class Recommender:
         return f"Relevant to your interest in {product['category'].lower()} products."
 
     def update_seller_boost(self, product_id, boost):
-        for product in self.products:
-            if product['id'] == product_id:
-                product['seller_boost'] = boost
-        with open('data/products.json', 'w') as f:
-            json.dump(self.products, f, indent=2)
+        return self.update_seller_boosts({product_id: boost})
+
+    def update_seller_boosts(self, boosts):
+        """Apply {product_id: boost} in place and log them; returns unknown ids."""
+        boosts = dict(boosts)
+        with self._lock:
+            catalogue = self.catalogue
+            unknown = [product_id for product_id in boosts if product_id not in catalogue.row_by_id]
+            known = {product_id: float(boost) for product_id, boost in boosts.items() if product_id in catalogue.row_by_id}
+            if known:
+                rows = np.fromiter((catalogue.row_by_id[product_id] for product_id in known), dtype=np.int64, count=len(known))
+                catalogue.seller_boost[rows] = np.fromiter(known.values(), dtype=np.float64, count=len(known))
+                for product_id, boost in known.items():
+                    catalogue.products[catalogue.row_by_id[product_id]]['seller_boost'] = boost
+                self.boost_log.append(known)
+        return unknown
+
+    def _collect_metrics(self):
+        catalogue = self.catalogue
+        return [
+            ('recommender_products', 'gauge', 'Products in the loaded catalogue', len(catalogue.products)),
+            ('recommender_products_in_stock', 'gauge', 'Products with stock > 0', int((catalogue.stock > 0).sum())),
+            ('recommender_embedding_bytes', 'gauge', 'Bytes of stored product embeddings',
+             catalogue.embedding_codes.nbytes),
+            ('recommender_reloads_total', 'counter', 'Catalogue loads, including the first', self.reloads),
+        ]
+
+    def close(self):
+        self.stop_watching()
+        self.boost_log.close()
 
     def get_products(self):
-        return self.products
+        return self.catalogue.products
+
+def _candidate_rows(catalogue, category):
+    if category:
+        rows = catalogue.category_index.get(category.lower())
+        if rows is None:
+            return np.empty(0, dtype=np.int64)
+        return rows[catalogue.stock[rows] > 0]
+    return np.flatnonzero(catalogue.stock > 0)
+
+def _score(catalogue, sims, rows, category):
+    # sims is (len(rows),) for one session or (len(rows), sessions)
+    def column(values):
+        return values[rows] if sims.ndim == 1 else values[rows, None]
+    # Candidates all match the category filter, so cat_match is uniform
+    cat_match = 1.0 if category else 0.5
+    return compute_scores(
+        normalize_array(sims), cat_match, column(catalogue.pop), column(catalogue.stock_score),
+        column(catalogue.recency), column(catalogue.personal), column(catalogue.seller_boost)
+    )
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _unit_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _unit(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def _top_k_stable(scores, k):
+    # Indices of the k highest scores, ties broken by position exactly like a
+    # stable descending sort, without sorting the whole array
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if len(scores) > k:
+        kth = -np.partition(-scores, k - 1)[k - 1]
+        better = np.flatnonzero(scores > kth)
+        tied = np.flatnonzero(scores == kth)[:k - len(better)]
+        candidates = np.sort(np.concatenate([better, tied]))
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class BoostLog:
+    """Append-only log of seller boost changes for a products file.
+
+    Each boost call appends one JSON line ({"id", "boost"}) instead of
+    rewriting the catalogue. The log is folded back into the products file
+    once compact_every entries have accumulated, or compact_interval seconds
+    after the first uncompacted change, whichever comes first. Compaction
+    re-reads the products file under a file lock, applies the log, writes a
+    temp file and renames it over the original, so concurrent writers never
+    lose updates and readers never see a partial file.
+    """
+
+    def __init__(self, products_path, log_path=None, compact_every=1000, compact_interval=5.0):
+        self.products_path = Path(products_path)
+        self.log_path = Path(log_path) if log_path else self.products_path.with_suffix('.boosts.jsonl')
+        self.lock_path = self.log_path.with_name(f'{self.log_path.name}.lock')
+        self.compact_every = compact_every
+        self.compact_interval = compact_interval
+        self._pending = 0
+        self._timer = None
+        self._mutex = threading.Lock()
+        self.appended = 0
+        self.compactions = 0
+
+    @contextmanager
+    def _file_lock(self):
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def replay(self):
+        """Latest logged boost per product id, for changes not compacted yet."""
+        boosts = {}
+        try:
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn final line from a crash mid-append
+                    boosts[entry['id']] = entry['boost']
+        except FileNotFoundError:
+            pass
+        return boosts
+
+    def append(self, boosts):
+        """Log {product_id: boost} changes; compaction is scheduled, not run inline."""
+        if not boosts:
+            return
+        data = ''.join(json.dumps({'id': product_id, 'boost': boost}) + '\n'
+                       for product_id, boost in boosts.items())
+        with self._file_lock():
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        with self._mutex:
+            self.appended += len(boosts)
+            self._pending += len(boosts)
+            due = self._pending >= self.compact_every
+            if not due and self._timer is None:
+                self._timer = threading.Timer(self.compact_interval, self.compact)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.compact()
+
+    def compact(self):
+        """Fold the log into the products file and truncate it."""
+        with self._mutex:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending = 0
+        with self._file_lock():
+            boosts = self.replay()
+            if not boosts:
+                return
+            started = time.perf_counter()
+            with open(self.products_path, 'r') as f:
+                products = json.load(f)
+            for product in products:
+                if product['id'] in boosts:
+                    product['seller_boost'] = boosts[product['id']]
+
+            tmp_path = self.products_path.with_name(f'{self.products_path.name}.{os.getpid()}.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(products, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.products_path)
+            # Only after the products file holds every logged change
+            open(self.log_path, 'w').close()
+            self.compactions += 1
+            logger.info(f'Compacted {len(boosts)} seller boosts into {self.products_path} '
+                        f'in {(time.perf_counter() - started) * 1000:.1f}ms')
+
+    def close(self):
+        self.compact()
+
+    def get_stats(self):
+        with self._mutex:
+            return {
+                'appended': self.appended,
+                'pending': self._pending,
+                'compactions': self.compactions,
+                'log_path': str(self.log_path),
+            }
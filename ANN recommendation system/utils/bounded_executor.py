@@ -0,0 +1,58 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorOverloaded(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """Thread pool for CPU-heavy request work with a hard admission limit.
+
+    At most max_workers tasks run at once. Requests enter through admit(),
+    which allows at most max_pending requests in flight; beyond that it
+    fails fast with ExecutorOverloaded so the server sheds load instead of
+    queueing unboundedly and letting tail latency grow.
+    """
+
+    def __init__(self, max_workers, max_pending):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='recommend')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @contextmanager
+    def admit(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ExecutorOverloaded(f'More than {self.max_pending} pending requests')
+        with self._lock:
+            self._pending += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, lambda: func(*args, **kwargs))
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'rejected': self.rejected,
+            }
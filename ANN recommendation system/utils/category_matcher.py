@@ -0,0 +1,111 @@
+import json
+from collections import deque
+
+# Arabic article and clitics written joined to the word they precede
+# ("للشعر", "بالبشرة"); a synonym after one of them still starts a word
+ARABIC_PREFIXES = frozenset(('ال', 'لل', 'بال', 'وال', 'فال', 'كال', 'ب', 'ل', 'و'))
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: one pass over the text finds every
+    occurrence of every pattern."""
+
+    def __init__(self, patterns):
+        # patterns: {pattern: value}
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [[]]
+        for pattern, value in patterns.items():
+            if pattern:
+                self._add(pattern, value)
+        self._build_failure_links()
+
+    def _add(self, pattern, value):
+        node = 0
+        for char in pattern:
+            if char not in self._goto[node]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+                self._goto[node][char] = len(self._goto) - 1
+            node = self._goto[node][char]
+        self._outputs[node].append((len(pattern), value))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                if self._fail[child] == child:
+                    self._fail[child] = 0
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+
+    def finditer(self, text):
+        """Yield (start, end, value) for every match, in order of end position."""
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, value in self._outputs[node]:
+                yield end - length, end, value
+
+
+class CategoryMatcher:
+    """Finds product categories mentioned in a conversation, by name or by
+    Arabic/French/English synonym, in a single pass."""
+
+    def __init__(self, categories, synonyms=None):
+        patterns = {}
+        for category in categories:
+            patterns[category.lower()] = category
+        by_lower = {category.lower(): category for category in categories}
+        for category, words in (synonyms or {}).items():
+            if category.lower() not in by_lower:
+                continue  # no products in this category
+            for word in words:
+                patterns.setdefault(word.lower(), by_lower[category.lower()])
+        self._automaton = AhoCorasick(patterns)
+
+    @classmethod
+    def from_file(cls, categories, synonyms_path):
+        try:
+            with open(synonyms_path, 'r', encoding='utf-8') as f:
+                synonyms = json.load(f)
+        except FileNotFoundError:
+            synonyms = {}
+        return cls(categories, synonyms)
+
+    def extract(self, conversation):
+        """Category mentioned last in the conversation, or None.
+
+        Only whole words count: "montrer" does not mention "montre". An
+        Arabic article or clitic may precede the word ("للشعر").
+        """
+        text = '\n'.join(conversation).lower()
+        category = None
+        for start, end, value in self._automaton.finditer(text):
+            if not _starts_word(text, start) or _is_word_char(text, end):
+                continue
+            category = value
+        return category
+
+
+def _starts_word(text, start):
+    """Whether text[start:] begins a word, after an Arabic prefix or not."""
+    word_start = start
+    while _is_word_char(text, word_start - 1):
+        word_start -= 1
+    return word_start == start or text[word_start:start] in ARABIC_PREFIXES
+
+
+def _is_word_char(text, index):
+    if index < 0 or index >= len(text):
+        return False
+    char = text[index]
+    return char.isalnum() or char == '_'
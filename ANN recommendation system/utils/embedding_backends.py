@@ -0,0 +1,171 @@
+import os
+import re
+import hashlib
+import unicodedata
+import numpy as np
+from functools import lru_cache
+from pathlib import Path
+from utils.lazy_model import LazyModel
+
+DEFAULT_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+class HashingEmbedder:
+    """Deterministic embedder that needs no model files or downloads.
+
+    Words and character n-grams are hashed with a seeded blake2b into
+    dimension signed buckets (feature hashing, i.e. a sparse random
+    projection of the bag of features), then L2-normalized. Texts sharing
+    words or spellings get similar vectors, which is enough for offline
+    tests, load generation and reproducible benchmarks; it is not a
+    semantic model.
+    """
+
+    def __init__(self, dimension=384, seed=0, ngram_sizes=(3, 4), ngram_weight=0.5):
+        self.dimension = dimension
+        self.seed = seed
+        self.ngram_sizes = tuple(ngram_sizes)
+        self.ngram_weight = ngram_weight
+        sizes = '-'.join(str(size) for size in self.ngram_sizes)
+        self.identity = f'hashing-d{dimension}-s{seed}-n{sizes}-w{ngram_weight}'
+        self.model_name = self.identity
+        self._bucket = lru_cache(maxsize=1 << 18)(self._hash)
+
+    available = True
+    loaded = True
+
+    def _hash(self, feature):
+        digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8, key=str(self.seed).encode()).digest()
+        value = int.from_bytes(digest, 'little')
+        return value % self.dimension, 1.0 if value >> 63 else -1.0
+
+    def _features(self, text):
+        # Accents and Arabic diacritics are dropped, so "crème" matches "creme"
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn').casefold()
+        for word in re.findall(r'\w+', text):
+            yield word, 1.0
+            padded = f' {word} '
+            for size in self.ngram_sizes:
+                for start in range(len(padded) - size + 1):
+                    yield padded[start:start + size], self.ngram_weight
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                column, sign = self._bucket(feature)
+                vectors[row, column] += sign * weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def get(self):
+        return self
+
+    def warm_up(self, background=False):
+        return None
+
+    def get_stats(self):
+        return {
+            'backend': self.identity,
+            'model_name': self.model_name,
+            'loaded': True,
+            'load_seconds': 0.0,
+            'error': None,
+            'bucket_cache': self._bucket.cache_info()._asdict(),
+        }
+
+
+class OnnxEncoder:
+    """Sentence embeddings from an ONNX export of a transformer encoder.
+
+    Expects tokenizer.json next to the model file (as written by optimum's
+    ONNX export), mean-pools the token embeddings over the attention mask
+    and L2-normalizes, like the all-MiniLM-L6-v2 SentenceTransformer
+    pipeline. A dynamically quantized export (e.g. model_quantized.onnx)
+    runs several times faster on CPU.
+    """
+
+    def __init__(self, model_dir, file_name='model.onnx', max_length=256, batch_size=32, threads=None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+        model_dir = Path(model_dir)
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(str(model_dir / 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            str(model_dir / file_name), options, providers=['CPUExecutionProvider']
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def encode(self, texts, **kwargs):
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + self.batch_size])
+            ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+            mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+            feeds = {'input_ids': ids, 'attention_mask': mask}
+            if 'token_type_ids' in self.input_names:
+                feeds['token_type_ids'] = np.zeros_like(ids)
+            tokens = self.session.run(None, feeds)[0]
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (tokens * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+            batches.append(pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12))
+        if not batches:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(batches).astype(np.float32)
+
+
+def sentence_transformer_backend(model_name=DEFAULT_MODEL_NAME):
+    # Identity is the bare model name, so existing embedding stores stay valid
+    return LazyModel(model_name)
+
+
+def onnx_backend(model_dir, file_name='model.onnx', max_length=256, threads=None):
+    model_dir = Path(model_dir)
+    return LazyModel(
+        str(model_dir),
+        loader=lambda path: OnnxEncoder(path, file_name, max_length, threads=threads),
+        identity=f'onnx:{model_dir.name}/{file_name}',
+        requires=('onnxruntime', 'tokenizers'),
+    )
+
+
+BACKENDS = {
+    'sentence-transformers': sentence_transformer_backend,
+    'onnx': onnx_backend,
+    'hashing': HashingEmbedder,
+}
+
+
+def create_backend(name='sentence-transformers', **params):
+    """Build an embedding backend; all share encode(texts) -> (n, d) float32."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}', expected one of {list(BACKENDS)}")
+    return BACKENDS[name](**params)
+
+
+def backend_from_env():
+    """Backend selected by EMBEDDING_BACKEND and its EMBEDDING_* settings."""
+    name = os.environ.get('EMBEDDING_BACKEND', 'sentence-transformers')
+    if name == 'hashing':
+        return create_backend(
+            name,
+            dimension=int(os.environ.get('EMBEDDING_DIMENSION', 384)),
+            seed=int(os.environ.get('EMBEDDING_SEED', 0)),
+        )
+    if name == 'onnx':
+        threads = os.environ.get('EMBEDDING_ONNX_THREADS')
+        return create_backend(
+            name,
+            model_dir=os.environ.get('EMBEDDING_ONNX_PATH', 'data/onnx/all-MiniLM-L6-v2'),
+            file_name=os.environ.get('EMBEDDING_ONNX_FILE', 'model.onnx'),
+            threads=int(threads) if threads else None,
+        )
+    return create_backend(name, model_name=os.environ.get('EMBEDDING_MODEL', DEFAULT_MODEL_NAME))
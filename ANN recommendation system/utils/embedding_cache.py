@@ -0,0 +1,114 @@
+import time
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+from collections import OrderedDict
+
+ENTRY_OVERHEAD = 128  # approximate bytes per entry beyond the vector itself
+
+
+def normalize_text(text):
+    return ' '.join(unicodedata.normalize('NFKC', text).split())
+
+
+class EmbeddingCache:
+    """Thread-safe LRU cache of embeddings keyed by backend + normalized text hash.
+
+    Entries are evicted least-recently-used first once their total size
+    exceeds max_bytes, and ignored after ttl seconds when a ttl is set.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=None, namespace=''):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.namespace = namespace  # embedding backend identity
+        self._entries = OrderedDict()  # key -> (vector, stored_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, text):
+        return hashlib.sha1(f'{self.namespace}\0{normalize_text(text)}'.encode('utf-8')).digest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, vector):
+        vector = np.array(vector, dtype=np.float32)
+        vector.flags.writeable = False
+        size = vector.nbytes + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (vector, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        vector, _ = self._entries.pop(key)
+        self._bytes -= vector.nbytes + ENTRY_OVERHEAD
+
+    def lookup(self, texts):
+        """Split texts into cached vectors and distinct misses.
+
+        Returns (keys, vectors with None for misses, {key: text} of misses).
+        """
+        keys = [self.key(text) for text in texts]
+        vectors = [self.get(key) for key in keys]
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        return keys, vectors, missing
+
+    def fill(self, keys, vectors, missing, encoded):
+        """Cache freshly encoded misses and assemble the result matrix."""
+        encoded = dict(zip(missing.keys(), encoded))
+        for key, vector in encoded.items():
+            self.put(key, vector)
+        vectors = [encoded[key] if vector is None else vector
+                   for key, vector in zip(keys, vectors)]
+        if not vectors:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack(vectors).astype(np.float32, copy=False)
+
+    def get_or_compute(self, texts, encode):
+        """Embeddings for texts, batch-encoding only the cache misses."""
+        keys, vectors, missing = self.lookup(texts)
+        encoded = encode(list(missing.values())) if missing else []
+        return self.fill(keys, vectors, missing, encoded)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,102 @@
+import time
+import queue
+import asyncio
+import threading
+import numpy as np
+from concurrent.futures import Future
+from utils.metrics import Histogram, LATENCY_BUCKETS
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+QUEUE_WAIT_BUCKETS_MS = [0.5, 1, 2, 5, 10, 25, 50, 100, 250]
+
+
+class EmbeddingScheduler:
+    """Micro-batches encode requests from many callers into one model call.
+
+    Callers submit single texts and get a Future. A worker thread takes the
+    first queued request, keeps collecting until max_batch_size requests are
+    queued or max_wait_ms has passed since that request arrived, then runs
+    one encode() for the whole batch and resolves every Future.
+    """
+
+    def __init__(self, encode, max_batch_size=32, max_wait_ms=2.0):
+        self._encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self.encode_seconds = Histogram(LATENCY_BUCKETS)  # per model call
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def submit(self, text):
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future, time.monotonic()))
+        return future
+
+    def encode(self, texts):
+        """Blocking batch encode for sync callers."""
+        if len(texts) >= self.max_batch_size:
+            # Already a full batch, queueing would only add latency
+            self.batch_sizes.observe(len(texts))
+            started = time.perf_counter()
+            vectors = np.asarray(self._encode(list(texts)))
+            self.encode_seconds.observe(time.perf_counter() - started)
+            return vectors
+        futures = [self.submit(text) for text in texts]
+        return np.stack([future.result() for future in futures]) if futures else np.empty((0, 0))
+
+    async def encode_async(self, texts):
+        """Batch encode for asyncio callers without blocking the event loop."""
+        futures = [asyncio.wrap_future(self.submit(text)) for text in texts]
+        results = await asyncio.gather(*futures)
+        return np.stack(results) if results else np.empty((0, 0))
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='embedding-scheduler', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = batch[0][2] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch):
+        started = time.monotonic()
+        self.batch_sizes.observe(len(batch))
+        for _, _, enqueued in batch:
+            self.queue_wait_ms.observe((started - enqueued) * 1000)
+        try:
+            vectors = self._encode([text for text, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        self.encode_seconds.observe(time.monotonic() - started)
+        for (_, future, _), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+    def get_stats(self):
+        return {
+            'queue_depth': self.queue_depth,
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_wait_ms': self.queue_wait_ms.snapshot(),
+            'encode_seconds': self.encode_seconds.snapshot(),
+        }
@@ -0,0 +1,190 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+import numpy as np
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+KEY_SIZE = 20  # sha1 digest
+
+
+class EmbeddingStore:
+    """Persistent embedding cache keyed by sha1(backend identity + text).
+
+    Entries live in one structured .npy file (key, vector) sorted by key and
+    memory-mapped read-only, so warm start is a file open and several worker
+    processes share one copy of the vectors through the page cache. New
+    entries are buffered and merged into the file with write-temp-then-rename
+    under a file lock, so readers never see a partial file.
+
+    Lookups take no lock. A merge rewrites the whole file, so once
+    flush_every entries are buffered put() hands them to a background thread
+    instead of merging on the caller's (request) thread; puts keep buffering
+    meanwhile. A flush moves the buffer aside before merging and opens the
+    merged file before dropping it, so a concurrent lookup always finds an
+    entry in the buffer, the batch being merged or the file. close() waits
+    for the background flush and merges what is left.
+    """
+
+    def __init__(self, directory, model_name, flush_every=1024):
+        self.directory = Path(directory)
+        self.model_name = model_name
+        self.flush_every = flush_every
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self.path = self.directory / f'{slug}.embeddings.npy'
+        self.lock_path = self.directory / f'{slug}.lock'
+        self._records = None
+        self._pending = {}
+        self._flushing = {}  # batch being merged into the file
+        self._write_lock = threading.RLock()  # guards the buffers
+        self._flush_lock = threading.Lock()  # one merge at a time
+        self._flusher = None
+        self.hits = 0
+        self.misses = 0
+        self._open()
+
+    def _open(self):
+        try:
+            self._records = np.load(self.path, mmap_mode='r')
+        except FileNotFoundError:
+            self._records = None
+        except ValueError as e:
+            logger.warning(f'Ignoring unreadable embedding store {self.path}: {e}')
+            self._records = None
+
+    def __len__(self):
+        records = self._records
+        stored = 0 if records is None else len(records)
+        return stored + len(self._pending) + len(self._flushing)
+
+    def key(self, text):
+        return hashlib.sha1(f'{self.model_name}\0{text}'.encode('utf-8')).digest()
+
+    def lookup(self, keys):
+        """Stored vector per key, None for misses."""
+        pending, flushing = self._pending, self._flushing
+        # A flush swaps in a merged file with shifted rows: keys and vectors
+        # must come from the same one
+        records = self._records
+        results = [pending.get(key, flushing.get(key)) for key in keys]
+        if records is not None and len(records):
+            stored_keys = records['key']
+            todo = [i for i, vector in enumerate(results) if vector is None]
+            if todo:
+                wanted = np.array([keys[i] for i in todo], dtype=f'S{KEY_SIZE}')
+                rows = np.searchsorted(stored_keys, wanted)
+                rows = np.minimum(rows, len(stored_keys) - 1)
+                found = stored_keys[rows] == wanted
+                # One fancy-indexed gather for all hits instead of a copy per row
+                vectors = records['vector'][rows[found]]
+                for i, vector in zip(np.asarray(todo)[found], vectors):
+                    results[i] = vector
+        return results
+
+    def put(self, keys, vectors):
+        with self._write_lock:
+            for key, vector in zip(keys, vectors):
+                self._pending[key] = np.asarray(vector, dtype=np.float32)
+            if len(self._pending) >= self.flush_every and (self._flusher is None or not self._flusher.is_alive()):
+                self._flusher = threading.Thread(target=self._background_flush, name='embedding-store-flush', daemon=True)
+                self._flusher.start()
+
+    def _background_flush(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning(f'Background flush of {self.path} failed, entries stay buffered: {e}')
+
+    def get_embeddings(self, texts, encode, flush=True):
+        """Embeddings for texts, encoding only the ones not stored yet."""
+        keys = [self.key(text) for text in texts]
+        vectors = self.lookup(keys)
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], texts[i])
+        with self._write_lock:
+            self.hits += len(texts) - sum(vector is None for vector in vectors)
+            self.misses += len(missing)
+        if missing:
+            encoded = np.asarray(encode(list(missing.values())), dtype=np.float32)
+            new_vectors = dict(zip(missing.keys(), encoded))
+            self.put(list(new_vectors.keys()), list(new_vectors.values()))
+            vectors = [new_vectors[key] if vector is None else vector
+                       for key, vector in zip(keys, vectors)]
+            if flush:
+                self.flush()
+        if not vectors:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack(vectors)
+
+    def flush(self):
+        """Merge buffered entries into the store file."""
+        with self._flush_lock:
+            with self._write_lock:
+                if not self._pending:
+                    return
+                self._flushing, self._pending = self._pending, {}
+            try:
+                self._flush(self._flushing)
+            except BaseException:
+                with self._write_lock:
+                    self._pending = {**self._flushing, **self._pending}
+                raise
+            finally:
+                self._flushing = {}
+
+    def close(self):
+        """Wait for a background flush, then merge the remaining entries."""
+        flusher = self._flusher
+        if flusher is not None:
+            flusher.join()
+        self.flush()
+
+    def _flush(self, batch):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # Re-read under the lock to keep entries other workers added
+                self._open()
+                dimension = len(next(iter(batch.values())))
+                dtype = np.dtype([('key', f'S{KEY_SIZE}'), ('vector', np.float32, (dimension,))])
+                pending = np.empty(len(batch), dtype=dtype)
+                pending['key'] = list(batch.keys())
+                pending['vector'] = np.stack(list(batch.values()))
+                if self._records is not None and len(self._records):
+                    if self._records.dtype != dtype:
+                        logger.warning(f'Embedding store {self.path} has another dimension, rebuilding it')
+                    else:
+                        pending = np.concatenate([np.asarray(self._records), pending])
+                _, first = np.unique(pending['key'], return_index=True)
+                merged = pending[first]  # unique returns keys sorted
+
+                tmp_path = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, merged)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                self._open()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def get_stats(self):
+        return {
+            'entries': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'path': str(self.path),
+        }
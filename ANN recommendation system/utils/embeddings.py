@@ -1,11 +1,72 @@
-from sentence_transformers import SentenceTransformer
+import os
 import numpy as np
+from utils.embedding_cache import EmbeddingCache
+from utils.embedding_scheduler import EmbeddingScheduler
+from utils.embedding_backends import DEFAULT_MODEL_NAME, backend_from_env
+from utils.metrics import REGISTRY
 
-MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
-model = SentenceTransformer(MODEL_NAME)
+MODEL_NAME = DEFAULT_MODEL_NAME
+# Selected by EMBEDDING_BACKEND (sentence-transformers, onnx or hashing) and
+# loaded on the first encode (or warm_up()), so importing this module stays cheap
+model = backend_from_env()
+# Names the backend in every cache key, so vectors of different backends never mix
+BACKEND_ID = model.identity
+
+_cache_ttl = os.environ.get('EMBEDDING_CACHE_TTL')
+cache = EmbeddingCache(
+    max_bytes=int(os.environ.get('EMBEDDING_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    ttl=float(_cache_ttl) if _cache_ttl else None,
+    namespace=BACKEND_ID,
+)
+
+# Cache misses from concurrent callers are coalesced into shared encode batches
+scheduler = EmbeddingScheduler(
+    model.encode,
+    max_batch_size=int(os.environ.get('EMBEDDING_BATCH_MAX_SIZE', 32)),
+    max_wait_ms=float(os.environ.get('EMBEDDING_BATCH_MAX_WAIT_MS', 2.0)),
+)
 
 def get_embedding(text: str) -> np.ndarray:
-    return model.encode([text])[0]
+    return get_embeddings([text])[0]
 
 def get_embeddings(texts: list) -> np.ndarray:
-    return model.encode(texts)
+    return cache.get_or_compute(texts, scheduler.encode)
+
+async def get_embedding_async(text: str) -> np.ndarray:
+    return (await get_embeddings_async([text]))[0]
+
+async def get_embeddings_async(texts: list) -> np.ndarray:
+    keys, vectors, missing = cache.lookup(texts)
+    encoded = await scheduler.encode_async(list(missing.values())) if missing else []
+    return cache.fill(keys, vectors, missing, encoded)
+
+def warm_up(background: bool = False):
+    """Load the model ahead of the first request."""
+    return model.warm_up(background=background)
+
+def get_model_stats() -> dict:
+    return model.get_stats()
+
+def get_cache_stats() -> dict:
+    return cache.get_stats()
+
+def get_scheduler_stats() -> dict:
+    return scheduler.get_stats()
+
+def _collect_metrics():
+    cache_stats = cache.get_stats()
+    return [
+        ('embedding_model_loaded', 'gauge', 'Whether the embedding model is loaded', float(model.loaded)),
+        ('embedding_batch_size', 'histogram', 'Texts per encoder call', [({}, scheduler.batch_sizes)]),
+        ('embedding_encode_seconds', 'histogram', 'Encoder call duration in seconds', [({}, scheduler.encode_seconds)]),
+        ('embedding_queue_wait_milliseconds', 'histogram', 'Time texts waited for an encoder batch',
+         [({}, scheduler.queue_wait_ms)]),
+        ('embedding_queue_depth', 'gauge', 'Texts waiting for an encoder batch', scheduler.queue_depth),
+        ('embedding_cache_hits_total', 'counter', 'Embedding cache hits', cache_stats['hits']),
+        ('embedding_cache_misses_total', 'counter', 'Embedding cache misses', cache_stats['misses']),
+        ('embedding_cache_hit_ratio', 'gauge', 'Embedding cache hit ratio since start', cache_stats['hit_rate']),
+        ('embedding_cache_entries', 'gauge', 'Embeddings held in the cache', cache_stats['entries']),
+        ('embedding_cache_bytes', 'gauge', 'Bytes held by the embedding cache', cache_stats['bytes']),
+    ]
+
+REGISTRY.register_collector('embeddings', _collect_metrics)
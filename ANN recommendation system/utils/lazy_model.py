@@ -0,0 +1,104 @@
+import time
+import threading
+import importlib.util
+import numpy as np
+
+
+class LazyModel:
+    """Thread-safe handle that loads a model on first use.
+
+    Importing torch/transformers (or onnxruntime) and loading the weights
+    takes seconds, so nothing happens until encode(), get() or warm_up() is
+    called. Concurrent first callers wait for a single load. A failed load is
+    retried, but not on every request: until retry_backoff seconds have passed
+    (doubling per consecutive failure, up to max_backoff) callers get the last
+    error at once.
+
+    loader(model_name) returns an object with encode(texts); it defaults to
+    a SentenceTransformer. identity names the backend in cache keys.
+    """
+
+    def __init__(self, model_name, loader=None, identity=None, requires=('sentence_transformers',),
+                 retry_backoff=1.0, max_backoff=300.0):
+        self.model_name = model_name
+        self.identity = identity or model_name
+        self.requires = tuple(requires)
+        self._loader = loader or _load_sentence_transformer
+        self._model = None
+        self._error = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self.load_seconds = None
+
+    @property
+    def available(self):
+        """Whether loading can succeed, without importing anything heavy."""
+        if self._backing_off():
+            return False
+        if self._model is not None:
+            return True
+        return all(importlib.util.find_spec(module) is not None for module in self.requires)
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def get(self):
+        if self._model is not None:
+            return self._model
+        with self._lock:
+            if self._model is None:
+                if self._backing_off():
+                    raise self._error
+                started = time.perf_counter()
+                try:
+                    self._model = self._loader(self.model_name)
+                except Exception as e:
+                    self._error = e
+                    self._failures += 1
+                    backoff = min(self.retry_backoff * 2 ** (self._failures - 1), self.max_backoff)
+                    self._retry_at = time.monotonic() + backoff
+                    raise
+                self._error = None
+                self._failures = 0
+                self.load_seconds = time.perf_counter() - started
+        return self._model
+
+    def _backing_off(self):
+        return self._error is not None and time.monotonic() < self._retry_at
+
+    def encode(self, texts, **kwargs):
+        return np.asarray(self.get().encode(list(texts), **kwargs), dtype=np.float32)
+
+    def warm_up(self, background=False):
+        """Load the model and run one encode; returns the thread if background."""
+        if not background:
+            self.encode(['warm up'])
+            return None
+        thread = threading.Thread(target=self._warm_up_quietly, name='model-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_up_quietly(self):
+        try:
+            self.encode(['warm up'])
+        except Exception:
+            pass  # kept in self._error and raised to callers until the retry
+
+    def get_stats(self):
+        return {
+            'backend': self.identity,
+            'model_name': self.model_name,
+            'loaded': self.loaded,
+            'load_seconds': self.load_seconds,
+            'error': str(self._error) if self._error is not None else None,
+            'failures': self._failures,
+        }
+
+
+def _load_sentence_transformer(model_name):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
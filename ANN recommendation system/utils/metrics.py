@@ -0,0 +1,184 @@
+import os
+import bisect
+import inspect
+import resource
+import threading
+import time
+import weakref
+
+# Seconds, from sub-millisecond scoring up to a cold model load
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram (Prometheus-style upper bounds)."""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[slot] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative, running = {}, 0
+        for bound, bucket_count in zip(self.buckets + [float('inf')], counts):
+            running += bucket_count
+            cumulative['+Inf' if bound == float('inf') else str(bound)] = running
+        return {
+            'buckets': cumulative,
+            'sum': total,
+            'count': count,
+            'mean': total / count if count else 0.0,
+        }
+
+
+class Span:
+    """Context manager adding its wall time in seconds to a histogram."""
+
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class MetricsRegistry:
+    """Histograms and collectors rendered in the Prometheus text format.
+
+    Hot paths only touch histograms (a bisect and a lock, about two
+    microseconds per span); everything read from get_stats() style counters is
+    gathered by collectors when /metrics is scraped.
+
+    A collector returns (name, type, help, samples) families, where samples
+    is a number, a list of (labels, value) or, for histograms, a list of
+    (labels, Histogram). Registering a collector under an existing key
+    replaces it, so re-created objects do not duplicate their metrics. A bound
+    method is held weakly: registering does not keep its object alive, and the
+    collector is dropped once the object is gone.
+    """
+
+    def __init__(self, stage_metric):
+        self.stage_metric = stage_metric
+        self._histograms = {}  # name -> [help, {labels: Histogram}]
+        self._spans = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._histograms.setdefault(name, [help, {}])
+            histogram = family[1].get(key)
+            if histogram is None:
+                histogram = family[1][key] = Histogram(buckets)
+        return histogram
+
+    def span(self, stage):
+        """Time a block into the stage latency histogram."""
+        histogram = self._spans.get(stage)
+        if histogram is None:
+            histogram = self._spans[stage] = self.histogram(
+                self.stage_metric, 'Time spent per pipeline stage in seconds', stage=stage
+            )
+        return Span(histogram)
+
+    def register_collector(self, key, collect):
+        if inspect.ismethod(collect):
+            collect = weakref.WeakMethod(collect)
+        with self._lock:
+            self._collectors[key] = collect
+
+    def unregister_collector(self, key):
+        with self._lock:
+            self._collectors.pop(key, None)
+
+    def families(self):
+        with self._lock:
+            histograms = [(name, 'histogram', help, [(dict(key), h) for key, h in series.items()])
+                          for name, (help, series) in self._histograms.items()]
+            collectors = list(self._collectors.items())
+        families = histograms
+        for key, collect in collectors:
+            if isinstance(collect, weakref.WeakMethod):
+                method = collect()
+                if method is None:
+                    with self._lock:
+                        if self._collectors.get(key) is collect:
+                            del self._collectors[key]
+                    continue
+                collect = method
+            families.extend(collect())
+        return families
+
+    def render(self):
+        return render_families(self.families())
+
+
+def render_families(families):
+    lines = []
+    for name, kind, help, samples in families:
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        if not isinstance(samples, list):
+            samples = [({}, samples)]
+        for labels, value in samples:
+            if kind == 'histogram':
+                snapshot = value.snapshot()
+                for bound, count in snapshot['buckets'].items():
+                    lines.append(f'{name}_bucket{_labels({**labels, "le": bound})} {count}')
+                lines.append(f'{name}_sum{_labels(labels)} {snapshot["sum"]}')
+                lines.append(f'{name}_count{_labels(labels)} {snapshot["count"]}')
+            elif value is not None:
+                lines.append(f'{name}{_labels(labels)} {float(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+
+def process_metrics():
+    """Current and peak resident set size of this process."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = peak if os.uname().sysname == 'Darwin' else peak * 1024
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        rss = None
+    else:
+        peak = max(peak, rss)  # ru_maxrss is updated lazily
+    return [
+        ('process_resident_memory_bytes', 'gauge', 'Resident memory size in bytes', rss),
+        ('process_peak_resident_memory_bytes', 'gauge', 'Peak resident memory size in bytes', peak),
+    ]
+
+
+# Process-wide registry of the recommendation system; the chat side keeps its
+# own registry of this class in modules/metrics.py
+REGISTRY = MetricsRegistry('recommender_stage_seconds')
+
+
+def span(stage):
+    return REGISTRY.span(stage)
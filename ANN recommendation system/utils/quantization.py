@@ -0,0 +1,56 @@
+import numpy as np
+
+# Shared with the chat side: modules/vector_index.py imports these helpers
+PRECISIONS = ('float32', 'float16', 'int8')
+STORAGE_DTYPES = {'float32': np.float32, 'float16': np.float16, 'int8': np.int8}
+
+
+def check_precision(precision):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+    return precision
+
+
+def storage_dtype(precision):
+    """dtype of the codes stored for a precision."""
+    return np.dtype(STORAGE_DTYPES[check_precision(precision)])
+
+
+def quantize_rows(vectors, precision='float32'):
+    """Encode rows as (codes, scales); scales are per-row for int8, else None.
+
+    int8 rows are scaled by their largest absolute component and dequantize
+    as codes * scale.
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    if precision == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    return vectors.astype(storage_dtype(precision), copy=False), None
+
+
+def dequantize_rows(codes, scales):
+    vectors = codes.astype(np.float32)
+    if scales is not None:
+        vectors *= scales[:, None]
+    return vectors
+
+
+def quantized_scores(codes, scales, query, chunk_rows=8192):
+    """codes @ query for a (d,) query or (d, m) queries, without dequantizing.
+
+    The int8 scale multiplies the products instead of the rows. NumPy has no
+    float16/int8 BLAS, so compact rows are widened one chunk at a time.
+    """
+    if codes.dtype == np.float32:
+        scores = codes @ query
+    else:
+        scores = np.empty((len(codes),) + query.shape[1:], dtype=np.float32)
+        for start in range(0, len(codes), chunk_rows):
+            chunk = codes[start:start + chunk_rows]
+            scores[start:start + len(chunk)] = chunk.astype(np.float32) @ query
+    if scales is not None:
+        scores *= scales if scores.ndim == 1 else scales[:, None]
+    return scores
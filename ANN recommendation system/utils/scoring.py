@@ -1,5 +1,13 @@
 import numpy as np
 
+W_SIM = 0.6
+W_CAT = 0.15
+W_POP = 0.1
+W_STOCK = 0.05
+W_RECENCY = 0.05
+W_PERSONAL = 0.05
+MAX_BOOST = 0.25
+
 def cosine_similarity(a, b):
     a = np.array(a)
     b = np.array(b)
@@ -8,13 +16,15 @@ def cosine_similarity(a, b):
 def normalize(x, min_val=0, max_val=1):
     return max(min((x - min_val) / (max_val - min_val), 1.0), 0.0)
 
-def compute_score(sim, cat, pop, stock, recency, personal, seller_boost, max_boost=0.25):
-    w_sim = 0.6
-    w_cat = 0.15
-    w_pop = 0.1
-    w_stock = 0.05
-    w_recency = 0.05
-    w_personal = 0.05
-    base = w_sim*sim + w_cat*cat + w_pop*pop + w_stock*stock + w_recency*recency + w_personal*personal
+def normalize_array(x, min_val=0, max_val=1):
+    return np.clip((np.asarray(x, dtype=np.float64) - min_val) / (max_val - min_val), 0.0, 1.0)
+
+def compute_score(sim, cat, pop, stock, recency, personal, seller_boost, max_boost=MAX_BOOST):
+    base = W_SIM*sim + W_CAT*cat + W_POP*pop + W_STOCK*stock + W_RECENCY*recency + W_PERSONAL*personal
     final_score = base * (1 + min(max(seller_boost, 0), max_boost))
     return final_score
+
+def compute_scores(sim, cat, pop, stock, recency, personal, seller_boost, max_boost=MAX_BOOST):
+    # Vectorized compute_score: every argument may be an array
+    base = W_SIM*sim + W_CAT*cat + W_POP*pop + W_STOCK*stock + W_RECENCY*recency + W_PERSONAL*personal
+    return base * (1 + np.clip(seller_boost, 0, max_boost))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Lexical index benchmark
+
+Measures BM25Index insert rate and query latency on synthetic Darija /
+Arabic / French chat turns, next to an ExactIndex search over the same
+number of 384-dim vectors, to check the keyword path fits alongside the
+dense one in the per-message budget.
+
+Usage:
+    python benchmarks/bench_lexical.py [--sizes 10000 100000] [--queries 200]
+"""
+
+import sys
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.lexical_index import BM25Index, reciprocal_rank_fusion
+from modules.vector_index import ExactIndex
+
+DIMENSION = 384
+VOCABULARY = [
+    'salam', 'bghit', 'nheb', 'crème', 'nivea', 'cerave', 'sérum', 'peau', 'sèche', 'grasse',
+    'cheveux', 'shampoing', 'prix', '1500DA', '2800DA', 'البشرة', 'بشرة', 'دهنية', 'ترطيب',
+    'الشعر', 'شعر', 'مكياج', 'واش', 'عندي', 'مشكلة', 'hydratation', 'acné', 'rouge', 'gloss',
+    'wach', 'kayen', 'livraison', 'alger', 'oran', 'matin', 'soir', 'visage', 'corps',
+]
+
+def make_texts(count, rng):
+    """Short messages drawn from a Zipf-like vocabulary plus rare tokens"""
+    weights = 1.0 / np.arange(1, len(VOCABULARY) + 1)
+    weights /= weights.sum()
+    texts = []
+    for i in range(count):
+        words = rng.choice(VOCABULARY, size=rng.integers(3, 12), p=weights).tolist()
+        words.append(f'ref{i % 5000}')
+        texts.append(' '.join(words))
+    return texts
+
+def main():
+    parser = argparse.ArgumentParser(description='Lexical index benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=20)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    print(f"{'turns':>8} {'inserts/s':>10} {'bm25 ms':>8} {'p95 ms':>7} {'dense ms':>9} {'rrf ms':>7}")
+    for size in args.sizes:
+        texts = make_texts(size, rng)
+        index = BM25Index()
+        started = time.perf_counter()
+        index.add_many(enumerate(texts))
+        insert_rate = size / (time.perf_counter() - started)
+        
+        vectors = ExactIndex()
+        vectors.add(np.arange(size, dtype=np.int64), rng.standard_normal((size, DIMENSION)).astype(np.float32))
+        queries = make_texts(args.queries, rng)
+        embeddings = rng.standard_normal((args.queries, DIMENSION)).astype(np.float32)
+        
+        lexical_ms, dense_ms, fusion_ms = [], [], []
+        for query, embedding in zip(queries, embeddings):
+            started = time.perf_counter()
+            lexical, _ = index.search(query, args.k)
+            lexical_ms.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            dense, _ = vectors.search(embedding, args.k)
+            dense_ms.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            reciprocal_rank_fusion([dense.tolist(), lexical])
+            fusion_ms.append((time.perf_counter() - started) * 1000)
+        print(f"{size:>8} {insert_rate:>10.0f} {np.mean(lexical_ms):>8.2f} {np.percentile(lexical_ms, 95):>7.2f} "
+              f"{np.mean(dense_ms):>9.2f} {np.mean(fusion_ms):>7.3f}")
+
+if __name__ == '__main__':
+    main()
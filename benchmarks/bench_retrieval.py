@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Retrieval latency benchmark
+
+Compares ANNContextRetriever's index search (--backend) with the original per-turn
+Python loop on random 384-dim embeddings (the MiniLM dimension).
+
+Usage:
+    python benchmarks/bench_retrieval.py [--sizes 1000 100000 1000000] [--queries 50]
+"""
+
+import sys
+import time
+import argparse
+import logging
+import numpy as np
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.ann_context_retriever import ANNContextRetriever, ConversationTurn
+
+logging.disable(logging.CRITICAL)
+
+DIMENSION = 384
+
+def loop_search(store, query, current_session_id, threshold, top_k):
+    """The original retrieve_relevant_context scan, one turn at a time"""
+    similar_turns = []
+    for turn in store:
+        if turn.embedding is None:
+            continue
+        if turn.session_id == current_session_id:
+            continue
+        norms = np.linalg.norm(query) * np.linalg.norm(turn.embedding)
+        similarity = float(np.dot(query, turn.embedding) / norms) if norms else 0.0
+        if similarity >= threshold:
+            similar_turns.append(ConversationTurn(
+                role=turn.role,
+                content=turn.content,
+                timestamp=turn.timestamp,
+                session_id=turn.session_id,
+                similarity_score=similarity
+            ))
+    similar_turns.sort(key=lambda x: x.similarity_score, reverse=True)
+    return similar_turns[:top_k]
+
+def build_data(size, rng):
+    """Random turns in 100-turn sessions"""
+    embeddings = rng.standard_normal((size, DIMENSION)).astype(np.float32)
+    turns = [
+        ConversationTurn(
+            role='user' if i % 2 == 0 else 'model',
+            content=f'turn {i}',
+            timestamp='2025-11-10T13:28:41.586Z',
+            session_id=f'session_{i // 100}'
+        )
+        for i in range(size)
+    ]
+    return turns, embeddings
+
+def time_queries(search, queries):
+    """Return per-query latencies in milliseconds"""
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return np.array(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description='Retrieval latency benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--queries', type=int, default=50, help='Queries per size')
+    parser.add_argument('--loop-queries', type=int, default=5, help='Queries per size for the slow loop')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--backend', default='exact', help='Vector index backend (exact, ivf)')
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    print(f"{'turns':>10} {'loop p50 ms':>12} {'matrix p50 ms':>14} {'matrix p95 ms':>14} {'speedup':>8}")
+    for size in args.sizes:
+        turns, embeddings = build_data(size, rng)
+        queries = rng.standard_normal((args.queries, DIMENSION)).astype(np.float32)
+        
+        retriever = ANNContextRetriever(
+            ann_system_path='/nonexistent',
+            similarity_threshold=args.threshold,
+            max_context_turns=args.top_k,
+            embedding_cache_size=size,
+            index_backend=args.backend
+        )
+        retriever._append_turns(turns, list(embeddings))
+        snapshot = retriever.snapshot
+        matrix = time_queries(
+            lambda q: retriever._search(snapshot, q, 'session_0', True, args.top_k), queries
+        )
+        del retriever, snapshot
+        
+        for turn, embedding in zip(turns, embeddings):
+            turn.embedding = embedding
+        loop = time_queries(
+            lambda q: loop_search(turns, q, 'session_0', args.threshold, args.top_k),
+            queries[:args.loop_queries]
+        )
+        
+        loop_p50 = np.percentile(loop, 50)
+        matrix_p50 = np.percentile(matrix, 50)
+        print(f"{size:>10} {loop_p50:>12.2f} {matrix_p50:>14.2f} "
+              f"{np.percentile(matrix, 95):>14.2f} {loop_p50 / matrix_p50:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
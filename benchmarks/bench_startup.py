@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark
+
+Each measurement runs in a fresh interpreter, so module caches and loaded
+weights never carry over:
+- import time of utils.embeddings and models.recommender (the model is lazy)
+- the bridge CLI end to end with --disable-ann (fallback only)
+- first and second get_embedding latency without warm-up: the first call
+  pays the model load
+- first get_embedding latency after warm_up(), i.e. what a request sees
+  once the background warm-up of the app or daemon has finished
+
+Usage:
+    python benchmarks/bench_startup.py [--ann-system-path "ANN recommendation system"] [--runs 3]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import numpy as np
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+IMPORT_EMBEDDINGS = """
+import time, json
+started = time.perf_counter()
+import utils.embeddings
+print(json.dumps({'seconds': time.perf_counter() - started}))
+"""
+
+IMPORT_RECOMMENDER = """
+import time, json
+started = time.perf_counter()
+import models.recommender
+print(json.dumps({'seconds': time.perf_counter() - started}))
+"""
+
+FIRST_REQUEST = """
+import time, json
+from utils.embeddings import get_embedding, warm_up
+warm = {warm}
+if warm:
+    warm_up()
+started = time.perf_counter()
+get_embedding('salam, bghit crème pour peau sèche')
+first = time.perf_counter() - started
+started = time.perf_counter()
+get_embedding('wach kayen shampoing')
+print(json.dumps({{'first': first, 'second': time.perf_counter() - started}}))
+"""
+
+def run_snippet(code, cwd):
+    """Run code in a new interpreter and return its JSON output"""
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=cwd, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def run_bridge_fallback():
+    """Wall time of one fallback-only bridge CLI call"""
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, str(ROOT / 'modules' / 'context_bridge.py'), 'bench_session', 'salam', '--disable-ann'],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return time.perf_counter() - started
+
+def report(label, samples):
+    samples_ms = np.array(samples) * 1000
+    print(f"{label:>42} {np.median(samples_ms):>10.1f} {samples_ms.min():>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup benchmark')
+    parser.add_argument('--ann-system-path', default=str(ROOT / 'ANN recommendation system'))
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+    
+    ann = args.ann_system_path
+    print(f"{'measurement':>42} {'median ms':>10} {'min ms':>10}")
+    report('import utils.embeddings',
+           [run_snippet(IMPORT_EMBEDDINGS, ann)['seconds'] for _ in range(args.runs)])
+    report('import models.recommender',
+           [run_snippet(IMPORT_RECOMMENDER, ann)['seconds'] for _ in range(args.runs)])
+    report('bridge CLI --disable-ann (process)',
+           [run_bridge_fallback() for _ in range(args.runs)])
+           
+    cold = [run_snippet(FIRST_REQUEST.format(warm=False), ann) for _ in range(args.runs)]
+    report('first get_embedding, no warm-up', [sample['first'] for sample in cold])
+    report('second get_embedding', [sample['second'] for sample in cold])
+    warm = [run_snippet(FIRST_REQUEST.format(warm=True), ann) for _ in range(args.runs)]
+    report('first get_embedding after warm_up()', [sample['first'] for sample in warm])
+
+if __name__ == '__main__':
+    main()
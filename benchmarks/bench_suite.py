@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Performance benchmark suite
+
+Generates a synthetic multilingual workload (Darija in Arabic and Latin
+script, French, English) of configurable size and measures:
+- ANNContextRetriever.add_conversation_turn and retrieve_relevant_context,
+  the latter also from --threads threads at once while turns keep being added
+- Recommender.recommend
+- EnhancedContextManager.get_enhanced_context
+- the bridge end to end, against a --serve daemon over HTTP and as one CLI
+  process per request
+
+Each scenario reports p50/p95/p99 latency, throughput and the peak RSS of
+the process that served it, as JSON. In-process scenarios share this
+process, so their peak RSS is cumulative in scenario order; the bridge
+scenarios report their own child processes.
+
+Embeddings default to the deterministic hashing backend, so runs need no
+model files and are comparable across machines and commits. Pass
+--embedding-backend sentence-transformers to include real encoder cost.
+
+Usage:
+    python benchmarks/bench_suite.py --sessions 500 --products 2000 --output bench.json
+    python benchmarks/bench_suite.py --scenarios retrieve recommend --compare bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import threading
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import urllib.request
+import numpy as np
+from pathlib import Path
+from datetime import datetime, timedelta
+
+ROOT = Path(__file__).parent.parent
+ANN_SYSTEM_PATH = ROOT / 'ANN recommendation system'
+SCENARIOS = ['add_turn', 'retrieve', 'concurrent_retrieve', 'recommend', 'enhanced_context', 'bridge_daemon', 'bridge_cli']
+
+GREETINGS = {
+    'ar': ['السلام عليكم', 'صباح الخير', 'مرحبا'],
+    'darija': ['salam', 'saha', 'ahla khouya', 'slm 3likom'],
+    'fr': ['Bonjour', 'Salut', 'Bonsoir'],
+    'en': ['Hello', 'Hi', 'Good morning'],
+}
+REQUESTS = {
+    'ar': ['عندي بشرة {concern} واش تنصحني', 'نحوس على {product} ل{concern}', 'شحال سوم {product} {brand}'],
+    'darija': ['3andi bachra {concern}, wach nesta3mel', 'bghit {product} {brand} b {price}DA', 'kayen {product} l {concern}?'],
+    'fr': ['Je cherche un {product} pour peau {concern}', 'Quel est le prix du {product} {brand} ?', 'Vous avez {brand} en stock ?'],
+    'en': ['I need a {product} for {concern} skin', 'How much is the {brand} {product}?', 'Do you ship {product} to Oran?'],
+}
+REPLIES = {
+    'ar': ['ننصحك ب{product} {brand} بسعر {price} دج', 'هذا المنتج مناسب للبشرة {concern}'],
+    'darija': ['3andna {brand} {product} b {price}DA', 'hada mli7 l bachra {concern}'],
+    'fr': ['Je vous recommande le {product} {brand} à {price} DA', 'Idéal pour les peaux {concern}'],
+    'en': ['Try the {brand} {product}, it is {price} DA', 'It works well for {concern} skin'],
+}
+CONCERNS = {
+    'ar': ['دهنية', 'جافة', 'حساسة', 'مختلطة'],
+    'darija': ['mzayta', 'nachfa', 'sensible', 'melangée'],
+    'fr': ['grasse', 'sèche', 'sensible', 'mixte'],
+    'en': ['oily', 'dry', 'sensitive', 'combination'],
+}
+BRANDS = ['Nivea', 'CeraVe', 'La Roche-Posay', 'The Ordinary', 'Garnier', 'Bioderma', 'Vichy', 'Nike', 'Adidas']
+PRODUCTS = ['crème', 'sérum', 'gel nettoyant', 'shampoing', 'masque', 'écran solaire', 'running shoes', 'yoga mat']
+CATEGORIES = ['Skincare', 'Haircare', 'Makeup', 'Sportswear', 'Yoga', 'Electronics']
+
+def make_text(rng, templates, language):
+    return rng.choice(templates[language]).format(
+        concern=rng.choice(CONCERNS[language]),
+        product=rng.choice(PRODUCTS),
+        brand=rng.choice(BRANDS),
+        price=rng.choice([900, 1500, 2300, 2800, 3500])
+    )
+
+def make_message(rng):
+    """A user message in a random language, sometimes just a greeting"""
+    language = rng.choice(list(REQUESTS))
+    if rng.random() < 0.15:
+        return rng.choice(GREETINGS[language])
+    return make_text(rng, REQUESTS, language)
+
+def make_conversations(sessions, turns, rng):
+    """{session_id: [messages]} in the conversations.json shape"""
+    start = datetime(2025, 11, 1, 9, 0, 0)
+    conversations = {}
+    for index in range(sessions):
+        language = rng.choice(list(REQUESTS))
+        messages = []
+        for turn in range(turns):
+            timestamp = (start + timedelta(minutes=index * 30 + turn)).isoformat() + 'Z'
+            if turn % 2 == 0:
+                content = make_text(rng, REQUESTS, language) if turn else rng.choice(GREETINGS[language])
+                messages.append({'role': 'user', 'content': content, 'timestamp': timestamp})
+            else:
+                messages.append({'role': 'model', 'content': make_text(rng, REPLIES, language), 'timestamp': timestamp})
+        conversations[f'session_{index}'] = messages
+    return conversations
+
+def make_catalogue(count, rng):
+    """Products in the ANN system's products.json schema"""
+    return [
+        {
+            'id': i,
+            'title': f"{rng.choice(BRANDS)} {rng.choice(PRODUCTS).title()} {i}",
+            'description': make_text(rng, REQUESTS, rng.choice(['fr', 'en'])),
+            'category': rng.choice(CATEGORIES),
+            'popularity': round(rng.random(), 2),
+            'stock': rng.choice([0, 3, 10, 25, 60]),
+            'recency': round(rng.random(), 2),
+            'personal': round(rng.random(), 2),
+            'seller_boost': rng.choice([0.0, 0.0, 0.1, 0.2])
+        }
+        for i in range(count)
+    ]
+
+def prepare_workspace(directory, args, rng):
+    """
+    Write the synthetic data and an ANN system directory that runs the real
+    code (symlinked) against the synthetic catalogue
+    """
+    ann = directory / 'ann'
+    (ann / 'data').mkdir(parents=True)
+    for name in ('models', 'utils'):
+        (ann / name).symlink_to(ANN_SYSTEM_PATH / name, target_is_directory=True)
+    with open(ann / 'data' / 'products.json', 'w', encoding='utf-8') as f:
+        json.dump(make_catalogue(args.products, rng), f, ensure_ascii=False)
+    conversations_path = directory / 'conversations.json'
+    with open(conversations_path, 'w', encoding='utf-8') as f:
+        json.dump(make_conversations(args.sessions, args.turns, rng), f, ensure_ascii=False)
+    return ann, conversations_path
+
+def peak_rss_bytes():
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def child_peak_rss_bytes(pid):
+    """Peak resident set size of a running child process, if readable"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def summarize(latencies_s, elapsed_s, rss_bytes, **extra):
+    latencies_ms = np.array(latencies_s) * 1000
+    return {
+        'count': len(latencies_ms),
+        'mean_ms': float(latencies_ms.mean()),
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'max_ms': float(latencies_ms.max()),
+        'throughput_per_s': len(latencies_ms) / elapsed_s if elapsed_s > 0 else 0.0,
+        'peak_rss_mb': rss_bytes / 2**20 if rss_bytes is not None else None,
+        **extra
+    }
+
+def time_calls(call, inputs, warmup=5):
+    """Run call(input) for each input after a few untimed calls"""
+    for item in inputs[:warmup]:
+        call(item)
+    latencies = []
+    started = time.perf_counter()
+    for item in inputs:
+        call_started = time.perf_counter()
+        call(item)
+        latencies.append(time.perf_counter() - call_started)
+    return latencies, time.perf_counter() - started
+
+def time_concurrent(retriever, queries, threads):
+    """
+    Split the queries across reader threads while another thread keeps adding
+    turns; returns (latencies, elapsed seconds, turns added meanwhile)
+    """
+    latencies = [[] for _ in range(threads)]
+    done = threading.Event()
+    added = 0
+    
+    def read(index):
+        for message, session_id in queries[index::threads]:
+            call_started = time.perf_counter()
+            retriever.retrieve_relevant_context(message, session_id, True)
+            latencies[index].append(time.perf_counter() - call_started)
+            
+    def write():
+        nonlocal added
+        while not done.is_set():
+            message, session_id = queries[added % len(queries)]
+            retriever.add_conversation_turn('user', message, session_id)
+            added += 1
+            
+    writer = threading.Thread(target=write)
+    readers = [threading.Thread(target=read, args=(index,)) for index in range(threads)]
+    started = time.perf_counter()
+    writer.start()
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    writer.join()
+    return [latency for part in latencies for latency in part], elapsed, added
+    
+def run_in_process(args, ann, conversations_path, rng, results):
+    from modules.ann_context_retriever import ANNContextRetriever
+    from modules.enhanced_context_manager import EnhancedContextManager
+    
+    with open(conversations_path, encoding='utf-8') as f:
+        conversations = json.load(f)
+    turn_count = sum(len(messages) for messages in conversations.values())
+    session_ids = list(conversations)
+    queries = [(make_message(rng), rng.choice(session_ids)) for _ in range(args.iterations)]
+    
+    if {'add_turn', 'retrieve', 'concurrent_retrieve'} & set(args.scenarios):
+        retriever = ANNContextRetriever(
+            ann_system_path=str(ann),
+            similarity_threshold=args.similarity_threshold,
+            embedding_cache_size=turn_count + args.iterations + 10
+        )
+        started = time.perf_counter()
+        retriever.load_existing_conversations(conversations)
+        load_s = time.perf_counter() - started
+        if 'add_turn' in args.scenarios:
+            latencies, elapsed = time_calls(
+                lambda query: retriever.add_conversation_turn('user', query[0], query[1]), queries
+            )
+            results['add_turn'] = summarize(
+                latencies, elapsed, peak_rss_bytes(),
+                initial_load_s=load_s, initial_turns=turn_count
+            )
+        if 'retrieve' in args.scenarios:
+            latencies, elapsed = time_calls(
+                lambda query: retriever.retrieve_relevant_context(query[0], query[1], True), queries
+            )
+            results['retrieve'] = summarize(latencies, elapsed, peak_rss_bytes(), stored_turns=len(retriever.turn_store))
+        if 'concurrent_retrieve' in args.scenarios:
+            latencies, elapsed, added = time_concurrent(retriever, queries, args.threads)
+            results['concurrent_retrieve'] = summarize(
+                latencies, elapsed, peak_rss_bytes(),
+                threads=args.threads, turns_added_per_s=added / elapsed
+            )
+        del retriever
+        
+    if 'recommend' in args.scenarios:
+        from models.recommender import Recommender
+        started = time.perf_counter()
+        recommender = Recommender(str(ann / 'data' / 'products.json'))
+        build_s = time.perf_counter() - started
+        session_texts = [
+            ' '.join(message['content'] for message in conversations[session_id][-3:]) + ' ' + message
+            for message, session_id in queries
+        ]
+        latencies, elapsed = time_calls(lambda text: recommender.recommend(text, top_k=5), session_texts)
+        results['recommend'] = summarize(
+            latencies, elapsed, peak_rss_bytes(), products=args.products, catalogue_build_s=build_s
+        )
+        recommender.close()
+        
+    if 'enhanced_context' in args.scenarios:
+        started = time.perf_counter()
+        manager = EnhancedContextManager(
+            conversations_path=str(conversations_path),
+            ann_system_path=str(ann)
+        )
+        build_s = time.perf_counter() - started
+        latencies, elapsed = time_calls(
+            lambda query: manager.get_enhanced_context(query[0], query[1], 'ar'), queries
+        )
+        results['enhanced_context'] = summarize(latencies, elapsed, peak_rss_bytes(), manager_build_s=build_s)
+
+def bridge_command(ann, conversations_path):
+    return [
+        sys.executable, str(ROOT / 'modules' / 'context_bridge.py'),
+        '--conversations-path', str(conversations_path),
+        '--ann-system-path', str(ann),
+        '--embedding-store', ''
+    ]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def run_bridge_daemon(args, ann, conversations_path, rng, results):
+    port = free_port()
+    url = f'http://127.0.0.1:{port}'
+    started = time.perf_counter()
+    daemon = subprocess.Popen(
+        bridge_command(ann, conversations_path) + ['--serve', '--port', str(port), '--catalogue-reload-interval', '0'],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + args.startup_timeout
+        while True:
+            try:
+                with urllib.request.urlopen(url + '/health', timeout=1) as response:
+                    response.read()
+                break
+            except OSError:
+                if daemon.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError('bridge daemon did not start')
+                time.sleep(0.1)
+        startup_s = time.perf_counter() - started
+        
+        def post(query):
+            body = json.dumps({'session_id': query[1], 'message': query[0], 'language': 'ar'}).encode('utf-8')
+            request = urllib.request.Request(url + '/context', data=body, headers={'Content-Type': 'application/json'})
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                
+        queries = [(make_message(rng), f'session_{rng.randrange(args.sessions)}') for _ in range(args.iterations)]
+        latencies, elapsed = time_calls(post, queries)
+        results['bridge_daemon'] = summarize(
+            latencies, elapsed, child_peak_rss_bytes(daemon.pid), startup_s=startup_s
+        )
+    finally:
+        daemon.terminate()
+        daemon.wait(timeout=10)
+
+def run_bridge_cli(args, ann, conversations_path, rng, results):
+    command = bridge_command(ann, conversations_path)
+    latencies = []
+    peak = 0
+    started = time.perf_counter()
+    for _ in range(args.cli_iterations):
+        call_started = time.perf_counter()
+        process = subprocess.run(
+            command + [f'session_{rng.randrange(args.sessions)}', make_message(rng)],
+            cwd=ROOT, capture_output=True, check=True
+        )
+        latencies.append(time.perf_counter() - call_started)
+        json.loads(process.stdout)
+        peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024)
+    results['bridge_cli'] = summarize(latencies, time.perf_counter() - started, peak)
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path, tolerance):
+    """Print p95 and throughput against a previous run; returns the regressed scenarios"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} (commit {baseline['meta'].get('commit')})", file=sys.stderr)
+    print(f"{'scenario':>18} {'p95 ms':>9} {'before':>9} {'ratio':>7}", file=sys.stderr)
+    regressions = []
+    for name, current in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        ratio = current['p95_ms'] / previous['p95_ms'] if previous['p95_ms'] else float('inf')
+        flag = '  REGRESSION' if ratio > tolerance else ''
+        print(f"{name:>18} {current['p95_ms']:>9.2f} {previous['p95_ms']:>9.2f} {ratio:>7.2f}{flag}", file=sys.stderr)
+        if ratio > tolerance:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Performance benchmark suite')
+    parser.add_argument('--sessions', type=int, default=200, help='Synthetic conversation sessions')
+    parser.add_argument('--turns', type=int, default=8, help='Messages per session')
+    parser.add_argument('--products', type=int, default=1000, help='Synthetic catalogue size')
+    parser.add_argument('--iterations', type=int, default=200, help='Timed calls per scenario')
+    parser.add_argument('--threads', type=int, default=4, help='Reader threads of concurrent_retrieve')
+    parser.add_argument('--cli-iterations', type=int, default=3, help='Timed bridge CLI processes')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--similarity-threshold', type=float, default=0.3)
+    parser.add_argument('--embedding-backend', default='hashing',
+                        help='EMBEDDING_BACKEND for every scenario (default: hashing, no model files)')
+    parser.add_argument('--startup-timeout', type=float, default=120.0, help='Seconds to wait for the daemon')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    parser.add_argument('--compare', help='Previous JSON report to compare p95 latencies with')
+    parser.add_argument('--tolerance', type=float, default=1.2,
+                        help='p95 ratio above which --compare reports a regression (exit code 1)')
+    args = parser.parse_args()
+    
+    # Read by the ANN system on import, here and in the bridge processes
+    os.environ['EMBEDDING_BACKEND'] = args.embedding_backend
+    sys.path.insert(0, str(ROOT))
+    sys.path.insert(1, str(ANN_SYSTEM_PATH))
+    os.chdir(ROOT)
+    
+    rng = random.Random(args.seed)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bench_suite_') as directory:
+        ann, conversations_path = prepare_workspace(Path(directory), args, rng)
+        run_in_process(args, ann, conversations_path, rng, results)
+        if 'bridge_daemon' in args.scenarios:
+            run_bridge_daemon(args, ann, conversations_path, rng, results)
+        if 'bridge_cli' in args.scenarios:
+            run_bridge_cli(args, ann, conversations_path, rng, results)
+            
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'embedding_backend': args.embedding_backend,
+            'workload': {
+                'sessions': args.sessions, 'turns_per_session': args.turns, 'products': args.products,
+                'iterations': args.iterations, 'threads': args.threads, 'seed': args.seed
+            }
+        },
+        'results': results
+    }
+    
+    print(f"{'scenario':>18} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9} {'peak MiB':>9}", file=sys.stderr)
+    for name, result in results.items():
+        rss = f"{result['peak_rss_mb']:.0f}" if result['peak_rss_mb'] is not None else '-'
+        print(f"{name:>18} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+              f"{result['throughput_per_s']:>9.1f} {rss:>9}", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+        
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Turn store benchmark
+
+Measures insert throughput at capacity (every insert evicts) for each
+eviction policy, and memory per stored turn compared with the previous
+layout: one ConversationTurn dataclass per turn in a dict plus an ExactIndex
+copy of its embedding. Memory is measured with tracemalloc.
+
+Then the cost of duplicate collapsing: filling a store in batches of 64 (as
+load_existing_conversations does) and inserting at capacity, with
+deduplication off, exact only, and exact plus near-duplicates (a search of
+the stored turns per insert). The synthetic turns are all distinct, so
+nothing collapses and the numbers are pure overhead.
+
+Usage:
+    python benchmarks/bench_turn_store.py [--capacity 100000] [--inserts 200000]
+        [--dedup-capacities 1000 10000] [--dedup-inserts 2000]
+"""
+
+import sys
+import time
+import argparse
+import tracemalloc
+import numpy as np
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.ann_context_retriever import ConversationTurn
+from modules.turn_store import TurnStore, EVICTION_POLICIES
+from modules.vector_index import ExactIndex
+
+DIMENSION = 384
+
+def make_turn(i, session_size):
+    """(role, content, timestamp, session_id) of a synthetic chat turn"""
+    return (
+        'user' if i % 2 == 0 else 'model',
+        f'message number {i} about skincare and hydration',
+        f'2025-11-10T13:{(i // 60) % 60:02d}:{i % 60:02d}.586Z',
+        f'session_{i // session_size}'
+    )
+
+def measure_memory(build):
+    """Bytes allocated by build() and still held, plus its result"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Turn store benchmark')
+    parser.add_argument('--capacity', type=int, default=100000)
+    parser.add_argument('--inserts', type=int, default=200000, help='Inserts timed at capacity')
+    parser.add_argument('--session-size', type=int, default=40, help='Turns per synthetic session')
+    parser.add_argument('--session-quota', type=int, default=20)
+    parser.add_argument('--dedup-capacities', type=int, nargs='+', default=[1000, 10000],
+                        help='Store sizes of the deduplication runs')
+    parser.add_argument('--dedup-inserts', type=int, default=2000, help='Inserts timed per deduplication run')
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((args.capacity, DIMENSION)).astype(np.float32)
+    turns = [make_turn(i, args.session_size) for i in range(args.capacity)]
+    
+    def build_store():
+        store = TurnStore(args.capacity)
+        store.add_many(turns, embeddings)
+        return store
+        
+    def build_previous():
+        stored = {}
+        index = ExactIndex()
+        for turn_id, (role, content, timestamp, session_id) in enumerate(turns):
+            stored[turn_id] = ConversationTurn(role=role, content=content, timestamp=timestamp, session_id=session_id)
+        index.add(np.arange(len(turns), dtype=np.int64), embeddings)
+        return stored, index
+        
+    store_bytes, store = measure_memory(build_store)
+    previous_bytes, previous = measure_memory(build_previous)
+    del previous
+    print(f"{args.capacity} turns, {DIMENSION}-dim embeddings")
+    print(f"{'layout':>22} {'bytes/turn':>11} {'total MiB':>10}")
+    print(f"{'dict + ExactIndex':>22} {previous_bytes / args.capacity:>11.0f} {previous_bytes / 2**20:>10.1f}")
+    print(f"{'TurnStore':>22} {store_bytes / args.capacity:>11.0f} {store_bytes / 2**20:>10.1f}")
+    print(f"TurnStore.memory_usage(): {store.memory_usage()['bytes_per_turn']:.0f} bytes/turn")
+    del store
+    
+    print(f"\n{'policy':>14} {'inserts/s':>11} {'us/insert':>10}")
+    extra = rng.standard_normal((1024, DIMENSION)).astype(np.float32)
+    for policy in EVICTION_POLICIES:
+        store = TurnStore(args.capacity, policy, args.session_quota if policy == 'session_quota' else None)
+        store.add_many(turns, embeddings)
+        started = time.perf_counter()
+        for i in range(args.inserts):
+            store.add(*make_turn(args.capacity + i, args.session_size), extra[i % len(extra)])
+            if policy == 'lru' and i % 10 == 0:
+                store.touch([i])
+        elapsed = time.perf_counter() - started
+        print(f"{policy:>14} {args.inserts / elapsed:>11.0f} {elapsed / args.inserts * 1e6:>10.2f}")
+    del store
+    
+    print(f"\n{'deduplication':>18} {'capacity':>9} {'fill s':>8} {'inserts/s':>11} {'us/insert':>10}")
+    modes = (
+        ('off', {}),
+        ('exact', {'deduplicate': True}),
+        ('exact + near 0.95', {'deduplicate': True, 'near_duplicate_threshold': 0.95})
+    )
+    for capacity in args.dedup_capacities:
+        fill = [make_turn(i, args.session_size) for i in range(capacity)]
+        fill_embeddings = rng.standard_normal((capacity, DIMENSION)).astype(np.float32)
+        # Fresh vectors: a repeated one would collapse as a near-duplicate
+        insert_embeddings = rng.standard_normal((args.dedup_inserts, DIMENSION)).astype(np.float32)
+        for name, options in modes:
+            store = TurnStore(capacity, **options)
+            started = time.perf_counter()
+            for start in range(0, capacity, 64):
+                store.add_many(fill[start:start + 64], fill_embeddings[start:start + 64])
+            fill_s = time.perf_counter() - started
+            started = time.perf_counter()
+            for i in range(args.dedup_inserts):
+                store.add(*make_turn(capacity + i, args.session_size), insert_embeddings[i])
+            elapsed = time.perf_counter() - started
+            print(f"{name:>18} {capacity:>9} {fill_s:>8.2f} {args.dedup_inserts / elapsed:>11.0f} "
+                  f"{elapsed / args.dedup_inserts * 1e6:>10.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Reduced-precision embedding evaluation
+
+Stores the same vectors as float32, float16 and int8 in an ExactIndex and
+reports memory per vector, recall@k and top-1 agreement against float32
+search, and the error of the returned similarity scores. The int8+rerank
+row fetches --rerank-candidates from the int8 index and rescores them with
+the float32 vectors, as ANNContextRetriever does with its embedding store.
+
+By default it embeds the turns of data/conversations.json with the ANN
+system's encoder; --synthetic generates clustered random vectors instead,
+which needs no model.
+
+Usage:
+    python benchmarks/eval_quantization.py [--conversations-path data/conversations.json]
+    python benchmarks/eval_quantization.py --synthetic 100000 --k 5 --rerank-candidates 50
+"""
+
+import sys
+import time
+import argparse
+import logging
+import numpy as np
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.vector_index import ExactIndex, normalize_rows
+from eval_recall import load_conversation_vectors, synthetic_vectors
+
+logging.basicConfig(level=logging.WARNING)
+
+def rerank_search(index, exact_vectors, query, k, candidates):
+    """Search index for candidates, then keep the k best by float32 score"""
+    ids, _ = index.search(query, candidates)
+    scores = exact_vectors[ids] @ normalize_rows(query)[0]
+    order = np.argsort(-scores, kind='stable')[:k]
+    return ids[order], scores[order]
+
+def evaluate(search, queries, expected, exact_vectors, k):
+    """recall@k, top-1 agreement, mean |score error| and ms/query of a search"""
+    hits = top1 = 0
+    errors = []
+    started = time.perf_counter()
+    results = [search(query) for query in queries]
+    elapsed_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    for query, (ids, scores), reference in zip(queries, results, expected):
+        hits += len(set(ids.tolist()) & set(reference.tolist()))
+        top1 += len(ids) > 0 and ids[0] == reference[0]
+        true_scores = exact_vectors[ids] @ normalize_rows(query)[0]
+        errors.extend(np.abs(scores - true_scores).tolist())
+    recall = hits / max(sum(len(reference) for reference in expected), 1)
+    return recall, top1 / len(queries), float(np.mean(errors)) if errors else 0.0, elapsed_ms
+
+def main():
+    parser = argparse.ArgumentParser(description='Reduced-precision embedding evaluation')
+    parser.add_argument('--conversations-path', default='data/conversations.json')
+    parser.add_argument('--ann-system-path', default='ANN recommendation system')
+    parser.add_argument('--synthetic', type=int, default=0, help='Use N synthetic vectors instead')
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200, help='Maximum number of queries')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--rerank-candidates', type=int, default=50)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dimension, max(args.synthetic // 500, 8), rng)
+    else:
+        vectors = load_conversation_vectors(args.conversations_path, args.ann_system_path)
+    ids = np.arange(len(vectors), dtype=np.int64)
+    exact_vectors = normalize_rows(vectors)
+    # Perturbed stored vectors, so a query is not trivially its own best match
+    queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+    queries = queries + rng.standard_normal(queries.shape).astype(np.float32) * 0.02
+    
+    indexes = {}
+    for precision in ('float32', 'float16', 'int8'):
+        indexes[precision] = ExactIndex(precision=precision)
+        indexes[precision].add(ids, vectors)
+    expected = [indexes['float32'].search(query, args.k)[0] for query in queries]
+    
+    searches = [
+        ('float32', 'float32', lambda query: indexes['float32'].search(query, args.k)),
+        ('float16', 'float16', lambda query: indexes['float16'].search(query, args.k)),
+        ('int8', 'int8', lambda query: indexes['int8'].search(query, args.k)),
+        ('int8+rerank', 'int8', lambda query: rerank_search(
+            indexes['int8'], exact_vectors, query, args.k, args.rerank_candidates)),
+    ]
+    print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    print(f"{'storage':>12} {'bytes/vec':>10} {'saved':>7} {'recall@k':>9} {'top-1':>7} {'score err':>10} {'ms/query':>9}")
+    float32_bytes = indexes['float32'].nbytes
+    for label, precision, search in searches:
+        block_bytes = indexes[precision].nbytes
+        recall, top1, error, elapsed_ms = evaluate(search, queries, expected, exact_vectors, args.k)
+        saved = 1 - block_bytes / float32_bytes
+        print(f"{label:>12} {block_bytes / len(vectors):>10.0f} {saved:>7.0%} "
+              f"{recall:>9.3f} {top1:>7.3f} {error:>10.2e} {elapsed_ms:>9.3f}")
+    print("Byte counts cover the vector, id and scale columns; int8+rerank reads its "
+          "float32 vectors from the embedding store on disk.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Recall@k evaluation for the vector index backends
+
+Compares the IVF backend with exact search. By default it embeds the turns
+of data/conversations.json with the ANN system's encoder and uses every
+turn as a query; --synthetic generates clustered random vectors instead,
+which needs no model.
+
+Usage:
+    python benchmarks/eval_recall.py [--conversations-path data/conversations.json]
+    python benchmarks/eval_recall.py --synthetic 200000 --n-probe 8 16 32
+"""
+
+import sys
+import json
+import time
+import argparse
+import logging
+import numpy as np
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.vector_index import ExactIndex, IVFIndex
+
+logging.basicConfig(level=logging.WARNING)
+
+def load_conversation_vectors(conversations_path, ann_system_path):
+    """Embed every stored conversation turn with the ANN system encoder"""
+    sys.path.insert(0, str(ann_system_path))
+    from utils.embeddings import get_embeddings
+    
+    with open(conversations_path, 'r', encoding='utf-8') as f:
+        conversations = json.load(f)
+    texts = [
+        msg.get('content', '')
+        for messages in conversations.values()
+        for msg in messages
+    ]
+    return np.asarray(get_embeddings(texts), dtype=np.float32)
+
+def synthetic_vectors(size, dimension, clusters, rng):
+    """Gaussian clusters around random unit centres, like topical chat turns"""
+    centres = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    labels = rng.integers(0, clusters, size)
+    noise = rng.standard_normal((size, dimension)).astype(np.float32) * 0.05
+    return centres[labels] + noise
+
+def main():
+    parser = argparse.ArgumentParser(description='Vector index recall@k evaluation')
+    parser.add_argument('--conversations-path', default='data/conversations.json')
+    parser.add_argument('--ann-system-path', default='ANN recommendation system')
+    parser.add_argument('--synthetic', type=int, default=0, help='Use N synthetic vectors instead')
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200, help='Maximum number of queries')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--n-lists', type=int, default=None)
+    parser.add_argument('--n-probe', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dimension, max(args.synthetic // 500, 8), rng)
+    else:
+        vectors = load_conversation_vectors(args.conversations_path, args.ann_system_path)
+    ids = np.arange(len(vectors), dtype=np.int64)
+    queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+    
+    exact = ExactIndex()
+    exact.add(ids, vectors)
+    exact_results = []
+    started = time.perf_counter()
+    for query in queries:
+        exact_results.append(set(exact.search(query, args.k)[0].tolist()))
+    exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    
+    print(f"{len(vectors)} vectors, {len(queries)} queries, k={args.k}")
+    print(f"{'backend':>8} {'n_probe':>8} {'recall@k':>9} {'ms/query':>9}")
+    print(f"{'exact':>8} {'-':>8} {1.0:>9.3f} {exact_ms:>9.3f}")
+    
+    started = time.perf_counter()
+    ivf = IVFIndex(n_lists=args.n_lists, min_train_size=1)
+    ivf.add(ids, vectors)
+    build_s = time.perf_counter() - started
+    for n_probe in args.n_probe:
+        ivf.n_probe = n_probe
+        hits = 0
+        started = time.perf_counter()
+        for query, expected in zip(queries, exact_results):
+            found = set(ivf.search(query, args.k)[0].tolist())
+            hits += len(found & expected)
+        ivf_ms = (time.perf_counter() - started) * 1000 / len(queries)
+        recall = hits / max(sum(len(expected) for expected in exact_results), 1)
+        print(f"{'ivf':>8} {n_probe:>8} {recall:>9.3f} {ivf_ms:>9.3f}")
+    print(f"IVF build time: {build_s:.2f}s")
+
+if __name__ == '__main__':
+    main()
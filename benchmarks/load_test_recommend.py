@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Load test for the ANN recommendation app's /recommend endpoint
+
+Runs N concurrent clients in a closed loop for a fixed duration and reports
+throughput, latency percentiles and 503 (shed load) responses.
+
+Usage:
+    (cd "ANN recommendation system" && uvicorn app:app --port 8000)
+    python benchmarks/load_test_recommend.py --url http://127.0.0.1:8000 --clients 50 --duration 30
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+MESSAGES = [
+    "I need running shoes for daily training",
+    "salam, 3andi bachara jafa",
+    "je cherche une crème hydratante pour peau sèche",
+    "lightweight yoga mat please",
+    "wach 3andkom shampoing l cheveux secs",
+]
+
+def client(url, deadline, rng, results, lock):
+    while time.perf_counter() < deadline:
+        body = json.dumps({"conversation": rng.sample(MESSAGES, 2) + [f"request {rng.random()}"]}).encode()
+        request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception:
+            status = 0
+        latency = (time.perf_counter() - started) * 1000
+        with lock:
+            results.append((status, latency))
+
+def main():
+    parser = argparse.ArgumentParser(description='/recommend load test')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds')
+    args = parser.parse_args()
+    
+    results, lock = [], threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        for i in range(args.clients):
+            pool.submit(client, args.url.rstrip('/') + '/recommend', deadline, random.Random(i), results, lock)
+            
+    ok = np.array([latency for status, latency in results if status == 200])
+    shed = sum(1 for status, _ in results if status == 503)
+    errors = sum(1 for status, _ in results if status not in (200, 503))
+    report = {
+        'clients': args.clients,
+        'requests': len(results),
+        'throughput_rps': len(ok) / args.duration,
+        'p50_ms': float(np.percentile(ok, 50)) if len(ok) else None,
+        'p95_ms': float(np.percentile(ok, 95)) if len(ok) else None,
+        'p99_ms': float(np.percentile(ok, 99)) if len(ok) else None,
+        'shed_503': shed,
+        'errors': errors,
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
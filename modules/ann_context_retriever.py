@@ -15,13 +15,21 @@ Features:
 import os
 import sys
 import json
+import time
 import logging
 import asyncio
+import threading
 import numpy as np
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.vector_index import normalize_rows
+from modules.turn_store import Recency, TurnSnapshot, TurnStore, content_key, parse_time, recency_decay
+from modules.lexical_index import BM25Index, reciprocal_rank_fusion
+from modules.metrics import REGISTRY, span
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -35,6 +43,9 @@ class ConversationTurn:
     session_id: str
     embedding: Optional[np.ndarray] = None
     similarity_score: Optional[float] = None
+    match: str = 'semantic'  # 'keyword' when retrieved by BM25 below the similarity threshold
+    occurrences: int = 1  # times it was added, collapsed duplicates included
+    sessions: List[str] = field(default_factory=list)  # sessions it was added in
 
 @dataclass
 class RetrievalResult:
@@ -44,6 +55,19 @@ class RetrievalResult:
     context_summary: str
     retrieval_success: bool
     error_message: Optional[str] = None
+    knowledge_matches: List[Dict[str, Any]] = field(default_factory=list)
+
+@dataclass
+class QueryContext:
+    """
+    Per-message state shared by retrieval, recommendation and turn storage
+    
+    The message is encoded once, in prepare_query; everything else in the
+    request reuses this embedding or the stored turn embeddings.
+    """
+    message: str
+    session_id: str
+    embedding: Optional[np.ndarray] = None  # raw embedding, None without a model
 
 class ANNContextRetriever:
     """
@@ -51,13 +75,37 @@ class ANNContextRetriever:
     
     This class provides semantic search capabilities for conversation history
     and integrates with an existing ANN-based product recommendation system.
+    
+    Safe to share between threads. Searches read an immutable TurnSnapshot
+    without locks; turn writes are queued to a single writer thread, which
+    publishes a new snapshot per batch (see modules/turn_store.py). Writes
+    return once their snapshot is published, and encoding happens in the
+    calling thread, so concurrent writers only queue for the store update.
     """
     
     def __init__(self, 
                  ann_system_path: str = "../recommendation system",
                  max_context_turns: int = 5,
                  similarity_threshold: float = 0.7,
-                 embedding_cache_size: int = 1000):
+                 embedding_cache_size: int = 1000,
+                 index_backend: str = "exact",
+                 index_params: Optional[Dict[str, Any]] = None,
+                 embedding_store_path: Optional[str] = None,
+                 catalogue_reload_interval: float = 0.0,
+                 eviction_policy: str = "oldest",
+                 session_quota: Optional[int] = None,
+                 embedding_precision: str = "float32",
+                 rerank_candidates: int = 0,
+                 hybrid_retrieval: bool = False,
+                 knowledge_path: Optional[str] = "data/knowledge.json",
+                 rrf_k: int = 60,
+                 context_pooling_weight: float = 0.5,
+                 deduplicate: bool = False,
+                 near_duplicate_threshold: Optional[float] = None,
+                 time_partition: Optional[float] = None,
+                 retention: Optional[float] = None,
+                 max_turn_age: Optional[float] = None,
+                 recency_half_life: Optional[float] = None):
         """
         Initialize the ANN Context Retriever
         
@@ -66,20 +114,101 @@ class ANNContextRetriever:
             max_context_turns: Maximum number of context turns to retrieve
             similarity_threshold: Minimum similarity score for relevance
             embedding_cache_size: Maximum embeddings to cache in memory
+            index_backend: Vector index for turn embeddings ('exact' scans the
+                turn store columns, 'ivf' builds an index per store segment)
+            index_params: Keyword arguments for the vector index backend
+            embedding_store_path: Directory of the persistent embedding store
+                (None disables it, every start re-encodes all turns)
+            catalogue_reload_interval: Seconds between checks of the products
+                file for hot-reload (0 disables watching)
+            eviction_policy: Turn store eviction once embedding_cache_size turns
+                are stored ('oldest', 'session_quota' or 'lru')
+            session_quota: Maximum stored turns per session for 'session_quota'
+            embedding_precision: Turn embedding storage ('float32', 'float16' or
+                'int8'), applied to the turn store or the index backend
+            rerank_candidates: Re-rank this many approximate matches with exact
+                float32 vectors from the embedding store (0 disables it)
+            hybrid_retrieval: Fuse BM25 keyword rankings of turns and products
+                with the dense rankings (reciprocal rank fusion); turns found
+                by keyword below similarity_threshold are returned with
+                match 'keyword'
+            knowledge_path: Knowledge base searched by keyword and tags with
+                hybrid retrieval (None disables it)
+            rrf_k: Rank offset of reciprocal rank fusion
+            context_pooling_weight: Weight of each retrieved turn's stored
+                embedding, times its similarity, next to the message embedding
+                in the product recommendation query
+            deduplicate: Store a turn whose role and text (up to case and
+                spacing) match a stored turn only as another occurrence of
+                it, without encoding it. The stored turn keeps the session
+                and timestamp of its first occurrence, so session exclusion,
+                max_age and the retention only see that one
+            near_duplicate_threshold: Also collapse turns whose embedding
+                has at least this cosine similarity (e.g. 0.95) with a stored
+                turn of the same role, with the same caveat. Each embedded
+                insert then searches the stored turns on the writer thread, a
+                full scan with the exact backend (see
+                benchmarks/bench_turn_store.py); None disables it
+            time_partition: Seconds per turn store time partition (86400
+                keeps a day per segment), so searches limited by age skip
+                whole older partitions
+            retention: Seconds turns are kept after their timestamp (None
+                keeps them until evicted)
+            max_turn_age: Default max_age of retrieve_relevant_context
+            recency_half_life: Seconds after which a turn's similarity is
+                halved when ranking (None disables recency decay)
         """
         self.ann_system_path = Path(ann_system_path)
         self.max_context_turns = max_context_turns
         self.similarity_threshold = similarity_threshold
         self.embedding_cache_size = embedding_cache_size
+        self.embedding_store_path = embedding_store_path
+        self.catalogue_reload_interval = catalogue_reload_interval
         
         # Initialize components
         self.embedding_cache = {}  # Cache for conversation embeddings
-        self.conversation_store = []  # All conversation turns with embeddings
         self.ann_recommender = None
         self.embedding_model = None
+        self.embedding_store = None
+        
+        # Turn store: fixed-capacity segments of turns, normalized
+        # embeddings (or a vector index per segment) and BM25 keyword indexes
+        # when hybrid. Only the writer thread modifies it
+        self.index_backend = index_backend
+        self.hybrid_retrieval = hybrid_retrieval
+        self.turn_store = TurnStore(
+            embedding_cache_size, eviction_policy, session_quota,
+            precision=embedding_precision,
+            index_backend=index_backend,
+            index_params=index_params,
+            lexicon=hybrid_retrieval,
+            deduplicate=deduplicate,
+            near_duplicate_threshold=near_duplicate_threshold,
+            time_partition=time_partition,
+            retention=retention
+        )
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='turn-writer')
+        self.embedding_precision = embedding_precision
+        self.rerank_candidates = rerank_candidates
+        self.context_pooling_weight = context_pooling_weight
+        self.max_turn_age = max_turn_age
+        self.recency_half_life = recency_half_life
+        
+        # Keyword indexes of products (following catalogue reloads) and the
+        # knowledge base (following its file). Updates build a copy and swap
+        # it in under the lock, so searches never see a half-updated index
+        self.rrf_k = rrf_k
+        self.product_lexicon = BM25Index() if hybrid_retrieval else None
+        self._lexicon_catalogue = None
+        self.knowledge_path = Path(knowledge_path) if knowledge_path else None
+        self.knowledge_lexicon = BM25Index()
+        self.knowledge_entries: Dict[str, Dict[str, Any]] = {}
+        self._knowledge_mtime: Optional[float] = None
+        self._lexicon_lock = threading.Lock()
         
         # Initialize the ANN system
         self._init_ann_system()
+        REGISTRY.register_collector('retriever', self._collect_metrics)
         
     def _init_ann_system(self):
         """Initialize the ANN recommendation system"""
@@ -89,8 +218,19 @@ class ANNContextRetriever:
             
             # Import ANN system components
             from models.recommender import Recommender
-            from utils.embeddings import get_embedding, get_embeddings, model
+            from utils.embeddings import get_embedding, get_embeddings, model, BACKEND_ID
+            from utils.embedding_store import EmbeddingStore
             
+            # The model itself loads on first use (or warm_up()); only check
+            # that it can be loaded so a missing install still means fallback
+            if not model.available:
+                raise ImportError(f"Embedding backend {BACKEND_ID} is not installed")
+                
+            # Persistent embeddings, so unchanged texts are never re-encoded
+            if self.embedding_store_path:
+                self.embedding_store = EmbeddingStore(self.embedding_store_path, BACKEND_ID)
+                logger.info(f"Embedding store opened with {len(self.embedding_store)} entries")
+                
             # Initialize recommender with products
             products_path = self.ann_system_path / "data" / "products.json"
             if not products_path.exists():
@@ -98,8 +238,15 @@ class ANNContextRetriever:
                 products_path = Path("data/knowledge.json")
                 
             if products_path.exists():
-                self.ann_recommender = Recommender(str(products_path))
+                self.ann_recommender = Recommender(
+                    str(products_path),
+                    embedding_store=self.embedding_store,
+                    precision=self.embedding_precision,
+                    rerank=self.rerank_candidates
+                )
                 logger.info(f"ANN recommender initialized with {products_path}")
+                if self.catalogue_reload_interval > 0:
+                    self.ann_recommender.start_watching(self.catalogue_reload_interval)
             else:
                 logger.warning("No products file found, product recommendations disabled")
                 
@@ -114,20 +261,58 @@ class ANNContextRetriever:
             logger.error(f"Failed to initialize ANN system: {e}")
             self.ann_recommender = None
             self.embedding_model = None
+            self.embedding_store = None
             
+    def warm_up(self, background: bool = False) -> None:
+        """Load the embedding model now instead of on the first request"""
+        if self.embedding_model is not None:
+            self.embedding_model.warm_up(background=background)
+            
+    def _embed_texts(self, texts: List[str], flush: bool = True) -> np.ndarray:
+        """Encode texts, reusing vectors from the embedding store when enabled"""
+        if self.embedding_store is not None:
+            return self.embedding_store.get_embeddings(texts, self.get_embeddings, flush=flush)
+        return self.get_embeddings(texts)
+        
+    def prepare_query(self, message: str, session_id: str) -> QueryContext:
+        """
+        Encode a message once for everything one request does with it
+        
+        The embedding goes through the embedding store like turn embeddings,
+        so storing the message as a turn afterwards is a lookup, not an encode.
+        """
+        embedding = None
+        if self.embedding_model is not None:
+            with span('encode'):
+                embedding = self._embed_texts([message], flush=False)[0]
+        return QueryContext(message=message, session_id=session_id, embedding=embedding)
+        
+    @property
+    def generation(self) -> Tuple[int, int]:
+        """Changes whenever stored turns or the product catalogue change"""
+        reloads = self.ann_recommender.reloads if self.ann_recommender is not None else 0
+        return self.turn_store.snapshot.generation, reloads
+        
+    @property
+    def snapshot(self) -> TurnSnapshot:
+        """Stored turns as of the last published write"""
+        return self.turn_store.snapshot
+        
     def add_conversation_turn(self, 
                             role: str, 
                             content: str, 
                             session_id: str,
-                            timestamp: Optional[str] = None) -> bool:
+                            timestamp: Optional[str] = None,
+                            query: Optional[QueryContext] = None) -> bool:
         """
         Add a conversation turn and compute its embedding
         
         Args:
-            role: 'user' or 'model' 
+            role: 'user' or 'model'
             content: The conversation content
             session_id: Session identifier
             timestamp: ISO timestamp (auto-generated if None)
+            query: QueryContext of this content, whose embedding is reused
             
         Returns:
             bool: True if successful, False otherwise
@@ -144,31 +329,360 @@ class ANNContextRetriever:
                 session_id=session_id
             )
             
-            # Compute embedding if possible
-            if self.embedding_model is not None:
+            # Compute embedding if possible; an exact duplicate of a stored
+            # turn is collapsed into it by the writer and needs none
+            embedding = None
+            if query is not None and query.message == content and query.embedding is not None:
+                embedding = query.embedding
+            elif self._is_stored(role, content):
+                pass
+            elif self.embedding_model is not None:
                 try:
-                    turn.embedding = self.get_embedding(content)
+                    with span('ingest_encode'):
+                        embedding = self._embed_texts([content], flush=False)[0]
                 except Exception as e:
                     logger.warning(f"Failed to compute embedding: {e}")
                     
             # Add to store
-            self.conversation_store.append(turn)
-            
-            # Manage cache size
-            if len(self.conversation_store) > self.embedding_cache_size:
-                # Remove oldest entries
-                self.conversation_store = self.conversation_store[-self.embedding_cache_size:]
-                
+            with span('store_turns'):
+                self._append_turns([turn], [embedding])
             return True
             
         except Exception as e:
             logger.error(f"Failed to add conversation turn: {e}")
             return False
             
+    def _is_stored(self, role: str, content: str) -> bool:
+        """Whether the writer will collapse this turn as an exact duplicate"""
+        return self.turn_store.deduplicate and \
+            self.turn_store.find_duplicate(content_key(role, content)) is not None
+            
+    @property
+    def conversation_store(self) -> List[ConversationTurn]:
+        """Stored conversation turns, oldest first"""
+        snapshot = self.snapshot
+        return [self._make_turn(snapshot, turn_id) for turn_id in snapshot.turn_ids_in_order()]
+        
+    def _make_turn(self,
+                   snapshot: TurnSnapshot,
+                   turn_id: int,
+                   similarity_score: Optional[float] = None,
+                   match: str = 'semantic') -> ConversationTurn:
+        role, content, timestamp, session_id = snapshot.get(turn_id)
+        occurrences, sessions = snapshot.occurrences_of(turn_id)
+        return ConversationTurn(
+            role=role,
+            content=content,
+            timestamp=timestamp,
+            session_id=session_id,
+            similarity_score=similarity_score,
+            match=match,
+            occurrences=occurrences,
+            sessions=list(sessions)
+        )
+        
+    def _append_turns(self,
+                      turns: List[ConversationTurn],
+                      embeddings: List[Optional[np.ndarray]]):
+        """
+        Append turns and their embeddings to the store, evicting according
+        to the eviction policy beyond embedding_cache_size
+        
+        Runs on the writer thread and returns once the new snapshot is
+        published.
+        
+        Args:
+            turns: Conversation turns to store
+            embeddings: Raw embedding per turn, None if it could not be computed
+        """
+        # Only the newest embedding_cache_size turns can survive
+        keep = min(len(turns), self.embedding_cache_size)
+        turns = turns[len(turns) - keep:]
+        embeddings = embeddings[len(embeddings) - keep:]
+        
+        self._writer.submit(
+            self.turn_store.add_many,
+            [(turn.role, turn.content, turn.timestamp, turn.session_id) for turn in turns],
+            embeddings
+        ).result()
+        
+    def _search(self,
+                snapshot: TurnSnapshot,
+                query_embedding: np.ndarray,
+                current_session_id: str,
+                exclude_current_session: bool,
+                top_k: int,
+                threshold: Optional[float] = None,
+                since: Optional[float] = None,
+                recency: Optional[Recency] = None) -> Tuple[List[int], List[float]]:
+        """
+        Find the most similar stored turns
+        
+        Args:
+            snapshot: Stored turns to search
+            query_embedding: Raw embedding of the query
+            current_session_id: Current session ID
+            exclude_current_session: Whether to exclude current session turns
+            top_k: Maximum number of turns to return
+            threshold: Minimum similarity (default similarity_threshold)
+            since: Epoch seconds; older turns are not searched
+            recency: (now, half-life) of the recency decay applied to the
+                similarities
+                
+        Returns:
+            Tuple of (turn ids, similarities), best match first
+        """
+        if top_k <= 0:
+            return [], []
+            
+        # Reduced-precision scores pick a wider candidate set for the re-rank
+        rerank = self.rerank_candidates > top_k and self.embedding_store is not None
+        fetch = self.rerank_candidates if rerank else top_k
+        with span('dense_search'):
+            # The current session is masked out inside the scan
+            ids, similarities = snapshot.search(
+                query_embedding, fetch,
+                exclude_session=current_session_id if exclude_current_session else None,
+                since=since,
+                recency=recency
+            )
+        if rerank:
+            with span('rerank'):
+                ids, similarities = self._rerank(snapshot, query_embedding, ids, similarities, recency)
+                
+        if threshold is None:
+            threshold = self.similarity_threshold
+        turn_ids, scores = [], []
+        for turn_id, similarity in zip(ids.tolist(), similarities.tolist()):
+            if similarity < threshold:
+                break
+            turn_ids.append(turn_id)
+            scores.append(similarity)
+            if len(turn_ids) == top_k:
+                break
+        return turn_ids, scores
+        
+    def _rerank(self,
+                snapshot: TurnSnapshot,
+                query_embedding: np.ndarray,
+                ids: np.ndarray,
+                similarities: np.ndarray,
+                recency: Optional[Recency] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rescore candidates with their float32 embeddings from the embedding store
+        
+        Candidates whose vector is not in the store keep their approximate
+        score; rescored ones get the recency decay again.
+        """
+        if len(ids) == 0:
+            return ids, similarities
+        keys = [self.embedding_store.key(snapshot.get(turn_id)[1]) for turn_id in ids.tolist()]
+        vectors = self.embedding_store.lookup(keys)
+        found = [i for i, vector in enumerate(vectors) if vector is not None]
+        similarities = np.array(similarities, dtype=np.float32)
+        if found:
+            exact = normalize_rows(np.stack([vectors[i] for i in found])) @ normalize_rows(query_embedding)[0]
+            if recency is not None:
+                exact *= recency_decay(snapshot.times(ids[found].tolist()), recency)
+            similarities[found] = exact
+        order = np.argsort(-similarities, kind='stable')
+        return ids[order], similarities[order]
+        
+    def _hybrid_search(self,
+                       snapshot: TurnSnapshot,
+                       query: str,
+                       query_embedding: np.ndarray,
+                       current_session_id: str,
+                       exclude_current_session: bool,
+                       top_k: int,
+                       since: Optional[float] = None,
+                       recency: Optional[Recency] = None) -> Tuple[List[int], List[float]]:
+        """
+        Fuse the dense and BM25 rankings of stored turns
+        
+        A turn qualifies through a similarity above similarity_threshold or a
+        keyword match, so short messages with weak embeddings still find
+        context. Similarities are reported for every dense candidate; turns
+        found only by keyword and outside the dense candidates report 0.0.
+        since and recency apply to both rankings, as in _search.
+        
+        Returns:
+            Tuple of (turn ids, similarities), best fused rank first
+        """
+        if top_k <= 0:
+            return [], []
+        candidates = max(4 * top_k, self.rerank_candidates)
+        ids, similarities = self._search(
+            snapshot, query_embedding, current_session_id, exclude_current_session, candidates,
+            threshold=-np.inf, since=since, recency=recency
+        )
+        similarity_by_id = dict(zip(ids, similarities))
+        dense = [turn_id for turn_id, similarity in zip(ids, similarities)
+                 if similarity >= self.similarity_threshold]
+        with span('lexical_search'):
+            lexical, _ = snapshot.keyword_search(
+                query, candidates,
+                exclude_session=current_session_id if exclude_current_session else None,
+                since=since,
+                recency=recency
+            )
+        fused = reciprocal_rank_fusion([dense, lexical], k=self.rrf_k)[:top_k]
+        return [turn_id for turn_id, _ in fused], [similarity_by_id.get(turn_id, 0.0) for turn_id, _ in fused]
+        
+    def _turn_vectors(self, snapshot: TurnSnapshot, turn_ids: List[int]) -> List[Optional[np.ndarray]]:
+        """Stored embedding per turn, None where neither store has it"""
+        if self.index_backend == "exact":
+            return snapshot.vectors(turn_ids)
+        if self.embedding_store is not None:
+            return self.embedding_store.lookup([
+                self.embedding_store.key(snapshot.get(turn_id)[1]) for turn_id in turn_ids
+            ])
+        return [None] * len(turn_ids)
+        
+    def _pooled_query(self,
+                      snapshot: TurnSnapshot,
+                      query_embedding: np.ndarray,
+                      turn_ids: List[int],
+                      similarities: List[float]) -> np.ndarray:
+        """
+        Recommendation query vector: the normalized message embedding plus the
+        stored embeddings of the context turns, each weighted by
+        context_pooling_weight times its similarity
+        
+        Stands in for encoding the message and the turns as one text, without
+        another encoder call. Turns without a stored vector or with a
+        non-positive similarity (keyword-only matches) do not contribute.
+        """
+        pooled = normalize_rows(query_embedding)[0]
+        for vector, similarity in zip(self._turn_vectors(snapshot, turn_ids), similarities):
+            if vector is not None and similarity > 0:
+                pooled += self.context_pooling_weight * similarity * normalize_rows(vector)[0]
+        return pooled
+        
+    def _recommend_products(self,
+                            query: str,
+                            session_text: str,
+                            query_embedding: np.ndarray,
+                            top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Recommender results, fused with BM25 matches of the message when hybrid
+        
+        Products are scored against query_embedding; session_text only feeds
+        the recommendation reasons. Keyword-only matches carry the recommender
+        fields with a 0.0 score; every result gets 'match': 'dense', 'keyword'
+        or 'both'.
+        """
+        if self.product_lexicon is None:
+            return self.ann_recommender.recommend_for_embedding(query_embedding, session_text, top_k=top_k)
+            
+        candidates = 4 * top_k
+        dense = self.ann_recommender.recommend_for_embedding(query_embedding, session_text, top_k=candidates)
+        catalogue = self.ann_recommender.catalogue
+        if catalogue is not self._lexicon_catalogue:
+            self._sync_product_lexicon(catalogue)
+        products = {product['id']: product for product in catalogue.products}
+        lexical, _ = self.product_lexicon.search(
+            query, candidates,
+            where=lambda product_id: product_id in products and products[product_id].get('stock', 0) > 0
+        )
+        
+        dense_by_id = {product['id']: product for product in dense}
+        lexical_set = set(lexical)
+        results = []
+        for product_id, _ in reciprocal_rank_fusion([list(dense_by_id), lexical], k=self.rrf_k)[:top_k]:
+            if product_id in dense_by_id:
+                result = dict(dense_by_id[product_id], match='both' if product_id in lexical_set else 'dense')
+            else:
+                product = products[product_id]
+                result = {
+                    'id': product_id,
+                    'title': product['title'],
+                    'category': product['category'],
+                    'score': 0.0,
+                    'reason': "Mentioned in your message.",
+                    'match': 'keyword'
+                }
+            results.append(result)
+        return results
+        
+    def _sync_product_lexicon(self, catalogue) -> None:
+        """Re-index products after a catalogue reload"""
+        with self._lexicon_lock:
+            if catalogue is self._lexicon_catalogue:
+                return
+            # Only products whose text changed since the last reload are re-indexed
+            lexicon = self.product_lexicon.copy()
+            lexicon.sync({
+                product['id']: _document_text(product, 'title', 'description', 'category', 'tags')
+                for product in catalogue.products
+            })
+            # The index before the catalogue it matches, for the unlocked check
+            self.product_lexicon = lexicon
+            self._lexicon_catalogue = catalogue
+            
+    def _refresh_knowledge(self) -> None:
+        """Re-index the knowledge base when its file changed"""
+        try:
+            mtime = os.path.getmtime(self.knowledge_path)
+        except OSError:
+            return
+        if mtime == self._knowledge_mtime:
+            return
+        with self._lexicon_lock:
+            if mtime == self._knowledge_mtime:
+                return
+            try:
+                with open(self.knowledge_path, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to load knowledge base: {e}")
+                return
+            entries = {entry['id']: entry for entry in entries if 'id' in entry}
+            # Tags are repeated so they weigh like a second title field
+            lexicon = self.knowledge_lexicon.copy()
+            changed = lexicon.sync({
+                entry_id: _document_text(entry, 'title', 'tags', 'tags', 'category', 'content')
+                for entry_id, entry in entries.items()
+            })
+            self.knowledge_entries = entries
+            self.knowledge_lexicon = lexicon
+            self._knowledge_mtime = mtime
+        logger.info(f"Knowledge base indexed: {len(entries)} entries, {changed} updated")
+        
+    def search_knowledge(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        """
+        Knowledge base entries matching a message by keyword and tags
+        
+        Args:
+            query: Message text
+            top_k: Maximum number of entries
+            
+        Returns:
+            List of {id, title, category, score}, best match first
+        """
+        if self.knowledge_path is None:
+            return []
+        self._refresh_knowledge()
+        # Both are swapped on reload: skip ids the other one no longer has
+        entry_ids, scores = self.knowledge_lexicon.search(query, top_k)
+        entries = self.knowledge_entries
+        return [
+            {
+                'id': entry_id,
+                'title': entries[entry_id].get('title', ''),
+                'category': entries[entry_id].get('category', ''),
+                'score': round(score, 2)
+            }
+            for entry_id, score in zip(entry_ids, scores)
+            if entry_id in entries
+        ]
+        
     def retrieve_relevant_context(self, 
                                  current_message: str,
                                  current_session_id: str,
-                                 exclude_current_session: bool = False) -> RetrievalResult:
+                                 exclude_current_session: bool = False,
+                                 query: Optional[QueryContext] = None,
+                                 max_age: Optional[float] = None) -> RetrievalResult:
         """
         Retrieve semantically similar conversation context and product recommendations
         
@@ -176,92 +690,125 @@ class ANNContextRetriever:
             current_message: The current user message
             current_session_id: Current session ID
             exclude_current_session: Whether to exclude current session from search
-            
+            query: Prepared QueryContext of current_message (encoded here if None)
+            max_age: Only search turns at most this many seconds old (default
+                max_turn_age); older segments are skipped unscanned
+                
         Returns:
             RetrievalResult: Retrieved context and recommendations
         """
-        try:
-            # Compute embedding for current message
-            if self.embedding_model is None:
-                return self._fallback_retrieval("ANN system not available")
-                
-            current_embedding = self.get_embedding(current_message)
-            
-            # Find similar conversations
-            similar_turns = []
-            
-            for turn in self.conversation_store:
-                # Skip if no embedding
-                if turn.embedding is None:
-                    continue
-                    
-                # Skip current session if requested
-                if exclude_current_session and turn.session_id == current_session_id:
-                    continue
+        with span('retrieve'):
+            try:
+                if self.embedding_model is None:
+                    return self._fallback_retrieval("ANN system not available")
                     
-                # Compute similarity
-                similarity = self._cosine_similarity(current_embedding, turn.embedding)
+                # The only encoder call of the request
+                if query is None or query.embedding is None:
+                    query = self.prepare_query(current_message, current_session_id)
+                current_embedding = query.embedding
                 
-                if similarity >= self.similarity_threshold:
-                    turn_copy = ConversationTurn(
-                        role=turn.role,
-                        content=turn.content, 
-                        timestamp=turn.timestamp,
-                        session_id=turn.session_id,
-                        similarity_score=similarity
+                # One snapshot for the whole request, however many writes land meanwhile
+                snapshot = self.snapshot
+                since, recency = self._time_window(max_age)
+                
+                # Find similar conversations
+                if self.hybrid_retrieval:
+                    turn_ids, similarities = self._hybrid_search(
+                        snapshot,
+                        current_message,
+                        current_embedding,
+                        current_session_id,
+                        exclude_current_session,
+                        self.max_context_turns,
+                        since=since,
+                        recency=recency
                     )
-                    similar_turns.append(turn_copy)
-                    
-            # Sort by similarity and take top results
-            similar_turns.sort(key=lambda x: x.similarity_score, reverse=True)
-            relevant_conversations = similar_turns[:self.max_context_turns]
-            
-            # Get product recommendations
-            recommended_products = []
-            if self.ann_recommender is not None:
-                try:
-                    # Create conversation context for recommendation
-                    conversation_context = [current_message]
-                    if relevant_conversations:
-                        conversation_context.extend([turn.content for turn in relevant_conversations[:3]])
-                        
-                    recommendations = self.ann_recommender.recommend(
-                        session_text=' '.join(conversation_context),
-                        top_k=5
+                else:
+                    turn_ids, similarities = self._search(
+                        snapshot,
+                        current_embedding,
+                        current_session_id,
+                        exclude_current_session,
+                        self.max_context_turns,
+                        since=since,
+                        recency=recency
                     )
-                    recommended_products = recommendations
-                    
-                except Exception as e:
-                    logger.warning(f"Product recommendation failed: {e}")
+                if turn_ids and self.turn_store.eviction == "lru":
+                    # Reordering the eviction queue is a write; nothing waits for it
+                    self._writer.submit(self.turn_store.touch, turn_ids)
+                # Hybrid results below the threshold only matched by keyword,
+                # so their cosine says nothing about their relevance
+                relevant_conversations = [
+                    self._make_turn(
+                        snapshot, turn_id, similarity,
+                        'semantic' if similarity >= self.similarity_threshold else 'keyword'
+                    )
+                    for turn_id, similarity in zip(turn_ids, similarities)
+                ]
+                
+                # Get product recommendations
+                recommended_products = []
+                if self.ann_recommender is not None:
+                    try:
+                        # Message plus the top 3 similar turns, pooled from stored
+                        # embeddings rather than re-encoded as one text
+                        context_turns = relevant_conversations[:3]
+                        session_text = ' '.join([current_message] + [turn.content for turn in context_turns])
+                        with span('recommend'):
+                            recommended_products = self._recommend_products(
+                                current_message,
+                                session_text,
+                                self._pooled_query(snapshot, current_embedding, turn_ids[:3], similarities[:3]),
+                                top_k=5
+                            )
+                            
+                    except Exception as e:
+                        logger.warning(f"Product recommendation failed: {e}")
+                        
+                knowledge_matches = []
+                if self.hybrid_retrieval:
+                    try:
+                        with span('knowledge_search'):
+                            knowledge_matches = self.search_knowledge(current_message)
+                    except Exception as e:
+                        logger.warning(f"Knowledge search failed: {e}")
                     
-            # Generate context summary
-            context_summary = self._generate_context_summary(
-                relevant_conversations, 
-                recommended_products
-            )
-            
-            return RetrievalResult(
-                relevant_conversations=relevant_conversations,
-                recommended_products=recommended_products,
-                context_summary=context_summary,
-                retrieval_success=True
-            )
-            
-        except Exception as e:
-            logger.error(f"Context retrieval failed: {e}")
-            return self._fallback_retrieval(str(e))
-            
-    def _cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
-        """Compute cosine similarity between two vectors"""
-        try:
-            dot_product = np.dot(vec1, vec2)
-            norms = np.linalg.norm(vec1) * np.linalg.norm(vec2)
-            if norms == 0:
-                return 0.0
-            return float(dot_product / norms)
-        except:
-            return 0.0
-            
+                # Generate context summary
+                context_summary = self._generate_context_summary(
+                    relevant_conversations, 
+                    recommended_products
+                )
+                
+                return RetrievalResult(
+                    relevant_conversations=relevant_conversations,
+                    recommended_products=recommended_products,
+                    context_summary=context_summary,
+                    retrieval_success=True,
+                    knowledge_matches=knowledge_matches
+                )
+                
+            except Exception as e:
+                logger.error(f"Context retrieval failed: {e}")
+                return self._fallback_retrieval(str(e))
+                
+    def _time_window(self, max_age: Optional[float] = None) -> Tuple[Optional[float], Optional[Recency]]:
+        """
+        (since, recency) of a search at the current time
+        
+        Turns past the retention are left out even before the writer
+        removes them.
+        """
+        now = time.time()
+        if max_age is None:
+            max_age = self.max_turn_age
+        cutoffs = [cutoff for cutoff in (
+            now - max_age if max_age is not None else None,
+            self.turn_store.retention_cutoff(now)
+        ) if cutoff is not None]
+        since = max(cutoffs) if cutoffs else None
+        recency = (now, self.recency_half_life) if self.recency_half_life else None
+        return since, recency
+        
     def _generate_context_summary(self, 
                                  conversations: List[ConversationTurn],
                                  products: List[Dict[str, Any]]) -> str:
@@ -301,37 +848,156 @@ class ANNContextRetriever:
             error_message=error_msg
         )
         
-    def load_existing_conversations(self, conversations_data: Dict[str, List[Dict]]):
+    def load_existing_conversations(self,
+                                    conversations_data: Dict[str, List[Dict]],
+                                    batch_size: int = 64) -> int:
         """
         Load existing conversation data and compute embeddings
         
+        Turns are encoded in batches with get_embeddings and appended to the
+        store as whole blocks. Only the newest embedding_cache_size turns
+        would survive eviction, so older turns are not encoded at all, and
+        neither are turns past the retention or, with deduplicate, exact
+        duplicates of earlier turns.
+        
         Args:
             conversations_data: Conversation data from conversations.json
+            batch_size: Number of turns per encoder call
+            
+        Returns:
+            int: Number of conversation turns loaded
         """
         logger.info("Loading existing conversations for embedding computation...")
         
-        loaded_count = 0
-        for session_id, messages in conversations_data.items():
-            for msg in messages:
-                success = self.add_conversation_turn(
-                    role=msg.get('role', 'user'),
-                    content=msg.get('content', ''),
-                    session_id=session_id,
-                    timestamp=msg.get('timestamp')
-                )
-                if success:
-                    loaded_count += 1
-                    
-        logger.info(f"Loaded {loaded_count} conversation turns with embeddings")
+        turns = [
+            ConversationTurn(
+                role=msg.get('role', 'user'),
+                content=msg.get('content', ''),
+                timestamp=msg.get('timestamp') or datetime.now().isoformat(),
+                session_id=session_id
+            )
+            for session_id, messages in conversations_data.items()
+            for msg in messages
+        ]
+        cutoff = self.turn_store.retention_cutoff()
+        if cutoff is not None:
+            # The store would expire them on arrival
+            turns = [turn for turn in turns if not parse_time(turn.timestamp) < cutoff]
+        turns = turns[max(len(turns) - self.embedding_cache_size, 0):]
         
-    def get_stats(self) -> Dict[str, Any]:
-        """Get retriever statistics"""
+        started = time.perf_counter()
+        for batch_start in range(0, len(turns), batch_size):
+            batch = turns[batch_start:batch_start + batch_size]
+            embeddings = [None] * len(batch)
+            if self.embedding_model is not None:
+                # First occurrence of each turn not stored yet
+                rows, seen = [], set()
+                for i, turn in enumerate(batch):
+                    if self.turn_store.deduplicate:
+                        key = content_key(turn.role, turn.content)
+                        if key in seen or self.turn_store.find_duplicate(key) is not None:
+                            continue
+                        seen.add(key)
+                    rows.append(i)
+                try:
+                    if rows:
+                        with span('ingest_encode'):
+                            encoded = self._embed_texts([batch[i].content for i in rows], flush=False)
+                        for i, embedding in zip(rows, encoded):
+                            embeddings[i] = embedding
+                except Exception as e:
+                    logger.warning(f"Failed to compute embeddings for batch: {e}")
+            with span('store_turns'):
+                self._append_turns(batch, embeddings)
+                
+            loaded = batch_start + len(batch)
+            elapsed = time.perf_counter() - started
+            logger.info(f"Embedded {loaded}/{len(turns)} turns "
+                        f"({loaded / elapsed if elapsed > 0 else 0:.1f} turns/s)")
+                        
+        if self.embedding_store is not None:
+            self.embedding_store.flush()
+            
+        elapsed = time.perf_counter() - started
+        logger.info(f"Loaded {len(turns)} conversation turns with embeddings in {elapsed:.2f}s")
+        return len(turns)
+        
+    def get_stats(self, detailed: bool = True) -> Dict[str, Any]:
+        """
+        Get retriever statistics
+        
+        Args:
+            detailed: Include the counts that scan the stored turns (indexed
+                turns, memory usage); without them the cost does not grow
+                with the store
+        """
+        snapshot = self.snapshot
         return {
-            "total_conversations": len(self.conversation_store),
+            "total_conversations": len(snapshot),
             "embedding_model_available": self.embedding_model is not None,
+            "embedding_model": self.embedding_model.get_stats() if self.embedding_model is not None else None,
             "recommender_available": self.ann_recommender is not None,
-            "cache_usage": f"{len(self.conversation_store)}/{self.embedding_cache_size}"
+            "cache_usage": f"{len(snapshot)}/{self.embedding_cache_size}",
+            "index_backend": self.index_backend,
+            "embedding_precision": self.embedding_precision,
+            "indexed_turns": snapshot.indexed if detailed else None,
+            "hybrid_retrieval": self.hybrid_retrieval,
+            "lexical_index": {
+                "turns": {"documents": len(snapshot)} if self.hybrid_retrieval else None,
+                "products": self.product_lexicon.get_stats() if self.product_lexicon is not None else None,
+                "knowledge": self.knowledge_lexicon.get_stats()
+            },
+            "turn_store": self.turn_store.get_stats(memory=detailed),
+            "embedding_store": self.embedding_store.get_stats() if self.embedding_store else None
         }
+        
+    def _collect_metrics(self) -> List[Tuple[str, str, str, Any]]:
+        """Index sizes and store counters for the metrics endpoint"""
+        snapshot = self.snapshot
+        families = [
+            ('context_turns_stored', 'gauge', 'Conversation turns held in the turn store', len(snapshot)),
+            ('context_turns_indexed', 'gauge', 'Stored turns with an embedding', snapshot.indexed),
+            ('context_turn_capacity', 'gauge', 'Turn store capacity', self.embedding_cache_size),
+            ('context_turn_evictions_total', 'counter', 'Turns evicted from the turn store', self.turn_store.evictions),
+            ('context_turn_expirations_total', 'counter', 'Turns removed by the retention policy',
+             self.turn_store.expirations),
+            ('context_turn_duplicates_total', 'counter', 'Turns collapsed into a stored duplicate', [
+                ({'kind': kind}, count) for kind, count in self.turn_store.duplicates.items()
+            ]),
+            ('context_turn_embedding_bytes', 'gauge', 'Memory held by stored turn embeddings',
+             snapshot.embedding_bytes),
+            ('context_turn_segments', 'gauge', 'Segments of the published turn snapshot', len(snapshot.segments)),
+            ('context_turn_snapshots_total', 'counter', 'Turn snapshots published by the writer',
+             snapshot.generation),
+            ('context_lexicon_documents', 'gauge', 'Documents in the BM25 keyword indexes', [
+                ({'index': name}, documents)
+                for name, documents in (
+                    ('turns', len(snapshot) if self.hybrid_retrieval else None),
+                    ('products', self.product_lexicon.get_stats()['documents'] if self.product_lexicon else None),
+                    ('knowledge', self.knowledge_lexicon.get_stats()['documents'])
+                )
+                if documents is not None
+            ])
+        ]
+        if self.embedding_store is not None:
+            store_stats = self.embedding_store.get_stats()
+            families += [
+                ('embedding_store_entries', 'gauge', 'Vectors in the persistent embedding store', store_stats['entries']),
+                ('embedding_store_hits_total', 'counter', 'Embedding store hits', store_stats['hits']),
+                ('embedding_store_misses_total', 'counter', 'Embedding store misses', store_stats['misses'])
+            ]
+        return families
+
+def _document_text(record: Dict[str, Any], *fields: str) -> str:
+    """Text of a product or knowledge entry for the keyword index"""
+    parts = []
+    for name in fields:
+        value = record.get(name)
+        if isinstance(value, list):
+            parts.extend(str(item) for item in value)
+        elif value:
+            parts.append(str(value))
+    return ' '.join(parts)
 
 # Factory function for easy integration
 def create_context_retriever(**kwargs) -> ANNContextRetriever:
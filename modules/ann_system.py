@@ -0,0 +1,16 @@
+"""
+ANN System Module
+
+Location of the bundled ANN recommendation system. Its utils package holds
+implementations the chat side shares instead of copying (metrics, quantization), so
+importing this module puts the system on sys.path, as the ANN Context
+Retriever does with its ann_system_path.
+"""
+
+import sys
+from pathlib import Path
+
+ANN_SYSTEM_PATH = Path(__file__).resolve().parent.parent / 'ANN recommendation system'
+
+if str(ANN_SYSTEM_PATH) not in sys.path:
+    sys.path.insert(0, str(ANN_SYSTEM_PATH))
@@ -2,36 +2,78 @@
 """
 Context Bridge
 
-This script serves as a bridge between the Node.js chat system and the 
+This script serves as a bridge between the Node.js chat system and the
 Python-based Enhanced Context Manager. It provides a command-line interface
 for the Node.js system to request enhanced context.
 
+It can also run as a long-lived daemon (--serve) that loads the embedding
+model and conversation index once and answers requests over localhost HTTP
+with the same JSON response shape as the CLI. When --bridge-url points at a
+running daemon, the CLI acts as a thin client and only falls back to
+in-process retrieval if the daemon cannot be reached.
+
+The daemon picks up new messages before every request. Give it the
+conversation log (CONVERSATION_LOG_PATH, the default --conversations-path
+when set) so that only appended records are read; with conversations.json
+the whole file is parsed again after every change.
+
 Usage:
     python context_bridge.py <session_id> <message> [--language=ar]
+    python context_bridge.py --serve [--host=127.0.0.1] [--port=8765]
+        (GET /health, GET /metrics in the Prometheus text format, POST /context)
+    python context_bridge.py <session_id> <message> --bridge-url=http://127.0.0.1:8765
 """
 
+import os
 import sys
 import json
 import argparse
 import logging
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
-# Add modules directory to path
+# Add modules directory and project root to path
 sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(1, str(Path(__file__).parent.parent))
+
+from modules.conversation_log import ConversationLog
+from modules.metrics import REGISTRY, process_metrics, render_families, span
 
 # Configure logging
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# One ConversationLog per path: opening one scans the whole log, a kept one
+# only reads what was appended since (the daemon's fallbacks reuse it)
+_conversation_logs = {}
+_conversation_logs_lock = threading.Lock()
+
+def get_conversation_log(conversations_path):
+    """The shared ConversationLog of a .jsonl path"""
+    with _conversation_logs_lock:
+        log = _conversation_logs.get(conversations_path)
+        if log is None:
+            log = _conversation_logs[conversations_path] = ConversationLog(conversations_path)
+        return log
+        
 def load_traditional_context(conversations_path, session_id):
     """Load traditional conversation context as fallback"""
     try:
         if not Path(conversations_path).exists():
             return []
-        
+            
+        if conversations_path.endswith('.jsonl'):
+            # last_messages refreshes the offset index incrementally
+            return get_conversation_log(conversations_path).last_messages(session_id, 6)
+            
         with open(conversations_path, 'r', encoding='utf-8') as f:
             conversations = json.load(f)
-        
+            
         session_history = conversations.get(session_id, [])
         # Return last 6 messages for traditional context
         return session_history[-6:] if len(session_history) > 6 else session_history
@@ -49,6 +91,7 @@ def get_fallback_response(session_id, message, language, conversations_path, err
         'enhancement_data': {
             'similar_conversations': [],
             'recommended_products': [],
+            'knowledge_matches': [],
             'context_summary': '',
             'ann_available': False,
             'retrieval_success': False
@@ -61,73 +104,280 @@ def get_fallback_response(session_id, message, language, conversations_path, err
         'error': error_msg
     }
 
-# Try to import enhanced context manager, fallback if not available
-try:
-    from enhanced_context_manager import EnhancedContextManager
-    ANN_AVAILABLE = True
-except ImportError as e:
-    logger.warning(f"Enhanced Context Manager not available: {e}")
-    ANN_AVAILABLE = False
+def import_context_manager():
+    """
+    Import EnhancedContextManager on first use
+    
+    Deferred so fallback-only runs, daemon clients and health checks do not
+    pay for numpy and the ANN stack. The embedding model itself loads lazily
+    on the first encode.
+    
+    Returns:
+        The EnhancedContextManager class, or None if it cannot be imported
+    """
+    try:
+        from enhanced_context_manager import EnhancedContextManager
+        return EnhancedContextManager
+    except ImportError as e:
+        logger.warning(f"Enhanced Context Manager not available: {e}")
+        return None
+
+def build_context_response(context_manager, session_id, message, language):
+    """Run enhanced context retrieval and build the bridge JSON response"""
+    # Get enhanced context
+    traditional_context, enhancement_data = context_manager.get_enhanced_context(
+        current_message=message,
+        session_id=session_id,
+        language=language
+    )
+    
+    # Build system prompt with enhanced context
+    system_prompt = context_manager.build_system_prompt_with_context(
+        traditional_context=traditional_context,
+        enhancement_data=enhancement_data,
+        current_message=message,
+        language=language
+    )
+    
+    return {
+        'success': True,
+        'traditional_context': traditional_context,
+        'enhancement_data': enhancement_data,
+        'system_prompt': system_prompt,
+        'context_length': len(traditional_context),
+        'ann_available': enhancement_data.get('ann_available', False),
+        'retrieval_success': enhancement_data.get('retrieval_success', False)
+    }
+
+def request_from_daemon(bridge_url, session_id, message, language, timeout=5.0):
+    """
+    Forward a context request to a running bridge daemon
+    
+    Returns:
+        The daemon's JSON response, or None if the daemon is unreachable
+    """
+    payload = json.dumps({
+        'session_id': session_id,
+        'message': message,
+        'language': language
+    }, ensure_ascii=False).encode('utf-8')
+    request = urllib.request.Request(
+        bridge_url.rstrip('/') + '/context',
+        data=payload,
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except Exception as e:
+        logger.warning(f"Bridge daemon unavailable at {bridge_url}: {e}")
+        return None
+
+class ContextBridgeServer(ThreadingHTTPServer):
+    """
+    Long-lived bridge daemon
+    
+    Holds a single EnhancedContextManager (model, recommender and conversation
+    index loaded once) and serves requests from a thread per connection.
+    """
+    
+    daemon_threads = True
+    
+    def __init__(self, server_address, conversations_path, ann_system_path, enable_ann=True,
+                 embedding_store_path=None, catalogue_reload_interval=0.0):
+        self.conversations_path = conversations_path
+        self.context_manager = None
+        
+        manager_class = import_context_manager() if enable_ann else None
+        if manager_class is not None:
+            self.context_manager = manager_class(
+                conversations_path=conversations_path,
+                ann_system_path=ann_system_path,
+                enable_ann=True,
+                embedding_store_path=embedding_store_path,
+                catalogue_reload_interval=catalogue_reload_interval
+            )
+            # Load the model in the background; requests wait for it, /health does not
+            if self.context_manager.ann_retriever is not None:
+                self.context_manager.ann_retriever.warm_up(background=True)
+        super().__init__(server_address, ContextBridgeHandler)
+        
+    def handle_context_request(self, session_id, message, language):
+        """Answer one context request with the CLI response shape"""
+        if self.context_manager is None:
+            return get_fallback_response(
+                session_id, message, language, self.conversations_path,
+                "ANN system disabled or not available"
+            )
+        try:
+            with span('request'):
+                # Pick up messages the Node.js side appended since the last
+                # request, unless another request thread is already at it
+                self.context_manager.refresh_conversations()
+                return build_context_response(self.context_manager, session_id, message, language)
+        except Exception as e:
+            logger.error(f"Error in enhanced context processing: {e}")
+            return get_fallback_response(
+                session_id, message, language, self.conversations_path, str(e)
+            )
+            
+    def get_health(self):
+        """Report daemon status with counters whose cost does not grow with the store (memory is at /metrics)"""
+        health = {'status': 'ok', 'ann_available': self.context_manager is not None}
+        if self.context_manager is not None:
+            health['stats'] = self.context_manager.get_context_stats(detailed=False)
+        return health
+        
+    def get_metrics(self):
+        """Prometheus text: context pipeline, process, then the ANN system's own metrics"""
+        text = render_families(REGISTRY.families() + process_metrics())
+        # Recommender stages, encoder batches and the embedding cache, once
+        # the retriever has imported the ANN system
+        ann_metrics = sys.modules.get('utils.metrics')
+        if ann_metrics is not None and hasattr(ann_metrics, 'REGISTRY'):
+            text += ann_metrics.REGISTRY.render()
+        return text
+
+class ContextBridgeHandler(BaseHTTPRequestHandler):
+    """HTTP handler for the bridge daemon"""
+    
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, self.server.get_health())
+        elif self.path == '/metrics':
+            data = self.server.get_metrics().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json(404, {'error': 'Not found'})
+            
+    def do_POST(self):
+        if self.path != '/context':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length).decode('utf-8'))
+            session_id = body['session_id']
+            message = body['message']
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {'error': f'Invalid request: {e}'})
+            return
+            
+        response = self.server.handle_context_request(
+            session_id, message, body.get('language', 'ar')
+        )
+        self._send_json(200, response)
+        
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+def serve(args):
+    """Run the bridge as a long-lived daemon"""
+    if not args.conversations_path.endswith('.jsonl'):
+        logger.warning(
+            f"Serving from {args.conversations_path}: every change re-parses the whole file. "
+            f"Set CONVERSATION_LOG_PATH (or --conversations-path) to the conversation log to read only new records"
+        )
+    server = ContextBridgeServer(
+        (args.host, args.port),
+        conversations_path=args.conversations_path,
+        ann_system_path=args.ann_system_path,
+        enable_ann=not args.disable_ann,
+        embedding_store_path=args.embedding_store or None,
+        catalogue_reload_interval=args.catalogue_reload_interval
+    )
+    print(f"Context bridge listening on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
 def main():
     """Main entry point for the context bridge"""
     parser = argparse.ArgumentParser(description='Enhanced Context Bridge')
-    parser.add_argument('session_id', help='Session ID for the conversation')
-    parser.add_argument('message', help='Current user message')
+    parser.add_argument('session_id', nargs='?', help='Session ID for the conversation')
+    parser.add_argument('message', nargs='?', help='Current user message')
     parser.add_argument('--language', default='ar', help='Language code (ar, fr, en)')
-    parser.add_argument('--conversations-path', default='data/conversations.json', help='Path to conversations file')
+    parser.add_argument('--conversations-path',
+                        default=os.environ.get('CONVERSATION_LOG_PATH') or 'data/conversations.json',
+                        help='Path to conversations.json or the conversation log (.jsonl)')
     parser.add_argument('--ann-system-path', default='../recommendation system', help='Path to ANN system')
     parser.add_argument('--disable-ann', action='store_true', help='Disable ANN context retrieval')
-    
+    parser.add_argument('--embedding-store', default='data/embedding_cache',
+                        help='Directory of the persistent embedding store (empty to disable)')
+    parser.add_argument('--serve', action='store_true', help='Run as a long-lived HTTP daemon')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='Daemon bind address')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Daemon port')
+    parser.add_argument('--catalogue-reload-interval', type=float, default=2.0,
+                        help='Daemon: seconds between product catalogue reload checks (0 disables)')
+    parser.add_argument('--embedding-backend', default=os.environ.get('EMBEDDING_BACKEND'),
+                        help='Embedding backend: sentence-transformers, onnx or hashing (offline, no model files)')
+    parser.add_argument('--bridge-url', default=os.environ.get('CONTEXT_BRIDGE_URL'),
+                        help='URL of a running bridge daemon to forward requests to')
+                        
     args = parser.parse_args()
     
+    # Read when the ANN system's embeddings module is first imported
+    if args.embedding_backend:
+        os.environ['EMBEDDING_BACKEND'] = args.embedding_backend
+        
+    if args.serve:
+        serve(args)
+        return
+    if args.session_id is None or args.message is None:
+        parser.error('session_id and message are required unless --serve is given')
+        
     try:
+        # Prefer a running daemon, which already has the model loaded
+        if args.bridge_url and not args.disable_ann:
+            response = request_from_daemon(
+                args.bridge_url, args.session_id, args.message, args.language
+            )
+            if response is not None:
+                print(json.dumps(response, ensure_ascii=False, default=str))
+                return
+                
         # Check if ANN system is available
-        if not ANN_AVAILABLE or args.disable_ann:
+        manager_class = None if args.disable_ann else import_context_manager()
+        if manager_class is None:
             # Use fallback context
             response = get_fallback_response(
-                args.session_id, 
-                args.message, 
-                args.language, 
-                args.conversations_path, 
+                args.session_id,
+                args.message,
+                args.language,
+                args.conversations_path,
                 "ANN system disabled or not available"
             )
             print(json.dumps(response, ensure_ascii=False, default=str))
             return
-        
+            
         # Initialize Enhanced Context Manager
-        context_manager = EnhancedContextManager(
+        context_manager = manager_class(
             conversations_path=args.conversations_path,
             ann_system_path=args.ann_system_path,
-            enable_ann=True
+            enable_ann=True,
+            embedding_store_path=args.embedding_store or None
         )
         
-        # Get enhanced context
-        traditional_context, enhancement_data = context_manager.get_enhanced_context(
-            current_message=args.message,
-            session_id=args.session_id,
-            language=args.language
+        response = build_context_response(
+            context_manager, args.session_id, args.message, args.language
         )
         
-        # Build system prompt with enhanced context
-        system_prompt = context_manager.build_system_prompt_with_context(
-            traditional_context=traditional_context,
-            enhancement_data=enhancement_data,
-            current_message=args.message,
-            language=args.language
-        )
-        
-        # Prepare response
-        response = {
-            'success': True,
-            'traditional_context': traditional_context,
-            'enhancement_data': enhancement_data,
-            'system_prompt': system_prompt,
-            'context_length': len(traditional_context),
-            'ann_available': enhancement_data.get('ann_available', False),
-            'retrieval_success': enhancement_data.get('retrieval_success', False)
-        }
-        
         # Output JSON response
         print(json.dumps(response, ensure_ascii=False, default=str))
         
@@ -135,10 +385,10 @@ def main():
         # Handle errors gracefully with fallback
         logger.error(f"Error in enhanced context processing: {e}")
         response = get_fallback_response(
-            args.session_id, 
-            args.message, 
-            args.language, 
-            args.conversations_path, 
+            args.session_id,
+            args.message,
+            args.language,
+            args.conversations_path,
             str(e)
         )
         
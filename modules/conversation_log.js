@@ -0,0 +1,69 @@
+/**
+ * Conversation Log Writer
+ *
+ * Node.js side of the append-only conversation log read by
+ * modules/conversation_log.py. Each call appends one newline-terminated JSON
+ * record with a single write, so the Python reader can index and fetch a
+ * session's latest messages without parsing the whole history.
+ *
+ * Enabled by setting CONVERSATION_LOG_PATH (e.g. data/conversations.jsonl);
+ * conversations.json stays the source of truth for the Node.js routes.
+ *
+ * Appends do not take the Python writers' file lock: compaction carries over
+ * records that land in the log after it was replaced (see
+ * ConversationLog.compact).
+ */
+
+const fs = require('fs');
+const path = require('path');
+
+const LOG_PATH = process.env.CONVERSATION_LOG_PATH
+    ? path.resolve(process.env.CONVERSATION_LOG_PATH)
+    : null;
+
+/**
+ * Append records to the log; failures are logged, never thrown
+ * @private
+ */
+function appendRecords(records) {
+    if (!LOG_PATH || records.length === 0) {
+        return;
+    }
+    try {
+        const data = records.map(record => JSON.stringify(record)).join('\n') + '\n';
+        fs.appendFileSync(LOG_PATH, data, 'utf8');
+    } catch (e) {
+        console.error('Error appending to conversation log:', e.message);
+    }
+}
+
+/**
+ * Record a new message for a session
+ * @param {string} sessionId - Session identifier
+ * @param {Object} message - Message object ({ role, content, timestamp })
+ */
+function appendMessage(sessionId, message) {
+    appendRecords([{ ...message, session_id: sessionId }]);
+}
+
+/**
+ * Record that a session was deleted
+ * @param {string} sessionId - Session identifier
+ */
+function deleteSession(sessionId) {
+    appendRecords([{ session_id: sessionId, op: 'delete' }]);
+}
+
+/**
+ * Record that all conversations were cleared
+ */
+function clearAll() {
+    appendRecords([{ op: 'clear' }]);
+}
+
+module.exports = {
+    LOG_PATH,
+    appendMessage,
+    deleteSession,
+    clearAll
+};
@@ -0,0 +1,367 @@
+"""
+Conversation Log Module
+
+Append-only JSONL storage for chat history, replacing whole-file reads of
+conversations.json.
+
+Every line is one record:
+- a message: {"session_id": ..., "role": ..., "content": ..., "timestamp": ...}
+- a session delete: {"session_id": ..., "op": "delete"}
+- a full clear: {"op": "clear"}
+
+The reader keeps a per-session list of byte offsets, built with one scan on
+open and then extended from the last scanned position, so the last N
+messages of a session cost N seeks instead of parsing the whole history.
+Appends are single newline-terminated writes under a file lock; a torn final
+line left by a crash is skipped. Compaction rewrites the live records grouped
+by session into a temp file and renames it over the log. The Node.js writer
+(modules/conversation_log.js) does not take the lock, so after the rename
+compaction keeps copying appends that still land in the old file until it
+has been unchanged for STRAGGLER_SETTLE seconds.
+
+Usage:
+    python modules/conversation_log.py import data/conversations.json data/conversations.jsonl
+    python modules/conversation_log.py compact data/conversations.jsonl [--keep-last 36]
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+Cursor = Tuple[int, int]  # (file inode, byte offset)
+
+# Seconds the replaced log must stay unchanged before compaction stops
+# carrying over appends of writers that opened it before the rename
+STRAGGLER_SETTLE = 0.1
+
+class ConversationLog:
+    """Append-only conversation store with a per-session offset index"""
+    
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(f'{self.path.name}.lock')
+        self._offsets: Dict[str, List[int]] = {}
+        self._inode: Optional[int] = None
+        self._position = 0
+        self._mutex = threading.RLock()
+        self.refresh()
+        
+    @contextmanager
+    def _file_lock(self):
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+                    
+    @staticmethod
+    def _scan(f, start: int) -> Iterable[Tuple[int, int, Optional[Dict[str, Any]]]]:
+        """
+        Yield (offset, end, record) for complete lines from start onward
+        
+        record is None for an unreadable line (a torn write from a crash)
+        """
+        f.seek(start)
+        offset = start
+        for line in f:
+            if not line.endswith(b'\n'):
+                return  # in-progress final line, picked up on the next scan
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            end = offset + len(line)
+            yield offset, end, record if isinstance(record, dict) else None
+            offset = end
+            
+    def _apply(self, offsets: Dict[str, List[int]], offset: int, record: Optional[Dict[str, Any]]) -> None:
+        if record is None:
+            return
+        op = record.get('op')
+        if op == 'clear':
+            offsets.clear()
+        elif op == 'delete':
+            offsets.pop(record.get('session_id'), None)
+        elif 'session_id' in record:
+            offsets.setdefault(record['session_id'], []).append(offset)
+            
+    def refresh(self) -> None:
+        """Index records appended since the last scan, or rescan after compaction"""
+        with self._mutex:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self._offsets, self._inode, self._position = {}, None, 0
+                return
+            if stat.st_ino != self._inode or stat.st_size < self._position:
+                self._offsets, self._inode, self._position = {}, stat.st_ino, 0
+            if stat.st_size == self._position:
+                return
+            with open(self.path, 'rb') as f:
+                for offset, end, record in self._scan(f, self._position):
+                    self._apply(self._offsets, offset, record)
+                    self._position = end
+                    
+    def append(self, session_id: str, message: Dict[str, Any]) -> None:
+        """Durably append one message to a session"""
+        self.append_many([(session_id, message)])
+        
+    def append_many(self, messages: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Durably append (session_id, message) pairs in one write"""
+        lines = [
+            json.dumps({**message, 'session_id': session_id}, ensure_ascii=False)
+            for session_id, message in messages
+        ]
+        self._write_records(lines)
+        return len(lines)
+        
+    def delete_session(self, session_id: str) -> None:
+        self._write_records([json.dumps({'session_id': session_id, 'op': 'delete'}, ensure_ascii=False)])
+        
+    def clear(self) -> None:
+        self._write_records([json.dumps({'op': 'clear'})])
+        
+    def _write_records(self, lines: List[str]) -> None:
+        if not lines:
+            return
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._file_lock():
+            with open(self.path, 'ab') as f:
+                # Terminate a torn line left by a crashed writer so it stays
+                # a single skipped record instead of swallowing ours
+                if f.tell() > 0:
+                    with open(self.path, 'rb') as r:
+                        r.seek(-1, os.SEEK_END)
+                        if r.read(1) != b'\n':
+                            data = b'\n' + data
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        self.refresh()
+        
+    def last_messages(self, session_id: str, n: int) -> List[Dict[str, Any]]:
+        """The last n messages of a session, oldest first"""
+        if n <= 0:
+            return []
+        for _ in range(2):
+            self.refresh()
+            with self._mutex:
+                offsets = self._offsets.get(session_id, [])[-n:]
+                inode = self._inode
+            if not offsets:
+                return []
+            try:
+                with open(self.path, 'rb') as f:
+                    if os.fstat(f.fileno()).st_ino != inode:
+                        continue  # compacted since the refresh, offsets are stale
+                    messages = []
+                    for offset in offsets:
+                        f.seek(offset)
+                        messages.append(_message(json.loads(f.readline())))
+                    return messages
+            except FileNotFoundError:
+                return []
+        return []
+        
+    def get_session(self, session_id: str) -> List[Dict[str, Any]]:
+        """All messages of a session, oldest first"""
+        self.refresh()
+        with self._mutex:
+            count = len(self._offsets.get(session_id, []))
+        return self.last_messages(session_id, count)
+        
+    def sessions(self) -> List[str]:
+        self.refresh()
+        with self._mutex:
+            return list(self._offsets)
+            
+    def read_all(self) -> Tuple[Dict[str, List[Dict[str, Any]]], Cursor]:
+        """
+        Every live session in the conversations.json shape, in one sequential read
+        
+        Returns:
+            Tuple of ({session_id: messages}, cursor for changes_since)
+        """
+        conversations: Dict[str, List[Dict[str, Any]]] = {}
+        try:
+            with open(self.path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                end = 0
+                for _, end, record in self._scan(f, 0):
+                    if record is None:
+                        continue
+                    op = record.get('op')
+                    if op == 'clear':
+                        conversations.clear()
+                    elif op == 'delete':
+                        conversations.pop(record.get('session_id'), None)
+                    elif 'session_id' in record:
+                        conversations.setdefault(record['session_id'], []).append(_message(record))
+                return conversations, (inode, end)
+        except FileNotFoundError:
+            return {}, (0, 0)
+            
+    def to_dict(self) -> Dict[str, List[Dict[str, Any]]]:
+        return self.read_all()[0]
+        
+    def changes_since(self, cursor: Optional[Cursor]) -> Tuple[List[Tuple[str, Dict[str, Any]]], Cursor]:
+        """
+        Messages appended after cursor (everything if the log was compacted)
+        
+        Returns:
+            Tuple of ([(session_id, message)], new cursor)
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                start = cursor[1] if cursor and cursor[0] == inode else 0
+                if start > os.fstat(f.fileno()).st_size:
+                    start = 0
+                changes = []
+                end = start
+                for _, end, record in self._scan(f, start):
+                    if record is not None and 'op' not in record and 'session_id' in record:
+                        changes.append((record['session_id'], _message(record)))
+                return changes, (inode, end)
+        except FileNotFoundError:
+            return [], (0, 0)
+            
+    def compact(self, keep_last: Optional[int] = None) -> Dict[str, int]:
+        """
+        Rewrite the log with only live messages, grouped by session
+        
+        Args:
+            keep_last: Keep only this many most recent messages per session
+            
+        Returns:
+            Dict with bytes before/after and messages kept
+        """
+        with self._file_lock():
+            try:
+                old = open(self.path, 'rb')
+            except FileNotFoundError:
+                return {'bytes_before': 0, 'bytes_after': 0, 'messages': 0}
+            with old:
+                conversations: Dict[str, List[bytes]] = {}
+                end = 0
+                for _, end, record in self._scan(old, 0):
+                    if record is not None:
+                        self._apply_raw(conversations, record)
+                        
+                tmp_path = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+                kept = 0
+                with open(tmp_path, 'wb') as f:
+                    for lines in conversations.values():
+                        if keep_last is not None:
+                            lines = lines[-keep_last:]
+                        f.writelines(lines)
+                        kept += len(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                
+                # Writers that do not take the lock (the Node.js side) may
+                # have opened the old file before the rename and append to
+                # it after we read it: carry those over until it settles
+                copied = end
+                settled = time.monotonic() + STRAGGLER_SETTLE
+                with open(self.path, 'ab') as f:
+                    while True:
+                        old.seek(copied)
+                        straggler = old.read()
+                        complete = straggler[:straggler.rfind(b'\n') + 1]
+                        if complete:
+                            f.write(complete)
+                            f.flush()
+                            os.fsync(f.fileno())
+                            copied += len(complete)
+                            settled = time.monotonic() + STRAGGLER_SETTLE
+                        elif time.monotonic() >= settled:
+                            break  # a torn line left by a crash stays behind
+                        else:
+                            time.sleep(0.01)
+            bytes_before = copied
+        self.refresh()
+        stats = {'bytes_before': bytes_before, 'bytes_after': os.path.getsize(self.path), 'messages': kept}
+        logger.info(f"Compacted {self.path}: {stats}")
+        return stats
+        
+    @staticmethod
+    def _apply_raw(conversations: Dict[str, List[bytes]], record: Dict[str, Any]) -> None:
+        op = record.get('op')
+        if op == 'clear':
+            conversations.clear()
+        elif op == 'delete':
+            conversations.pop(record.get('session_id'), None)
+        elif 'session_id' in record:
+            line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+            conversations.setdefault(record['session_id'], []).append(line)
+            
+    def import_json(self, json_path: str) -> int:
+        """Append every message of a conversations.json file; returns the count"""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            conversations = json.load(f)
+        return self.append_many(
+            (session_id, message)
+            for session_id, messages in conversations.items()
+            for message in messages
+        )
+        
+    def get_stats(self) -> Dict[str, Any]:
+        self.refresh()
+        with self._mutex:
+            return {
+                'path': str(self.path),
+                'sessions': len(self._offsets),
+                'messages': sum(len(offsets) for offsets in self._offsets.values()),
+                'bytes': self._position
+            }
+
+def _message(record: Dict[str, Any]) -> Dict[str, Any]:
+    """A stored record without its session_id, as in conversations.json"""
+    return {key: value for key, value in record.items() if key != 'session_id'}
+
+def main():
+    parser = argparse.ArgumentParser(description='Conversation log maintenance')
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help='Import a conversations.json file')
+    import_parser.add_argument('json_path')
+    import_parser.add_argument('log_path')
+    compact_parser = commands.add_parser('compact', help='Drop deleted sessions and trimmed messages')
+    compact_parser.add_argument('log_path')
+    compact_parser.add_argument('--keep-last', type=int, default=None,
+                                help='Messages to keep per session')
+    commands.add_parser('stats', help='Show log statistics').add_argument('log_path')
+    args = parser.parse_args()
+    
+    log = ConversationLog(args.log_path)
+    if args.command == 'import':
+        count = log.import_json(args.json_path)
+        print(f"Imported {count} messages into {args.log_path}")
+    elif args.command == 'compact':
+        print(json.dumps(log.compact(keep_last=args.keep_last)))
+    else:
+        print(json.dumps(log.get_stats()))
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    main()
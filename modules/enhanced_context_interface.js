@@ -7,17 +7,25 @@
  */
 
 const { spawn } = require('child_process');
+const http = require('http');
 const path = require('path');
 const fs = require('fs');
 
 class EnhancedContextInterface {
     constructor(options = {}) {
         this.conversationsPath = options.conversationsPath || 'data/conversations.json';
+        // The Python side reads the append-only log instead when it is enabled
+        this.bridgeConversationsPath = options.conversationLogPath
+            || process.env.CONVERSATION_LOG_PATH
+            || this.conversationsPath;
         this.annSystemPath = options.annSystemPath || '../recommendation system';
         this.enableAnn = options.enableAnn !== false;
         this.pythonPath = options.pythonPath || 'python3';
         this.bridgeScript = path.join(__dirname, 'context_bridge.py');
         this.timeout = options.timeout || 5000; // 5 second timeout
+        // Long-lived bridge daemon (context_bridge.py --serve); spawning a
+        // Python process per message is only used when it is unreachable
+        this.bridgeUrl = options.bridgeUrl || process.env.CONTEXT_BRIDGE_URL || null;
         
         console.log('[Enhanced Context] Interface initialized');
     }
@@ -30,13 +38,75 @@ class EnhancedContextInterface {
      * @returns {Promise<Object>} Enhanced context data
      */
     async getEnhancedContext(sessionId, message, language = 'ar') {
+        if (this.bridgeUrl && this.enableAnn) {
+            try {
+                const result = await this._requestFromDaemon(sessionId, message, language);
+                if (result.success) {
+                    console.log(`[Enhanced Context] Successfully retrieved context for session ${sessionId} from bridge daemon`);
+                    return result;
+                }
+                return this._getFallbackContext(sessionId, message, language, result.error);
+            } catch (error) {
+                console.warn(`[Enhanced Context] Bridge daemon unavailable, spawning bridge process: ${error.message}`);
+            }
+        }
+        
+        return this._spawnBridge(sessionId, message, language);
+    }
+    
+    /**
+     * Request context from the long-lived bridge daemon
+     * @private
+     */
+    _requestFromDaemon(sessionId, message, language) {
+        return new Promise((resolve, reject) => {
+            const payload = JSON.stringify({ session_id: sessionId, message, language });
+            const url = new URL('/context', this.bridgeUrl);
+            
+            const req = http.request(url, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Content-Length': Buffer.byteLength(payload)
+                },
+                timeout: this.timeout
+            }, (res) => {
+                let body = '';
+                res.setEncoding('utf8');
+                res.on('data', (chunk) => {
+                    body += chunk;
+                });
+                res.on('end', () => {
+                    if (res.statusCode !== 200) {
+                        reject(new Error(`Bridge daemon returned status ${res.statusCode}`));
+                        return;
+                    }
+                    try {
+                        resolve(JSON.parse(body));
+                    } catch (parseError) {
+                        reject(parseError);
+                    }
+                });
+            });
+            
+            req.on('timeout', () => req.destroy(new Error('Bridge daemon timeout')));
+            req.on('error', reject);
+            req.end(payload);
+        });
+    }
+    
+    /**
+     * Run the bridge as a one-shot Python process
+     * @private
+     */
+    _spawnBridge(sessionId, message, language) {
         return new Promise((resolve) => {
             const args = [
                 this.bridgeScript,
                 sessionId,
                 message,
                 `--language=${language}`,
-                `--conversations-path=${this.conversationsPath}`,
+                `--conversations-path=${this.bridgeConversationsPath}`,
                 `--ann-system-path=${this.annSystemPath}`
             ];
             
@@ -5,10 +5,17 @@ This module integrates the ANN Context Retriever with the existing chat system,
 providing seamless semantic context retrieval and enhanced memory capabilities.
 """
 
+import os
 import json
+import math
 import logging
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Any, Optional, Tuple
-from modules.ann_context_retriever import ANNContextRetriever, RetrievalResult
+from modules.ann_context_retriever import ANNContextRetriever, RetrievalResult, QueryContext
+from modules.conversation_log import ConversationLog
+from modules.metrics import REGISTRY, span
+from modules.turn_store import parse_time
 
 logger = logging.getLogger(__name__)
 
@@ -22,25 +29,61 @@ class EnhancedContextManager:
                  conversations_path: str = "data/conversations.json",
                  ann_system_path: str = "../recommendation system",
                  enable_ann: bool = True,
-                 max_traditional_context: int = 6):
+                 max_traditional_context: int = 6,
+                 embedding_batch_size: int = 64,
+                 embedding_store_path: Optional[str] = None,
+                 catalogue_reload_interval: float = 0.0,
+                 context_cache_size: int = 64):
         """
         Initialize the Enhanced Context Manager
         
         Args:
-            conversations_path: Path to conversations.json file
+            conversations_path: Path to conversations.json, or to an append-only
+                conversation log (.jsonl, see modules/conversation_log.py)
             ann_system_path: Path to ANN recommendation system
             enable_ann: Whether to enable ANN context retrieval
             max_traditional_context: Max traditional context messages to keep
+            embedding_batch_size: Turns per encoder call when loading history
+            embedding_store_path: Directory of the persistent embedding store
+            catalogue_reload_interval: Seconds between products file checks
+                for hot-reload (0 disables it)
+            context_cache_size: get_enhanced_context results memoized per
+                (session, message), so prompt building and fallbacks for the
+                same chat turn reuse one retrieval (0 disables it)
         """
         self.conversations_path = conversations_path
+        self.conversation_log = (
+            ConversationLog(conversations_path) if conversations_path.endswith('.jsonl') else None
+        )
+        self._log_cursor = None
         self.max_traditional_context = max_traditional_context
         self.enable_ann = enable_ann
+        self.embedding_batch_size = embedding_batch_size
+        
+        # Per-session time (epoch seconds) of the newest indexed message, plus
+        # the file mtime it was read at, so long-lived processes only ingest
+        # new turns
+        self._last_indexed_times: Dict[str, float] = {}
+        self._conversations_mtime: Optional[float] = None
+        self._refresh_lock = threading.Lock()
+        
+        # (session_id, message) -> (state stamp, traditional context,
+        # enhancement data, QueryContext), least recently used first
+        self.context_cache_size = context_cache_size
+        self._context_cache: OrderedDict = OrderedDict()
+        self._context_lock = threading.Lock()
+        self.context_cache_hits = 0
+        self.context_cache_misses = 0
         
         # Initialize ANN retriever if enabled
         self.ann_retriever = None
         if enable_ann:
             try:
-                self.ann_retriever = ANNContextRetriever(ann_system_path=ann_system_path)
+                self.ann_retriever = ANNContextRetriever(
+                    ann_system_path=ann_system_path,
+                    embedding_store_path=embedding_store_path,
+                    catalogue_reload_interval=catalogue_reload_interval
+                )
                 logger.info("ANN Context Retriever initialized successfully")
             except Exception as e:
                 logger.warning(f"ANN initialization failed, falling back to traditional context: {e}")
@@ -49,25 +92,116 @@ class EnhancedContextManager:
         # Load existing conversations into ANN system
         if self.ann_retriever:
             self._load_conversations_to_ann()
-            
+        REGISTRY.register_collector('context_manager', self._collect_metrics)
+        
     def _load_conversations_to_ann(self):
         """Load existing conversations into ANN system for embedding computation"""
         try:
-            conversations_data = self._load_conversations()
+            self._conversations_mtime = self._get_conversations_mtime()
+            if self.conversation_log is not None:
+                conversations_data, self._log_cursor = self.conversation_log.read_all()
+            else:
+                conversations_data = self._load_conversations()
             if conversations_data:
-                self.ann_retriever.load_existing_conversations(conversations_data)
+                self.ann_retriever.load_existing_conversations(
+                    conversations_data, batch_size=self.embedding_batch_size
+                )
+                for session_id, messages in conversations_data.items():
+                    self._mark_indexed(session_id, messages)
                 logger.info("Existing conversations loaded into ANN system")
         except Exception as e:
             logger.warning(f"Failed to load conversations to ANN: {e}")
             
+    def _get_conversations_mtime(self) -> Optional[float]:
+        """Get the modification time of the conversations file"""
+        try:
+            return os.path.getmtime(self.conversations_path)
+        except OSError:
+            return None
+            
+    def refresh_conversations(self) -> int:
+        """
+        Index messages appended to conversations.json since the last load
+        
+        Used by long-lived processes (the bridge daemon) so the ANN store
+        follows the Node.js side without re-embedding the whole history.
+        With a conversation log (.jsonl) only the appended records are
+        read; conversations.json is re-parsed whole whenever it changes.
+        Thread-safe: while one thread ingests, others return at once and
+        keep retrieving from the snapshot published so far.
+        
+        Returns:
+            int: Number of newly indexed conversation turns
+        """
+        if not self.ann_retriever:
+            return 0
+        if not self._refresh_lock.acquire(blocking=False):
+            return 0
+        try:
+            return self._refresh_conversations()
+        finally:
+            self._refresh_lock.release()
+            
+    def _refresh_conversations(self) -> int:
+        mtime = self._get_conversations_mtime()
+        if mtime is None or mtime == self._conversations_mtime:
+            return 0
+        self._conversations_mtime = mtime
+        
+        if self.conversation_log is not None:
+            # Only the records appended since the last refresh are read
+            changes, self._log_cursor = self.conversation_log.changes_since(self._log_cursor)
+            updated: Dict[str, List[Dict]] = {}
+            for session_id, message in changes:
+                updated.setdefault(session_id, []).append(message)
+        else:
+            updated = self._load_conversations()
+            
+        new_turns = {}
+        for session_id, messages in updated.items():
+            # Timestamps rather than counts, since the Node.js cleanup trims
+            # the head of long sessions; parsed, as offsets and fractional
+            # seconds do not compare as strings
+            last_indexed = self._last_indexed_times.get(session_id, -math.inf)
+            fresh = [msg for msg in messages if parse_time(msg.get('timestamp', '')) > last_indexed]
+            if fresh:
+                new_turns[session_id] = fresh
+            self._mark_indexed(session_id, messages)
+            
+        if new_turns:
+            with span('refresh_conversations'):
+                self.ann_retriever.load_existing_conversations(
+                    new_turns, batch_size=self.embedding_batch_size
+                )
+        return sum(len(messages) for messages in new_turns.values())
+        
+    def _mark_indexed(self, session_id: str, messages: List[Dict]) -> None:
+        """Record the newest valid timestamp of indexed messages"""
+        times = [parse_time(msg.get('timestamp', '')) for msg in messages]
+        newest = max((time for time in times if not math.isnan(time)), default=-math.inf)
+        if newest > self._last_indexed_times.get(session_id, -math.inf):
+            self._last_indexed_times[session_id] = newest
+            
     def _load_conversations(self) -> Dict[str, List[Dict]]:
-        """Load conversations from JSON file"""
+        """Load conversations from the JSON file or the conversation log"""
+        if self.conversation_log is not None:
+            return self.conversation_log.to_dict()
         try:
             with open(self.conversations_path, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except (FileNotFoundError, json.JSONDecodeError):
             return {}
             
+    def _context_stamp(self) -> Tuple[Any, Any]:
+        """State a memoized context depends on: the conversations file and the ANN store"""
+        try:
+            stat = os.stat(self.conversations_path)
+            file_state = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            file_state = None
+        generation = self.ann_retriever.generation if self.ann_retriever else None
+        return file_state, generation
+        
     def get_enhanced_context(self, 
                            current_message: str,
                            session_id: str,
@@ -75,6 +209,11 @@ class EnhancedContextManager:
         """
         Get enhanced context combining traditional and ANN-based retrieval
         
+        Results are memoized per (session, message) until the conversations
+        file, the stored turns or the catalogue change, so every caller
+        handling one chat turn shares a single retrieval and encoder call.
+        Callers get shallow copies.
+        
         Args:
             current_message: Current user message
             session_id: Current session ID
@@ -83,30 +222,74 @@ class EnhancedContextManager:
         Returns:
             Tuple of (traditional_context, enhancement_data)
         """
-        # Get traditional context (current session history)
-        conversations_data = self._load_conversations()
-        current_session_context = conversations_data.get(session_id, [])
-        
-        # Limit traditional context
-        if len(current_session_context) > self.max_traditional_context:
-            current_session_context = current_session_context[-self.max_traditional_context:]
+        with span('enhanced_context'):
+            return self._get_enhanced_context(current_message, session_id)
+            
+    def _get_enhanced_context(self,
+                              current_message: str,
+                              session_id: str) -> Tuple[List[Dict], Dict[str, Any]]:
+        """get_enhanced_context through the memo"""
+        key = (session_id, current_message)
+        stamp = self._context_stamp()
+        with self._context_lock:
+            cached = self._context_cache.get(key)
+            if cached is not None and cached[0] == stamp:
+                self._context_cache.move_to_end(key)
+                self.context_cache_hits += 1
+                return list(cached[1]), dict(cached[2])
+            self.context_cache_misses += 1
             
+        current_session_context, enhancement_data, query = self._retrieve_enhanced_context(
+            current_message, session_id
+        )
+        # Failed retrievals are retried on the next call rather than memoized
+        if self.context_cache_size > 0 and (enhancement_data['retrieval_success'] or not self.ann_retriever):
+            with self._context_lock:
+                self._context_cache[key] = (stamp, current_session_context, enhancement_data, query)
+                self._context_cache.move_to_end(key)
+                while len(self._context_cache) > self.context_cache_size:
+                    self._context_cache.popitem(last=False)
+        return list(current_session_context), dict(enhancement_data)
+        
+    def _retrieve_enhanced_context(self,
+                                   current_message: str,
+                                   session_id: str) -> Tuple[List[Dict], Dict[str, Any], Optional[QueryContext]]:
+        """Uncached get_enhanced_context, plus the QueryContext of the message"""
+        # Get traditional context (current session history)
+        with span('traditional_context'):
+            if self.conversation_log is not None:
+                # Seeks to the session's last messages instead of parsing all history
+                current_session_context = self.conversation_log.last_messages(
+                    session_id, self.max_traditional_context
+                )
+            else:
+                conversations_data = self._load_conversations()
+                current_session_context = conversations_data.get(session_id, [])
+                
+                # Limit traditional context
+                if len(current_session_context) > self.max_traditional_context:
+                    current_session_context = current_session_context[-self.max_traditional_context:]
+                    
         # Initialize enhancement data
         enhancement_data = {
             'similar_conversations': [],
             'recommended_products': [],
+            'knowledge_matches': [],
             'context_summary': '',
             'ann_available': self.enable_ann and self.ann_retriever is not None,
             'retrieval_success': False
         }
         
         # Get ANN-based context if available
+        query = None
         if self.ann_retriever:
             try:
+                query = self.ann_retriever.prepare_query(current_message, session_id)
                 retrieval_result = self.ann_retriever.retrieve_relevant_context(
                     current_message=current_message,
                     current_session_id=session_id,
-                    exclude_current_session=True  # Get context from other sessions
+                    exclude_current_session=True,  # Get context from other sessions
+                    query=query
                 )
                 
                 enhancement_data.update({
@@ -116,11 +299,14 @@ class EnhancedContextManager:
                             'role': turn.role,
                             'session_id': turn.session_id,
                             'similarity': turn.similarity_score,
-                            'timestamp': turn.timestamp
+                            'match': turn.match,
+                            'timestamp': turn.timestamp,
+                            'occurrences': turn.occurrences
                         }
                         for turn in retrieval_result.relevant_conversations
                     ],
                     'recommended_products': retrieval_result.recommended_products,
+                    'knowledge_matches': retrieval_result.knowledge_matches,
                     'context_summary': retrieval_result.context_summary,
                     'retrieval_success': retrieval_result.retrieval_success
                 })
@@ -132,7 +318,7 @@ class EnhancedContextManager:
                 logger.error(f"ANN context retrieval failed: {e}")
                 enhancement_data['context_summary'] = "Context retrieval temporarily unavailable"
                 
-        return current_session_context, enhancement_data
+        return current_session_context, enhancement_data, query
         
     def add_message_to_context(self, 
                              session_id: str,
@@ -150,12 +336,16 @@ class EnhancedContextManager:
         """
         # Add to ANN system for future retrieval
         if self.ann_retriever:
+            # A message retrieved for moments ago keeps its embedding
+            with self._context_lock:
+                cached = self._context_cache.get((session_id, content))
             try:
                 self.ann_retriever.add_conversation_turn(
                     role=role,
                     content=content,
                     session_id=session_id,
-                    timestamp=timestamp
+                    timestamp=timestamp,
+                    query=cached[3] if cached is not None else None
                 )
             except Exception as e:
                 logger.warning(f"Failed to add message to ANN system: {e}")
@@ -183,15 +373,49 @@ class EnhancedContextManager:
             current_message, session_id, language
         )
         
-        enhanced_prompt_parts = [base_prompt]
+        return self.build_system_prompt_with_context(
+            traditional_context=current_context,
+            enhancement_data=enhancement_data,
+            current_message=current_message,
+            language=language,
+            base_prompt=base_prompt,
+            products_to_recommend=products_to_recommend
+        )
+        
+    def build_system_prompt_with_context(self,
+                                         traditional_context: List[Dict],
+                                         enhancement_data: Dict[str, Any],
+                                         current_message: str,
+                                         language: str,
+                                         base_prompt: str = '',
+                                         products_to_recommend: Optional[List[Dict]] = None) -> str:
+        """
+        Build an enhanced system prompt from already retrieved context
+        
+        Args:
+            traditional_context: Current session history
+            enhancement_data: Enhancement data from get_enhanced_context
+            current_message: Current user message
+            language: Detected language
+            base_prompt: Base system prompt
+            products_to_recommend: Current product recommendations
+            
+        Returns:
+            Enhanced system prompt with context
+        """
+        products_to_recommend = products_to_recommend or []
+        enhanced_prompt_parts = [base_prompt] if base_prompt else []
         
         # Add similar conversation context if available
         if enhancement_data['similar_conversations']:
             enhanced_prompt_parts.append("\nRELEVANT PREVIOUS CONVERSATIONS:")
             for conv in enhancement_data['similar_conversations'][:3]:  # Top 3
+                if conv.get('match') == 'keyword':
+                    relevance = "keyword match"
+                else:
+                    relevance = f"similarity: {conv['similarity']:.2f}"
                 enhanced_prompt_parts.append(
-                    f"- {conv['role'].title()}: {conv['content'][:100]}..."
-                    f" (similarity: {conv['similarity']:.2f})"
+                    f"- {conv['role'].title()}: {conv['content'][:100]}... ({relevance})"
                 )
                 
         # Add ANN product recommendations if different from current
@@ -217,6 +441,19 @@ class EnhancedContextManager:
                         f"reason: {product.get('reason', 'N/A')})"
                     )
                     
+        # Add knowledge base entries matched by keyword or tag
+        current_product_ids = {p.get('id') for p in products_to_recommend}
+        knowledge_matches = [
+            entry for entry in enhancement_data.get('knowledge_matches', [])
+            if entry.get('id') not in current_product_ids
+        ]
+        if knowledge_matches:
+            enhanced_prompt_parts.append("\nKNOWLEDGE BASE MATCHES (keywords in the current message):")
+            for entry in knowledge_matches[:2]:
+                enhanced_prompt_parts.append(
+                    f"- {entry.get('title', 'Unknown')} ({entry.get('category', 'general')})"
+                )
+                
         # Add context instructions
         if enhancement_data['ann_available'] and enhancement_data['retrieval_success']:
             enhanced_prompt_parts.append(
@@ -232,16 +469,42 @@ class EnhancedContextManager:
             
         return "\n".join(enhanced_prompt_parts)
         
-    def get_context_stats(self) -> Dict[str, Any]:
-        """Get context system statistics"""
+    def _collect_metrics(self) -> List[Tuple[str, str, str, Any]]:
+        """Memo counters for the metrics endpoint"""
+        return [
+            ('context_memo_hits_total', 'counter', 'get_enhanced_context calls served from the memo',
+             self.context_cache_hits),
+            ('context_memo_misses_total', 'counter', 'get_enhanced_context calls that ran a retrieval',
+             self.context_cache_misses),
+            ('context_memo_entries', 'gauge', 'Memoized get_enhanced_context results', len(self._context_cache)),
+            ('context_ann_enabled', 'gauge', 'Whether ANN context retrieval is enabled',
+             float(self.enable_ann and self.ann_retriever is not None))
+        ]
+        
+    def get_context_stats(self, detailed: bool = True) -> Dict[str, Any]:
+        """
+        Get context system statistics
+        
+        Args:
+            detailed: Include the retriever statistics that scan the stored
+                turns (see ANNContextRetriever.get_stats)
+        """
         stats = {
             'traditional_context_enabled': True,
             'ann_context_enabled': self.enable_ann,
             'conversations_file': self.conversations_path
         }
+        if self.conversation_log is not None:
+            stats['conversation_log'] = self.conversation_log.get_stats()
+        stats['context_cache'] = {
+            'size': len(self._context_cache),
+            'max_size': self.context_cache_size,
+            'hits': self.context_cache_hits,
+            'misses': self.context_cache_misses
+        }
         
         if self.ann_retriever:
-            stats.update(self.ann_retriever.get_stats())
+            stats.update(self.ann_retriever.get_stats(detailed))
             
         return stats
         
@@ -0,0 +1,420 @@
+"""
+Lexical Index Module
+
+Incremental BM25 inverted index for the mixed Darija / Arabic / French /
+brand-name text of customer messages, plus reciprocal rank fusion to merge
+its rankings with the dense embedding search.
+
+Dense similarities are weak on short or code-switched messages ("salam",
+"nivea 1500DA"); exact token matches are not, so the two rankings are fused
+rather than one replacing the other.
+
+Normalization folds the spelling variants that split otherwise equal tokens:
+- French accents and Arabic diacritics (harakat, shadda, hamza marks)
+- alef variants (أ إ آ ٱ → ا), alef maqsura (ى → ي), ta marbuta (ة → ه), tatweel
+- Arabic-Indic digits, and the definite article prefix (ال, وال, بال, ...)
+- mixed digit/letter tokens also index their parts ("1500da" → 1500, da)
+"""
+
+import re
+import math
+import hashlib
+import unicodedata
+import numpy as np
+from collections import Counter
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple, Union
+
+_LETTER_MAP = str.maketrans({
+    'ٱ': 'ا',
+    'ى': 'ي',
+    'ة': 'ه',
+    'ـ': None,  # tatweel
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},  # Arabic-Indic
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},  # Extended (Persian)
+})
+_ARTICLE_PREFIXES = ('وال', 'بال', 'فال', 'كال', 'ال', 'لل')
+_WORD = re.compile(r'[^\W_]+')
+_PARTS = re.compile(r'\d+|[^\W\d_]+')
+
+def normalize_text(text: str) -> str:
+    """Case-fold and strip accents, diacritics and Arabic letter variants"""
+    decomposed = unicodedata.normalize('NFD', text)
+    stripped = ''.join(ch for ch in decomposed if unicodedata.category(ch) != 'Mn')
+    return stripped.translate(_LETTER_MAP).casefold()
+
+def _strip_article(token: str) -> str:
+    for prefix in _ARTICLE_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+            return token[len(prefix):]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """Normalized index terms of a text, in order"""
+    tokens = []
+    for word in _WORD.findall(normalize_text(text)):
+        word = _strip_article(word)
+        parts = _PARTS.findall(word)
+        if len(parts) > 1:
+            tokens.append(word)
+            tokens.extend(part for part in parts if len(part) > 1 or part.isdigit())
+        elif len(word) > 1 or word.isdigit():
+            tokens.append(word)
+    return tokens
+
+class _Postings:
+    """Growable (row, term frequency) arrays of one term"""
+    
+    __slots__ = ('rows', 'frequencies', 'size', 'dead')
+    
+    def __init__(self):
+        self.rows = np.empty(4, dtype=np.int64)
+        self.frequencies = np.empty(4, dtype=np.float32)
+        self.size = 0
+        self.dead = 0  # entries of removed documents, dropped on compaction
+        
+    def append(self, row: int, frequency: int) -> None:
+        if self.size == len(self.rows):
+            self.rows = np.resize(self.rows, 2 * self.size)
+            self.frequencies = np.resize(self.frequencies, 2 * self.size)
+        self.rows[self.size] = row
+        self.frequencies[self.size] = frequency
+        self.size += 1
+        
+    @classmethod
+    def of(cls, rows: np.ndarray, frequencies: np.ndarray) -> '_Postings':
+        postings = cls.__new__(cls)
+        postings.rows = rows
+        postings.frequencies = frequencies
+        postings.size = len(rows)
+        postings.dead = 0
+        return postings
+        
+    def copy(self) -> '_Postings':
+        clone = _Postings()
+        clone.rows = self.rows[:self.size].copy()
+        clone.frequencies = self.frequencies[:self.size].copy()
+        clone.size = self.size
+        clone.dead = self.dead
+        return clone
+        
+    def compact(self, alive: np.ndarray) -> None:
+        keep = alive[self.rows[:self.size]]
+        self.size = int(keep.sum())
+        self.rows = self.rows[:len(keep)][keep].copy()
+        self.frequencies = self.frequencies[:len(keep)][keep].copy()
+        self.dead = 0
+
+class BM25Index:
+    """
+    Okapi BM25 over an in-memory inverted index
+    
+    Each term's postings are numpy arrays of document rows and term
+    frequencies, so a query scores a whole posting list in one vectorized
+    step. Documents can be added, replaced and removed at any time: removal
+    marks the row dead and its postings are dropped once dead entries make
+    up half of a list, or the whole index is renumbered once half its rows
+    are dead.
+    """
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, _Postings] = {}
+        self._row_by_id: Dict[Hashable, int] = {}
+        self._ids: List[Optional[Hashable]] = []
+        self._doc_terms: List[Optional[Counter]] = []
+        self._lengths = np.zeros(64, dtype=np.float32)
+        self._alive = np.zeros(64, dtype=bool)
+        self._hashes: Dict[Hashable, bytes] = {}
+        self._total_length = 0
+        
+    def __len__(self) -> int:
+        return len(self._row_by_id)
+        
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self._row_by_id
+        
+    def add(self, doc_id: Hashable, text: str) -> None:
+        """Index a document, replacing any previous version with this id"""
+        if doc_id in self._row_by_id:
+            self.remove(doc_id)
+        row = len(self._ids)
+        if row == len(self._lengths):
+            self._lengths = np.resize(self._lengths, 2 * row)
+            self._alive = np.resize(self._alive, 2 * row)
+        terms = Counter(tokenize(text))
+        for term, count in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = _Postings()
+            postings.append(row, count)
+        length = sum(terms.values())
+        self._ids.append(doc_id)
+        self._doc_terms.append(terms)
+        self._lengths[row] = length
+        self._alive[row] = True
+        self._row_by_id[doc_id] = row
+        self._hashes[doc_id] = _text_hash(text)
+        self._total_length += length
+        
+    def add_many(self, documents: Iterable[Tuple[Hashable, str]]) -> None:
+        for doc_id, text in documents:
+            self.add(doc_id, text)
+            
+    def remove(self, doc_id: Hashable) -> None:
+        row = self._row_by_id.pop(doc_id, None)
+        if row is None:
+            return
+        self._alive[row] = False
+        for term in self._doc_terms[row]:
+            postings = self._postings[term]
+            postings.dead += 1
+            if postings.dead == postings.size:
+                del self._postings[term]
+            elif 2 * postings.dead >= postings.size:
+                postings.compact(self._alive)
+        self._ids[row] = None
+        self._doc_terms[row] = None
+        self._total_length -= int(self._lengths[row])
+        del self._hashes[doc_id]
+        if len(self._ids) >= 1024 and 2 * len(self._row_by_id) < len(self._ids):
+            self._renumber()
+            
+    def remove_many(self, doc_ids: Iterable[Hashable]) -> None:
+        for doc_id in doc_ids:
+            self.remove(doc_id)
+            
+    def _renumber(self) -> None:
+        """Rebuild the postings over live rows only"""
+        live = [row for row in range(len(self._ids)) if self._alive[row]]
+        ids = [self._ids[row] for row in live]
+        doc_terms = [self._doc_terms[row] for row in live]
+        lengths = self._lengths[live]
+        self._postings = {}
+        for row, terms in enumerate(doc_terms):
+            for term, count in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = _Postings()
+                postings.append(row, count)
+        capacity = max(64, 2 * len(live))
+        self._lengths = np.zeros(capacity, dtype=np.float32)
+        self._lengths[:len(live)] = lengths
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[:len(live)] = True
+        self._ids = ids
+        self._doc_terms = doc_terms
+        self._row_by_id = {doc_id: row for row, doc_id in enumerate(ids)}
+        
+    def copy(self) -> 'BM25Index':
+        """
+        Independent copy of the index
+        
+        Updating a copy and swapping it in keeps the index that concurrent
+        searches hold unchanged.
+        """
+        clone = BM25Index(self.k1, self.b)
+        clone._postings = {term: postings.copy() for term, postings in self._postings.items()}
+        clone._row_by_id = dict(self._row_by_id)
+        clone._ids = list(self._ids)
+        clone._doc_terms = list(self._doc_terms)  # Counters are never modified
+        clone._lengths = self._lengths.copy()
+        clone._alive = self._alive.copy()
+        clone._hashes = dict(self._hashes)
+        clone._total_length = self._total_length
+        return clone
+        
+    @classmethod
+    def merge(cls, indexes: Sequence['BM25Index'], masks: Sequence[np.ndarray]) -> 'BM25Index':
+        """
+        One index of the documents of several, in order
+        
+        Posting lists are concatenated rather than rebuilt, so nothing is
+        tokenized again: the entries of all indexes are grouped by term with
+        one stable sort, which keeps their rows ascending.
+        
+        Args:
+            indexes: Indexes with distinct document ids
+            masks: Per index, a boolean per document in the order they were
+                added (as for search); False leaves the document out
+        """
+        merged = cls(indexes[0].k1, indexes[0].b)
+        term_codes: Dict[str, int] = {}
+        code_parts, row_parts, frequency_parts, lengths = [], [], [], []
+        for index, mask in zip(indexes, masks):
+            count = len(index._ids)
+            kept = np.flatnonzero(index._alive[:count] & mask[:count])
+            remap = np.full(count, -1, dtype=np.int64)
+            remap[kept] = np.arange(len(merged._ids), len(merged._ids) + len(kept))
+            if index._postings:
+                codes = [term_codes.setdefault(term, len(term_codes)) for term in index._postings]
+                postings = index._postings.values()
+                code_parts.append(np.repeat(codes, [entry.size for entry in postings]))
+                row_parts.append(remap[np.concatenate([entry.rows[:entry.size] for entry in postings])])
+                frequency_parts.append(np.concatenate([entry.frequencies[:entry.size] for entry in postings]))
+            for row in kept.tolist():
+                doc_id = index._ids[row]
+                merged._row_by_id[doc_id] = len(merged._ids)
+                merged._ids.append(doc_id)
+                merged._doc_terms.append(index._doc_terms[row])
+                merged._hashes[doc_id] = index._hashes[doc_id]
+            lengths.append(index._lengths[kept])
+            
+        if row_parts:
+            codes, rows = np.concatenate(code_parts), np.concatenate(row_parts)
+            frequencies = np.concatenate(frequency_parts)
+            keep = rows >= 0
+            order = np.argsort(codes[keep], kind='stable')
+            codes, rows, frequencies = codes[keep][order], rows[keep][order], frequencies[keep][order]
+            starts = np.flatnonzero(np.diff(codes, prepend=-1))
+            ends = np.append(starts[1:], len(codes))
+            terms = list(term_codes)
+            for code, start, end in zip(codes[starts].tolist(), starts.tolist(), ends.tolist()):
+                merged._postings[terms[code]] = _Postings.of(rows[start:end], frequencies[start:end])
+        lengths = np.concatenate(lengths)
+        merged._lengths = np.zeros(max(64, len(lengths)), dtype=np.float32)
+        merged._lengths[:len(lengths)] = lengths
+        merged._alive = np.zeros(len(merged._lengths), dtype=bool)
+        merged._alive[:len(lengths)] = True
+        merged._total_length = int(lengths.sum())
+        return merged
+        
+    def term_statistics(self, terms: Iterable[str]) -> Tuple[int, int, Dict[str, int]]:
+        """
+        Collection statistics for scoring across several indexes
+        
+        Returns:
+            Tuple of (documents, total length, documents containing each term)
+        """
+        frequencies = {}
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                frequencies[term] = postings.size - postings.dead
+        return len(self._row_by_id), self._total_length, frequencies
+        
+    def sync(self, documents: Dict[Hashable, str]) -> int:
+        """
+        Make the index hold exactly these documents
+        
+        Only documents that are new, changed or gone are re-indexed.
+        
+        Returns:
+            int: Number of documents added, replaced or removed
+        """
+        changed = 0
+        for doc_id in [doc_id for doc_id in self._row_by_id if doc_id not in documents]:
+            self.remove(doc_id)
+            changed += 1
+        for doc_id, text in documents.items():
+            if self._hashes.get(doc_id) != _text_hash(text):
+                self.add(doc_id, text)
+                changed += 1
+        return changed
+        
+    def search(self,
+               query: Union[str, Iterable[str]],
+               k: int,
+               where: Optional[Callable[[Hashable], bool]] = None,
+               statistics: Optional[Tuple[int, int, Dict[str, int]]] = None,
+               mask: Optional[np.ndarray] = None,
+               weights: Optional[np.ndarray] = None) -> Tuple[List[Hashable], List[float]]:
+        """
+        Best matching documents for a query
+        
+        Args:
+            query: Query text, tokenized like the documents, or its terms
+            k: Maximum number of results
+            where: Optional predicate a document id must satisfy
+            statistics: term_statistics summed over several indexes, so
+                scores from each are comparable (default: this index's own)
+            mask: Optional boolean per document in the order they were
+                added, False excluding it; the vectorized where for indexes
+                nothing was ever removed from
+            weights: Optional factor per document in the same order,
+                multiplied into its score (e.g. a recency decay)
+                
+        Returns:
+            Tuple of (document ids, BM25 scores), best match first
+        """
+        if k <= 0 or len(self._row_by_id) == 0:
+            return [], []
+        count, total_length, document_frequencies = statistics or (len(self._row_by_id), self._total_length, None)
+        average_length = total_length / count or 1.0
+        row_parts, frequency_parts, idfs, sizes = [], [], [], []
+        for term in set(tokenize(query) if isinstance(query, str) else query):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            live = postings.size - postings.dead if document_frequencies is None else document_frequencies.get(term, 0)
+            row_parts.append(postings.rows[:postings.size])
+            frequency_parts.append(postings.frequencies[:postings.size])
+            idfs.append(math.log(1.0 + (count - live + 0.5) / (live + 0.5)))
+            sizes.append(postings.size)
+        if not row_parts:
+            return [], []
+        # All query terms are scored at once, so the cost per term is a
+        # concatenation rather than a round of array operations
+        rows = np.concatenate(row_parts)
+        frequencies = np.concatenate(frequency_parts)
+        term_scores = np.repeat(np.asarray(idfs, dtype=np.float32), sizes)
+        norms = self.k1 * (1.0 - self.b + self.b * self._lengths[rows] / average_length)
+        term_scores *= frequencies * (self.k1 + 1.0) / (frequencies + norms)
+        scores = np.bincount(rows, weights=term_scores, minlength=len(self._ids)).astype(np.float32)
+        if len(self._row_by_id) < len(self._ids):
+            scores[~self._alive[:len(scores)]] = 0.0
+        if mask is not None:
+            scores[~mask[:len(scores)]] = 0.0
+        if weights is not None:
+            scores *= weights[:len(scores)]
+            
+        matched = np.flatnonzero(scores > 0)
+        results: List[Tuple[Hashable, float]] = []
+        # Widen the candidate window until enough pass the predicate
+        window = k
+        while True:
+            top = matched[np.argpartition(-scores[matched], window - 1)[:window]] if len(matched) > window else matched
+            top = top[np.argsort(-scores[top], kind='stable')]
+            results = [
+                (self._ids[row], score) for row, score in zip(top.tolist(), scores[top].tolist())
+                if where is None or where(self._ids[row])
+            ][:k]
+            if len(results) == k or len(top) == len(matched):
+                break
+            window *= 4
+        return [doc_id for doc_id, _ in results], [score for _, score in results]
+        
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            'documents': len(self._row_by_id),
+            'terms': len(self._postings),
+            'rows': len(self._ids),
+            'average_length': self._total_length / len(self._row_by_id) if self._row_by_id else 0.0
+        }
+
+def _text_hash(text: str) -> bytes:
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]],
+                           k: int = 60,
+                           weights: Optional[Sequence[float]] = None) -> List[Tuple[Hashable, float]]:
+    """
+    Merge rankings by summing weight / (k + rank) per item
+    
+    Only ranks are used, so BM25 scores and cosine similarities need no
+    calibration against each other. Ties keep first-seen order.
+    
+    Args:
+        rankings: Item ids per ranking, best first
+        k: Rank offset damping the weight of the top positions
+        weights: Optional weight per ranking (default 1.0 each)
+        
+    Returns:
+        List of (item id, fused score), best first
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[Hashable, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
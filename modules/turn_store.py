@@ -0,0 +1,1138 @@
+"""
+Turn Store Module
+
+Fixed-capacity storage for the conversation turns held by the ANN Context
+Retriever, read through immutable snapshots.
+
+Turns live in segments: immutable blocks of numpy columns (turn ids, session
+and role codes, L2-normalized embeddings) plus object columns for content
+and timestamps, each with its own BM25 keyword index and, for approximate
+backends, its own vector index. A single writer appends one segment per
+batch, removes turns by clearing bits in a copy of a segment's live mask and
+then publishes a new TurnSnapshot. Searches read one snapshot without any
+lock while the writer keeps going; segments are shared between snapshots, so
+a publish costs the new rows plus merging, never a copy of the store.
+
+Segments are tiered by doublings of their live turns and two neighbours in
+the same tier are merged into one of the next, so n stored turns span
+O(log n) segments and each turn is copied O(log n) times. Segments under
+FLOOR_ROWS turns share the bottom tier, merged only once FLOOR_SEGMENTS of
+them pile up: a merge costs far more than searching a small segment, so most
+single-turn writes publish without merging. Segments more than half removed
+are rewritten and empty ones dropped.
+
+Eviction policies, applied once capacity turns are stored:
+- oldest: first in, first out
+- session_quota: a session holding session_quota turns gives up its own
+  oldest turn; otherwise the oldest turn overall is evicted
+- lru: the turn least recently returned by a search is evicted
+
+Embeddings can be stored as float16 or per-vector scaled int8 codes
+(precision).
+
+IVF segment indexes share one coarse quantizer. It is trained by k-means on
+a background thread once min_train_size stored turns have embeddings, and
+again after the store grows by retrain_growth; the writer adopts it at its
+next write. Segment builds and merges only assign vectors to the current
+quantizer (segments get exact indexes until there is one), so k-means never
+runs on the writer thread.
+
+Duplicate collapsing (deduplicate, near_duplicate_threshold): a turn with
+the same role and text as a stored one (content_key), or whose embedding is
+at least near_duplicate_threshold similar to a stored turn of the same role,
+is not stored again. The stored turn counts the occurrence and the session
+instead, and moves to the back of the eviction order.
+
+Time: every segment keeps the parsed timestamps of its turns and their
+range, so a search limited to recent turns (since) skips older segments
+without scanning them, and recency decay multiplies the similarities of a
+segment scan as one vector. With time_partition, turn ids carry the
+partition (e.g. the day) in their high bits: segments never mix partitions,
+stay ordered by partition and merge only within one. retention removes turns
+older than its cutoff on every write; a segment past the cutoff is dropped
+whole, without touching its rows.
+"""
+
+import sys
+import math
+import time
+import threading
+import bisect
+import hashlib
+import logging
+import numpy as np
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from modules.lexical_index import BM25Index, tokenize
+from modules.vector_index import (
+    ExactIndex, IVFIndex, VectorIndex, check_precision, create_vector_index, dequantize_rows, normalize_rows,
+    quantize_rows, quantized_scores, storage_dtype, top_k_indices
+)
+
+logger = logging.getLogger(__name__)
+
+EVICTION_POLICIES = ("oldest", "session_quota", "lru")
+
+# (role, content, timestamp, session_id)
+Turn = Tuple[str, str, str, str]
+
+# Segments with fewer live turns share the bottom merge tier (a power of two)
+FLOOR_ROWS = 16
+# Bottom tier segments merged at once; other tiers merge in pairs
+FLOOR_SEGMENTS = 8
+
+# Nearest stored turns checked for a near-duplicate of the same role
+NEAR_DUPLICATE_CANDIDATES = 8
+
+# Turn id -> (occurrences, sessions) of turns that absorbed duplicates
+Occurrences = Dict[int, Tuple[int, Tuple[str, ...]]]
+
+# Turns of a write batch: turn id -> (turn, raw embedding, epoch seconds)
+Pending = Dict[int, Tuple[Turn, Optional[np.ndarray], float]]
+
+# Turn id bits below the time partition; ids stay unique for 2**32 turns
+PARTITION_SHIFT = 32
+MAX_PARTITION = 2 ** 31 - 1
+
+# (now, half-life) in seconds of a recency decay
+Recency = Tuple[float, float]
+
+def parse_time(timestamp: str) -> float:
+    """Epoch seconds of an ISO 8601 timestamp (naive ones are local time), NaN if invalid"""
+    try:
+        if timestamp.endswith('Z'):
+            timestamp = timestamp[:-1] + '+00:00'
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (AttributeError, TypeError, ValueError, OverflowError, OSError):
+        return math.nan
+
+def recency_decay(times: np.ndarray, recency: Recency) -> np.ndarray:
+    """Score factor per epoch time: 1 now, halving every half-life of age"""
+    now, half_life = recency
+    ages = np.maximum(now - times, 0.0)
+    return np.exp2(-ages / half_life).astype(np.float32)
+
+
+def content_key(role: str, content: str) -> bytes:
+    """Key of exact duplicate turns: same role, same text up to case and spacing"""
+    text = ' '.join(content.split()).casefold()
+    return hashlib.sha1(f"{role}\x00{text}".encode('utf-8')).digest()
+
+def _merge_tier(count: int) -> int:
+    """0 below FLOOR_ROWS live turns, then one tier per doubling"""
+    return max(0, count.bit_length() - FLOOR_ROWS.bit_length() + 1)
+
+def _empty_results() -> Tuple[np.ndarray, np.ndarray]:
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+class TurnSegment:
+    """
+    Immutable block of turns with ascending turn ids
+    
+    Built once by the writer from new turns or by merging older segments;
+    removing a turn never touches the segment, only the live masks of later
+    snapshots.
+    """
+    
+    def __init__(self,
+                 turn_ids: np.ndarray,
+                 role_codes: np.ndarray,
+                 session_codes: np.ndarray,
+                 session_names: List[str],
+                 contents: np.ndarray,
+                 timestamps: np.ndarray,
+                 times: np.ndarray,
+                 has_embedding: np.ndarray,
+                 codes: Optional[np.ndarray] = None,
+                 scales: Optional[np.ndarray] = None,
+                 index: Optional[VectorIndex] = None,
+                 lexicon: Optional[BM25Index] = None):
+        """
+        Args:
+            turn_ids: Ascending turn id per row
+            role_codes: Role code per row (see TurnStore)
+            session_codes: Row session as an index into session_names
+            session_names: Session ids of this segment
+            contents: Content per row (object column)
+            timestamps: Timestamp per row (object column)
+            times: Timestamp per row in epoch seconds
+            has_embedding: Whether each row has an embedding
+            codes: Quantized normalized embedding per row, zero rows where
+                has_embedding is False (exact backend)
+            scales: int8 scale per row
+            index: Vector index of the embedded rows keyed by turn id
+                (approximate backends)
+            lexicon: BM25 index of the contents keyed by turn id
+        """
+        self.turn_ids = turn_ids
+        self.role_codes = role_codes
+        self.session_codes = session_codes
+        self.session_names = session_names
+        self.contents = contents
+        self.timestamps = timestamps
+        self.times = times
+        self.has_embedding = has_embedding
+        self.codes = codes
+        self.scales = scales
+        self.index = index
+        self.lexicon = lexicon
+        self.session_index = {name: code for code, name in enumerate(session_names)}
+        # Embedded rows per session, to widen index searches that skip one
+        self.session_embedded = np.bincount(session_codes[has_embedding], minlength=len(session_names))
+        self.embedded = int(has_embedding.sum())
+        # Time range of the rows, removed ones included
+        self.start = float(times.min()) if len(times) else math.inf
+        self.end = float(times.max()) if len(times) else -math.inf
+        
+    @property
+    def partition(self) -> int:
+        """Time partition of the rows (0 without time partitioning)"""
+        return int(self.turn_ids[0]) >> PARTITION_SHIFT
+        
+    def __len__(self) -> int:
+        return len(self.turn_ids)
+        
+    def row(self, turn_id: int) -> int:
+        """Row of a turn id, -1 if the segment does not hold it"""
+        row = int(np.searchsorted(self.turn_ids, turn_id))
+        return row if row < len(self.turn_ids) and self.turn_ids[row] == turn_id else -1
+        
+    def search(self,
+               query: np.ndarray,
+               k: int,
+               live: Optional[np.ndarray],
+               exclude_session: Optional[str] = None,
+               since: Optional[float] = None,
+               recency: Optional[Recency] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Cosine search over the live rows
+        
+        Args:
+            query: Normalized query embedding
+            k: Number of results
+            live: Live mask of this segment in the snapshot searched, None
+                when every row is live
+            exclude_session: Session whose turns are masked out
+            since: Epoch seconds; older turns are masked out
+            recency: Multiply similarities by recency_decay before ranking;
+                approximate backends re-rank the neighbours they return
+                
+        Returns:
+            Tuple of (turn ids, similarities), best match first
+        """
+        excluded = self.session_index.get(exclude_session, -1) if exclude_session is not None else -1
+        recent = None
+        if since is not None and self.start < since:
+            recent = self.times >= since
+        if self.index is not None:
+            # Ask for enough extra neighbours to survive the removed rows and
+            # the session and time filters
+            extra = 0 if live is None else self.embedded - int(np.count_nonzero(live & self.has_embedding))
+            if excluded >= 0:
+                extra += int(self.session_embedded[excluded])
+            if recent is not None:
+                extra += int(np.count_nonzero(self.has_embedding & ~recent))
+            ids, scores = self.index.search(query, k + extra)
+            rows = np.searchsorted(self.turn_ids, ids)
+            keep = np.ones(len(rows), dtype=bool) if live is None else live[rows]
+            if excluded >= 0:
+                keep &= self.session_codes[rows] != excluded
+            if recent is not None:
+                keep &= recent[rows]
+            ids, scores, rows = ids[keep], scores[keep], rows[keep]
+            if recency is not None:
+                scores = scores * recency_decay(self.times[rows], recency)
+                order = np.argsort(-scores, kind='stable')
+                ids, scores = ids[order], scores[order]
+            return ids[:k], scores[:k]
+            
+        if self.codes is None:
+            return _empty_results()
+        # Masks are only built for segments that need them, as most rows of
+        # most segments are searchable
+        valid = live
+        if self.embedded < len(self.turn_ids):
+            valid = self.has_embedding if valid is None else valid & self.has_embedding
+        if excluded >= 0:
+            other = self.session_codes != excluded
+            valid = other if valid is None else valid & other
+        if recent is not None:
+            valid = recent if valid is None else valid & recent
+        scores = quantized_scores(self.codes, self.scales, query)
+        if recency is not None:
+            scores *= recency_decay(self.times, recency)
+        if valid is None:
+            top = top_k_indices(scores, k)
+            return self.turn_ids[top], scores[top]
+        candidates = np.flatnonzero(valid)
+        if len(candidates) == 0:
+            return _empty_results()
+        scores = scores[candidates]
+        top = top_k_indices(scores, k)
+        return self.turn_ids[candidates[top]], scores[top]
+        
+    @property
+    def embedding_bytes(self) -> int:
+        """Bytes held by the embedding codes or the vector index"""
+        total = self.codes.nbytes if self.codes is not None else 0
+        total += self.scales.nbytes if self.scales is not None else 0
+        return total + (self.index.nbytes if self.index is not None else 0)
+        
+    @property
+    def nbytes(self) -> int:
+        """Bytes of the columns and embeddings, excluding the Python objects"""
+        columns = (self.turn_ids, self.role_codes, self.session_codes,
+                   self.contents, self.timestamps, self.times, self.has_embedding)
+        return sum(column.nbytes for column in columns) + self.embedding_bytes
+
+class TurnSnapshot:
+    """
+    Immutable view of the stored turns
+    
+    Hold one snapshot for a whole request: every turn id it returns stays
+    readable through it, even after the writer has evicted the turn.
+    """
+    
+    def __init__(self,
+                 segments: Tuple[TurnSegment, ...],
+                 live: Tuple[np.ndarray, ...],
+                 counts: Tuple[int, ...],
+                 role_names: List[str],
+                 generation: int,
+                 occurrences: Optional[Occurrences] = None):
+        """
+        Args:
+            segments: Segments in ascending turn id order
+            live: Live mask per segment, never written after publishing
+            counts: Live turns per segment
+            role_names: Role name per role code (append-only)
+            generation: Number of snapshots published before this one
+            occurrences: (occurrences, sessions) of turns that absorbed
+                duplicates, never written after publishing
+        """
+        self.segments = segments
+        self.live = live
+        self.counts = counts
+        self.role_names = role_names
+        self.generation = generation
+        self.occurrences = occurrences if occurrences is not None else {}
+        self._first_ids = [int(segment.turn_ids[0]) for segment in segments]
+        self._size = sum(counts)
+        
+    def __len__(self) -> int:
+        return self._size
+        
+    def locate(self, turn_id: int) -> Optional[Tuple[int, int]]:
+        """(segment number, row) of a stored turn, None if it is not stored"""
+        i = bisect.bisect_right(self._first_ids, turn_id) - 1
+        if i < 0:
+            return None
+        row = self.segments[i].row(turn_id)
+        if row < 0 or not self.live[i][row]:
+            return None
+        return i, row
+        
+    def __contains__(self, turn_id: int) -> bool:
+        return self.locate(turn_id) is not None
+        
+    def _find(self, turn_id: int) -> Tuple[TurnSegment, int]:
+        location = self.locate(turn_id)
+        if location is None:
+            raise KeyError(turn_id)
+        return self.segments[location[0]], location[1]
+        
+    def get(self, turn_id: int) -> Turn:
+        """(role, content, timestamp, session_id) of a stored turn"""
+        segment, row = self._find(turn_id)
+        return (
+            self.role_names[segment.role_codes[row]],
+            segment.contents[row],
+            segment.timestamps[row],
+            segment.session_names[segment.session_codes[row]]
+        )
+        
+    def session_of(self, turn_id: int) -> str:
+        segment, row = self._find(turn_id)
+        return segment.session_names[segment.session_codes[row]]
+        
+    def occurrences_of(self, turn_id: int) -> Tuple[int, Tuple[str, ...]]:
+        """Times a stored turn was added, duplicates included, and their sessions"""
+        return self.occurrences.get(turn_id) or (1, (self.session_of(turn_id),))
+        
+    def times(self, turn_ids: List[int]) -> np.ndarray:
+        """Epoch seconds per stored turn"""
+        result = np.empty(len(turn_ids), dtype=np.float64)
+        for i, turn_id in enumerate(turn_ids):
+            segment, row = self._find(turn_id)
+            result[i] = segment.times[row]
+        return result
+        
+    def vectors(self, turn_ids: List[int]) -> List[Optional[np.ndarray]]:
+        """Normalized float32 embedding per turn, None if not stored"""
+        results: List[Optional[np.ndarray]] = [None] * len(turn_ids)
+        for i, turn_id in enumerate(turn_ids):
+            location = self.locate(turn_id)
+            if location is None:
+                continue
+            segment, row = self.segments[location[0]], location[1]
+            if segment.codes is not None and segment.has_embedding[row]:
+                scales = segment.scales[row:row + 1] if segment.scales is not None else None
+                results[i] = dequantize_rows(segment.codes[row:row + 1], scales)[0]
+        return results
+        
+    @property
+    def indexed(self) -> int:
+        """Number of stored turns that have an embedding"""
+        return sum(int(np.count_nonzero(live & segment.has_embedding))
+                   for segment, live in zip(self.segments, self.live))
+                   
+    def _masks(self, since: Optional[float] = None) -> Iterator[Tuple[TurnSegment, Optional[np.ndarray]]]:
+        """Segments with their live mask, None where no row was removed"""
+        for segment, live, count in zip(self.segments, self.live, self.counts):
+            if since is not None and segment.end < since:
+                continue
+            yield segment, live if count < len(segment) else None
+            
+    def turn_ids_in_order(self) -> List[int]:
+        """Stored turn ids, oldest first"""
+        return [turn_id for segment, live in zip(self.segments, self.live)
+                for turn_id in segment.turn_ids[live].tolist()]
+                
+    def iter_turns(self) -> Iterator[Tuple[int, Turn]]:
+        for turn_id in self.turn_ids_in_order():
+            yield turn_id, self.get(turn_id)
+            
+    def search(self,
+               query: np.ndarray,
+               k: int,
+               exclude_session: Optional[str] = None,
+               since: Optional[float] = None,
+               recency: Optional[Recency] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Cosine search over the stored embeddings
+        
+        Args:
+            query: Raw query embedding
+            k: Number of results
+            exclude_session: Session whose turns are masked out
+            since: Epoch seconds; older turns are left out and segments
+                ending before it are not scanned
+            recency: (now, half-life) of a recency decay multiplied into
+                the similarities
+                
+        Returns:
+            Tuple of (turn ids, similarities), best match first
+        """
+        if k <= 0:
+            return _empty_results()
+        query = normalize_rows(query)[0]
+        id_parts, score_parts = [], []
+        for segment, live in self._masks(since):
+            ids, scores = segment.search(query, k, live, exclude_session, since, recency)
+            if len(ids):
+                id_parts.append(ids)
+                score_parts.append(scores)
+        if not id_parts:
+            return _empty_results()
+        ids = np.concatenate(id_parts)
+        scores = np.concatenate(score_parts)
+        top = top_k_indices(scores, k)
+        return ids[top], scores[top]
+        
+    def keyword_search(self,
+                       query: str,
+                       k: int,
+                       exclude_session: Optional[str] = None,
+                       since: Optional[float] = None,
+                       recency: Optional[Recency] = None) -> Tuple[List[int], List[float]]:
+        """
+        BM25 search over the stored contents
+        
+        Every segment searched is scored with the statistics of all of them,
+        so the scores are comparable; removed turns still count until their
+        segment is rewritten. since and recency work as in search.
+        
+        Returns:
+            Tuple of (turn ids, BM25 scores), best match first
+        """
+        lexicons = [(segment, live) for segment, live in self._masks(since) if segment.lexicon is not None]
+        if k <= 0 or not lexicons:
+            return [], []
+        terms = set(tokenize(query))
+        documents, total_length, frequencies = 0, 0, {}
+        matching = []
+        for segment, live in lexicons:
+            count, length, segment_frequencies = segment.lexicon.term_statistics(terms)
+            documents += count
+            total_length += length
+            for term, frequency in segment_frequencies.items():
+                frequencies[term] = frequencies.get(term, 0) + frequency
+            if segment_frequencies:
+                matching.append((segment, live))
+        if not frequencies:
+            return [], []
+            
+        results: List[Tuple[float, int]] = []
+        for segment, live in matching:
+            # Segment lexicon documents are the segment rows, in order
+            mask = live
+            if exclude_session in segment.session_index:
+                other = segment.session_codes != segment.session_index[exclude_session]
+                mask = other if mask is None else mask & other
+            if since is not None and segment.start < since:
+                recent = segment.times >= since
+                mask = recent if mask is None else mask & recent
+            ids, scores = segment.lexicon.search(
+                terms, k, statistics=(documents, total_length, frequencies), mask=mask,
+                weights=recency_decay(segment.times, recency) if recency is not None else None
+            )
+            results.extend(zip(scores, ids))
+        # Stable, so ties keep the older turn first like a single index would
+        results.sort(key=lambda result: -result[0])
+        return [turn_id for _, turn_id in results[:k]], [score for score, _ in results[:k]]
+        
+    @property
+    def embedding_bytes(self) -> int:
+        return sum(segment.embedding_bytes for segment in self.segments)
+
+class TurnStore:
+    """
+    Fixed-capacity turn storage with a single writer and lock-free readers
+    
+    add, add_many and touch must only be called by one thread at a time (the
+    retriever runs them on its writer thread); snapshot can be read from any
+    thread.
+    """
+    
+    def __init__(self,
+                 capacity: int,
+                 eviction: str = "oldest",
+                 session_quota: Optional[int] = None,
+                 precision: str = "float32",
+                 index_backend: str = "exact",
+                 index_params: Optional[Dict[str, Any]] = None,
+                 lexicon: bool = False,
+                 deduplicate: bool = False,
+                 near_duplicate_threshold: Optional[float] = None,
+                 time_partition: Optional[float] = None,
+                 retention: Optional[float] = None):
+        """
+        Args:
+            capacity: Maximum number of stored turns
+            eviction: Eviction policy ('oldest', 'session_quota' or 'lru')
+            session_quota: Maximum turns per session for 'session_quota'
+            precision: Embedding storage ('float32', 'float16' or 'int8')
+            index_backend: 'exact' scans the embedding columns; other
+                backends of modules/vector_index.py ('ivf') are built per
+                segment in place of the columns (see above for the shared
+                IVF quantizer)
+            index_params: Keyword arguments for the index backend
+            lexicon: Keep a BM25 keyword index per segment
+            deduplicate: Collapse turns with the content_key of a stored turn
+                into it
+            near_duplicate_threshold: Also collapse turns whose embedding has
+                at least this cosine similarity with a stored turn of the
+                same role (None disables it)
+            time_partition: Seconds per time partition (e.g. 86400 for
+                days); segments never span two partitions
+            retention: Seconds a turn is kept after its timestamp; older
+                turns are removed on every write and never stored
+        """
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy '{eviction}', expected one of {EVICTION_POLICIES}")
+        if eviction == "session_quota" and not session_quota:
+            raise ValueError("The 'session_quota' eviction policy needs a session_quota")
+        if near_duplicate_threshold is not None and not 0.0 < near_duplicate_threshold <= 1.0:
+            raise ValueError(f"near_duplicate_threshold must be in (0, 1], got {near_duplicate_threshold}")
+        if time_partition is not None and time_partition <= 0:
+            raise ValueError(f"time_partition must be positive, got {time_partition}")
+        if retention is not None and retention <= 0:
+            raise ValueError(f"retention must be positive, got {retention}")
+        self.capacity = max(int(capacity), 1)
+        self.eviction = eviction
+        self.session_quota = session_quota
+        self.precision = check_precision(precision)
+        self.index_backend = index_backend
+        self.index_params = index_params or {}
+        # Rejects unknown backends and parameters up front; trains the IVF quantizer
+        self._index_template = None
+        if index_backend != "exact":
+            self._index_template = create_vector_index(
+                index_backend, **{'precision': self.precision, **self.index_params}
+            )
+        self.lexicon = lexicon
+        self.deduplicate = deduplicate
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.time_partition = time_partition
+        self.retention = retention
+        
+        # Writer bookkeeping
+        # Eviction order: turn id -> session id, oldest (or least recently retrieved) first
+        self._order: "OrderedDict[int, str]" = OrderedDict()
+        self._session_turns: Dict[str, Dict[int, None]] = {}  # turn ids, oldest first
+        self._next_turn_id = 0
+        self._role_codes: Dict[str, int] = {'user': 0, 'model': 1}
+        self._role_names: List[str] = ['user', 'model']
+        self.evictions = 0
+        self.expirations = 0
+        # Content key <-> turn id of stored turns, when deduplicating
+        self._turn_by_key: Dict[bytes, int] = {}
+        self._key_of: Dict[int, bytes] = {}
+        # Copied before the first change after a publish, as snapshots share it
+        self._occurrences: Occurrences = {}
+        self.duplicates = {'exact': 0, 'near': 0}
+        # Coarse quantizer of new IVF segment indexes and the number of
+        # vectors it was trained on; _trained is set by the training thread
+        self._centroids: Optional[np.ndarray] = None
+        self._quantizer_size = 0
+        self._trainer: Optional[threading.Thread] = None
+        self._trained: Optional[Tuple[np.ndarray, int]] = None
+        
+        # Replaced as a whole by every write
+        self.snapshot = TurnSnapshot((), (), (), self._role_names, 0, self._occurrences)
+        
+    def __len__(self) -> int:
+        return len(self.snapshot)
+        
+    def _role_code(self, role: str) -> int:
+        code = self._role_codes.get(role)
+        if code is None:
+            code = len(self._role_names)
+            self._role_codes[role] = code
+            self._role_names.append(role)
+        return code
+        
+    def _partition(self, epoch: float) -> int:
+        if self.time_partition is None:
+            return 0
+        return min(max(int(epoch // self.time_partition), 0), MAX_PARTITION)
+        
+    def retention_cutoff(self, now: Optional[float] = None) -> Optional[float]:
+        """Epoch seconds before which turns are expired, None without retention"""
+        if self.retention is None:
+            return None
+        return (time.time() if now is None else now) - self.retention
+        
+    def _expire(self, cutoff: float) -> List[int]:
+        """Forget the stored turns older than cutoff"""
+        expired: List[int] = []
+        snapshot = self.snapshot
+        for segment, live in snapshot._masks():
+            if segment.start >= cutoff:
+                continue
+            old = segment.times < cutoff
+            if live is not None:
+                old &= live
+            expired.extend(segment.turn_ids[old].tolist())
+        for turn_id in expired:
+            self._forget(turn_id)
+        self.expirations += len(expired)
+        return expired
+        
+    def _victim(self, session_id: str) -> Optional[int]:
+        """Turn id to evict before storing a turn of session_id, if any"""
+        if self.eviction == "session_quota":
+            session_turns = self._session_turns.get(session_id)
+            if session_turns and len(session_turns) >= self.session_quota:
+                return next(iter(session_turns))
+        if len(self._order) >= self.capacity:
+            return next(iter(self._order))
+        return None
+        
+    def _forget(self, turn_id: int) -> None:
+        session_id = self._order.pop(turn_id)
+        session_turns = self._session_turns[session_id]
+        del session_turns[turn_id]
+        if not session_turns:
+            del self._session_turns[session_id]
+        key = self._key_of.pop(turn_id, None)
+        if key is not None:
+            del self._turn_by_key[key]
+        if turn_id in self._occurrences:
+            del self._writable_occurrences()[turn_id]
+            
+    def _writable_occurrences(self) -> Occurrences:
+        if self._occurrences is self.snapshot.occurrences:
+            self._occurrences = dict(self._occurrences)
+        return self._occurrences
+        
+    def find_duplicate(self, key: bytes) -> Optional[int]:
+        """
+        Stored turn with this content_key, if deduplicating
+        
+        Safe to call from any thread as a hint, e.g. to skip encoding a turn
+        the writer will collapse.
+        """
+        return self._turn_by_key.get(key)
+        
+    def _near_duplicate(self,
+                        role: str,
+                        vector: np.ndarray,
+                        batch_ids: List[int],
+                        batch_roles: List[str],
+                        batch_vectors: Optional[np.ndarray]) -> Optional[int]:
+        """
+        Most similar stored turn of the role at or above the threshold
+        
+        Args:
+            role: Role of the new turn
+            vector: Normalized embedding of the new turn
+            batch_ids: Turns added earlier in this batch (not yet published)
+            batch_roles: Role of each of batch_ids
+            batch_vectors: Normalized embeddings of batch_ids, one row each
+        """
+        best, best_score = None, self.near_duplicate_threshold
+        ids, scores = self.snapshot.search(vector, NEAR_DUPLICATE_CANDIDATES)
+        for turn_id, score in zip(ids.tolist(), scores.tolist()):
+            if score < best_score:
+                break
+            # Skip turns evicted earlier in this batch
+            if turn_id in self._order and self.snapshot.get(turn_id)[0] == role:
+                best, best_score = turn_id, score
+                break
+        if batch_ids:
+            scores = batch_vectors[:len(batch_ids)] @ vector
+            for i in np.argsort(-scores, kind='stable').tolist():
+                if scores[i] < best_score:
+                    break
+                turn_id = batch_ids[i]
+                if turn_id in self._order and batch_roles[i] == role:
+                    best = turn_id
+                    break
+        return best
+        
+    def _collapse(self, turn_id: int, session_id: str) -> None:
+        """Count another occurrence of a stored turn"""
+        count, sessions = self._occurrences.get(turn_id) or (1, (self._order[turn_id],))
+        if session_id not in sessions:
+            sessions += (session_id,)
+        self._writable_occurrences()[turn_id] = (count + 1, sessions)
+        self._order.move_to_end(turn_id)
+        
+    def add(self,
+            role: str,
+            content: str,
+            timestamp: str,
+            session_id: str,
+            embedding: Optional[np.ndarray] = None) -> Tuple[int, List[int]]:
+        """
+        Store one turn and publish a snapshot; add_many publishes once per batch
+        
+        Returns:
+            Tuple of (new turn id, evicted turn ids)
+        """
+        turn_ids, evicted = self.add_many([(role, content, timestamp, session_id)], [embedding])
+        return turn_ids[0], evicted
+        
+    def add_many(self,
+                 turns: Sequence[Turn],
+                 embeddings: Sequence[Optional[np.ndarray]]) -> Tuple[List[int], List[int]]:
+        """
+        Store (role, content, timestamp, session_id) turns in order, evicting
+        according to the policy, and publish them in one new snapshot
+        
+        A duplicate (see deduplicate and near_duplicate_threshold) is not
+        stored; the stored turn it collapsed into takes its place in the
+        returned ids. Turns with an invalid timestamp count as added now.
+        
+        Returns:
+            Tuple of (new turn ids, evicted turn ids), expired turns
+            included; a turn added and evicted within the same call (or
+            already past the retention) appears in both
+        """
+        now = time.time()
+        cutoff = self.retention_cutoff(now)
+        pending: Pending = {}
+        turn_ids: List[int] = []
+        evicted: List[int] = self._expire(cutoff) if cutoff is not None else []
+        expired = len(evicted)
+        near = self.near_duplicate_threshold is not None
+        # Embedded turns of this batch, candidates for later near-duplicates
+        batch_ids: List[int] = []
+        batch_roles: List[str] = []
+        batch_vectors: Optional[np.ndarray] = None
+        for turn, embedding in zip(turns, embeddings):
+            role, content, timestamp, session_id = turn
+            epoch = parse_time(timestamp)
+            if math.isnan(epoch):
+                epoch = now
+            if cutoff is not None and epoch < cutoff:
+                turn_id = self._new_turn_id(epoch)
+                turn_ids.append(turn_id)
+                evicted.append(turn_id)
+                self.expirations += 1
+                continue
+            key = content_key(role, content) if self.deduplicate else None
+            duplicate = self._turn_by_key.get(key) if key is not None else None
+            if duplicate is not None:
+                self.duplicates['exact'] += 1
+            vector = None
+            if duplicate is None and near and embedding is not None:
+                vector = normalize_rows(embedding)[0]
+                duplicate = self._near_duplicate(role, vector, batch_ids, batch_roles, batch_vectors)
+                if duplicate is not None:
+                    self.duplicates['near'] += 1
+            if duplicate is not None:
+                self._collapse(duplicate, session_id)
+                turn_ids.append(duplicate)
+                continue
+            victim = self._victim(session_id)
+            while victim is not None:
+                self._forget(victim)
+                pending.pop(victim, None)
+                evicted.append(victim)
+                self.evictions += 1
+                victim = self._victim(session_id)
+            turn_id = self._new_turn_id(epoch)
+            self._order[turn_id] = session_id
+            self._session_turns.setdefault(session_id, {})[turn_id] = None
+            pending[turn_id] = (turn, embedding, epoch)
+            turn_ids.append(turn_id)
+            if key is not None:
+                self._turn_by_key[key] = turn_id
+                self._key_of[turn_id] = key
+            if vector is not None:
+                if batch_vectors is None:
+                    batch_vectors = np.empty((len(turns), len(vector)), dtype=np.float32)
+                batch_vectors[len(batch_ids)] = vector
+                batch_ids.append(turn_id)
+                batch_roles.append(role)
+        self._publish(pending, evicted[expired:], cutoff)
+        return turn_ids, evicted
+        
+    def _new_turn_id(self, epoch: float) -> int:
+        turn_id = (self._partition(epoch) << PARTITION_SHIFT) | self._next_turn_id
+        self._next_turn_id += 1
+        return turn_id
+        
+    def touch(self, turn_ids: List[int]) -> None:
+        """Mark turns as just retrieved (only reorders under the 'lru' policy)"""
+        if self.eviction != "lru":
+            return
+        for turn_id in turn_ids:
+            if turn_id in self._order:
+                self._order.move_to_end(turn_id)
+                
+    def _publish(self, pending: Pending, evicted: List[int], cutoff: Optional[float] = None) -> None:
+        """
+        Apply a batch to the current snapshot and publish the result
+        
+        Args:
+            pending: New turns
+            evicted: Turns to remove
+            cutoff: Retention cutoff; segments ending before it are
+                dropped whole, their turns need not be in evicted
+        """
+        snapshot = self.snapshot
+        segments, live, counts = list(snapshot.segments), list(snapshot.live), list(snapshot.counts)
+        copied = set()
+        if cutoff is not None:
+            for i, segment in enumerate(segments):
+                if segment.end < cutoff:
+                    counts[i] = 0  # dropped by _compact
+                elif segment.start < cutoff:
+                    live[i] = live[i] & (segment.times >= cutoff)
+                    counts[i] = int(np.count_nonzero(live[i]))
+                    copied.add(i)
+        for turn_id in evicted:
+            location = snapshot.locate(turn_id)  # None if evicted before it was published
+            if location is None:
+                continue
+            i, row = location
+            if i not in copied:
+                # Readers may hold the published mask, so it is never written
+                live[i] = live[i].copy()
+                copied.add(i)
+            live[i][row] = False
+            counts[i] -= 1
+        for batch in self._split_partitions(pending):
+            segment = self._build_segment(batch)
+            # Segments stay in turn id order, i.e. by partition
+            i = len(segments)
+            while i > 0 and segments[i - 1].turn_ids[0] > segment.turn_ids[0]:
+                i -= 1
+            segments.insert(i, segment)
+            live.insert(i, np.ones(len(batch), dtype=bool))
+            counts.insert(i, len(batch))
+        self._compact(segments, live, counts)
+        self.snapshot = TurnSnapshot(
+            tuple(segments), tuple(live), tuple(counts), self._role_names,
+            snapshot.generation + 1, self._occurrences
+        )
+        self._update_quantizer()
+        
+    def _update_quantizer(self) -> None:
+        """Adopt a quantizer trained in the background and start training one when due"""
+        template = self._index_template
+        if not isinstance(template, IVFIndex):
+            return
+        if self._trainer is not None:
+            if self._trainer.is_alive():
+                return
+            self._trainer = None
+            if self._trained is not None:
+                self._centroids, self._quantizer_size = self._trained
+                self._trained = None
+                
+        # Embedded rows, removed ones awaiting a rewrite included
+        embedded = sum(segment.embedded for segment in self.snapshot.segments)
+        if self._centroids is None:
+            due = embedded >= template.min_train_size
+        else:
+            due = bool(template.retrain_growth) and embedded >= template.retrain_growth * self._quantizer_size
+        if due:
+            self._trainer = threading.Thread(
+                target=self._train_quantizer, args=(self.snapshot,), name="turn-store-quantizer", daemon=True
+            )
+            self._trainer.start()
+            
+    def _train_quantizer(self, snapshot: TurnSnapshot) -> None:
+        """Train an IVF quantizer on the embeddings of a snapshot (training thread)"""
+        try:
+            started = time.perf_counter()
+            vectors = np.concatenate([segment.index.get_vectors()[1] for segment in snapshot.segments
+                                      if segment.index is not None and len(segment.index)])
+            centroids = self._index_template.train_quantizer(vectors)
+            self._trained = (centroids, len(vectors))
+            logger.info(f"Turn store IVF quantizer trained: {len(vectors)} vectors in {len(centroids)} lists "
+                        f"({time.perf_counter() - started:.2f}s)")
+        except Exception as e:
+            logger.warning(f"Turn store IVF quantizer training failed: {e}")
+            
+    def _split_partitions(self, pending: Pending) -> List[Pending]:
+        """New turns grouped by time partition, each in turn id order"""
+        if not pending:
+            return []
+        if self.time_partition is None:
+            return [pending]
+        batches: Dict[int, Pending] = {}
+        for turn_id, entry in pending.items():
+            batches.setdefault(turn_id >> PARTITION_SHIFT, {})[turn_id] = entry
+        return list(batches.values())
+        
+    def _compact(self, segments: List[TurnSegment], live: List[np.ndarray], counts: List[int]) -> None:
+        """Drop empty segments, rewrite mostly removed ones and merge small neighbours"""
+        i = 0
+        while i < len(segments):
+            if counts[i] == 0:
+                del segments[i], live[i], counts[i]
+                continue
+            if 2 * counts[i] < len(segments[i]):
+                segments[i] = self._merge([segments[i]], [live[i]])
+                live[i] = np.ones(counts[i], dtype=bool)
+            i += 1
+            
+        # Runs of segments in the tier of the run's newest one or below are
+        # merged once long enough, newest runs first; runs stay within one
+        # time partition
+        end = len(segments)
+        while end > 0:
+            tier = _merge_tier(counts[end - 1])
+            partition = segments[end - 1].partition
+            start = end - 1
+            while start > 0 and _merge_tier(counts[start - 1]) <= tier and \
+                    segments[start - 1].partition == partition:
+                start -= 1
+            if end - start < (FLOOR_SEGMENTS if tier == 0 else 2):
+                end = start
+                continue
+            merged = self._merge(segments[start:end], live[start:end])
+            segments[start:end] = [merged]
+            counts[start:end] = [len(merged)]
+            live[start:end] = [np.ones(len(merged), dtype=bool)]
+            end = len(segments)
+            
+    def _build_segment(self, pending: Pending) -> TurnSegment:
+        """Segment of newly added turns"""
+        turn_ids = np.fromiter(pending, dtype=np.int64, count=len(pending))
+        turns = [turn for turn, _, _ in pending.values()]
+        embeddings = [embedding for _, embedding, _ in pending.values()]
+        
+        session_index: Dict[str, int] = {}
+        session_codes = np.array(
+            [session_index.setdefault(turn[3], len(session_index)) for turn in turns], dtype=np.int32
+        )
+        has_embedding = np.array([embedding is not None for embedding in embeddings], dtype=bool)
+        codes = scales = index = None
+        if has_embedding.any():
+            dimension = np.ravel(embeddings[int(np.argmax(has_embedding))]).shape[0]
+            vectors = np.zeros((len(turns), dimension), dtype=np.float32)
+            for row, embedding in enumerate(embeddings):
+                if embedding is not None:
+                    vectors[row] = np.ravel(embedding)
+            vectors = normalize_rows(vectors)
+            if self.index_backend == "exact":
+                codes, scales = quantize_rows(vectors, self.precision)
+            else:
+                index = self._new_index(int(has_embedding.sum()))
+                index.add(turn_ids[has_embedding], vectors[has_embedding])
+                
+        contents = _object_column([turn[1] for turn in turns])
+        return TurnSegment(
+            turn_ids=turn_ids,
+            role_codes=np.array([self._role_code(turn[0]) for turn in turns], dtype=np.int8),
+            session_codes=session_codes,
+            session_names=list(session_index),
+            contents=contents,
+            timestamps=_object_column([turn[2] for turn in turns]),
+            times=np.fromiter((epoch for _, _, epoch in pending.values()), dtype=np.float64, count=len(pending)),
+            has_embedding=has_embedding,
+            codes=codes,
+            scales=scales,
+            index=index,
+            lexicon=self._lexicon(turn_ids, contents)
+        )
+        
+    def _merge(self, segments: List[TurnSegment], masks: List[np.ndarray]) -> TurnSegment:
+        """One segment holding the live turns of consecutive segments"""
+        rows = [np.flatnonzero(mask) for mask in masks]
+        parts = list(zip(segments, rows))
+        turn_ids = np.concatenate([segment.turn_ids[row] for segment, row in parts])
+        
+        # Re-intern the sessions that still have turns
+        session_index: Dict[str, int] = {}
+        session_parts = []
+        for segment, row in parts:
+            session_codes = segment.session_codes[row]
+            remap = np.full(len(segment.session_names), -1, dtype=np.int32)
+            for code in np.unique(session_codes).tolist():
+                remap[code] = session_index.setdefault(segment.session_names[code], len(session_index))
+            session_parts.append(remap[session_codes])
+            
+        codes = scales = index = None
+        dimensions = [segment.codes.shape[1] for segment in segments if segment.codes is not None]
+        if dimensions:
+            dtype = storage_dtype(self.precision)
+            codes = np.concatenate([
+                segment.codes[row] if segment.codes is not None else np.zeros((len(row), dimensions[0]), dtype=dtype)
+                for segment, row in parts
+            ])
+            if self.precision == "int8":
+                scales = np.concatenate([
+                    segment.scales[row] if segment.codes is not None else np.ones(len(row), dtype=np.float32)
+                    for segment, row in parts
+                ])
+        indexed = [segment.index.get_vectors() for segment in segments
+                   if segment.index is not None and len(segment.index)]
+        if indexed:
+            ids = np.concatenate([ids for ids, _ in indexed])
+            vectors = np.concatenate([vectors for _, vectors in indexed])
+            keep = np.isin(ids, turn_ids)
+            if keep.any():
+                index = self._new_index(int(keep.sum()))
+                index.add(ids[keep], vectors[keep])
+                
+        lexicon = None
+        if self.lexicon:
+            lexicon = BM25Index.merge([segment.lexicon for segment in segments], masks)
+        return TurnSegment(
+            turn_ids=turn_ids,
+            role_codes=np.concatenate([segment.role_codes[row] for segment, row in parts]),
+            session_codes=np.concatenate(session_parts),
+            session_names=list(session_index),
+            contents=np.concatenate([segment.contents[row] for segment, row in parts]),
+            timestamps=np.concatenate([segment.timestamps[row] for segment, row in parts]),
+            times=np.concatenate([segment.times[row] for segment, row in parts]),
+            has_embedding=np.concatenate([segment.has_embedding[row] for segment, row in parts]),
+            codes=codes,
+            scales=scales,
+            index=index,
+            lexicon=lexicon
+        )
+        
+    def _new_index(self, size: int) -> VectorIndex:
+        """
+        Index of a new or merged segment of size vectors
+        
+        IVF segments use the shared quantizer as is; smaller than
+        min_train_size or before the quantizer is trained they are exact,
+        as an untrained IVF index is.
+        """
+        if isinstance(self._index_template, IVFIndex):
+            if self._centroids is None or size < self._index_template.min_train_size:
+                return ExactIndex(self.precision)
+            return create_vector_index(
+                self.index_backend, **{'precision': self.precision, **self.index_params, 'centroids': self._centroids}
+            )
+        return create_vector_index(self.index_backend, **{'precision': self.precision, **self.index_params})
+        
+    def _lexicon(self, turn_ids: np.ndarray, contents: np.ndarray) -> Optional[BM25Index]:
+        """Keyword index of new turns, which covers turns without an embedding too"""
+        if not self.lexicon:
+            return None
+        lexicon = BM25Index()
+        lexicon.add_many(zip(turn_ids.tolist(), contents))
+        return lexicon
+        
+    def memory_usage(self) -> Dict[str, float]:
+        """
+        Memory held by the store
+        
+        used_bytes counts the columns, embeddings and Python objects of every
+        segment row, removed rows awaiting a rewrite included, plus the
+        eviction bookkeeping; keyword indexes are not counted.
+        bytes_per_turn divides it by the stored turns.
+        """
+        snapshot = self.snapshot
+        column_bytes = sum(segment.nbytes for segment in snapshot.segments)
+        object_bytes = 0
+        for segment in snapshot.segments:
+            for content, timestamp in zip(segment.contents, segment.timestamps):
+                object_bytes += sys.getsizeof(content) + sys.getsizeof(timestamp)
+        # Bookkeeping dicts: eviction order, per-session membership and
+        # content keys (20-byte digests)
+        bookkeeping_bytes = sys.getsizeof(self._order) + sum(
+            sys.getsizeof(turns) + sys.getsizeof(session_id) for session_id, turns in self._session_turns.items()
+        )
+        bookkeeping_bytes += sys.getsizeof(self._turn_by_key) + sys.getsizeof(self._key_of) + \
+            len(self._key_of) * sys.getsizeof(bytes(20)) + sys.getsizeof(self._occurrences)
+        used_bytes = column_bytes + object_bytes + bookkeeping_bytes
+        rows = sum(len(segment) for segment in snapshot.segments)
+        return {
+            'turns': len(snapshot),
+            'capacity': self.capacity,
+            'segments': len(snapshot.segments),
+            'removed_rows': rows - len(snapshot),
+            'bytes_per_turn': used_bytes / len(snapshot) if len(snapshot) else 0.0,
+            'used_bytes': used_bytes,
+            'object_bytes': object_bytes,
+            'bookkeeping_bytes': bookkeeping_bytes
+        }
+        
+    def get_stats(self, memory: bool = True) -> Dict[str, object]:
+        """
+        Args:
+            memory: Include memory_usage(), which walks every stored turn
+        """
+        snapshot = self.snapshot
+        stats = {
+            'eviction_policy': self.eviction,
+            'precision': self.precision,
+            'index_backend': self.index_backend,
+            'session_quota': self.session_quota,
+            'sessions': len(self._session_turns),
+            'evictions': self.evictions,
+            'time_partition': self.time_partition,
+            'retention': self.retention,
+            'expirations': self.expirations,
+            'partitions': len({segment.partition for segment in snapshot.segments}),
+            'deduplicate': self.deduplicate,
+            'near_duplicate_threshold': self.near_duplicate_threshold,
+            'duplicates': dict(self.duplicates),
+            'collapsed_turns': len(self._occurrences),
+            'generation': snapshot.generation,
+            'quantizer_lists': len(self._centroids) if self._centroids is not None else 0,
+            'turns': len(snapshot),
+            'capacity': self.capacity,
+            'segments': len(snapshot.segments)
+        }
+        if memory:
+            stats.update(self.memory_usage())
+        return stats
+
+def _object_column(values: List[Any]) -> np.ndarray:
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
@@ -0,0 +1,404 @@
+"""
+Vector Index Module
+
+Nearest-neighbour indexes used by the ANN Context Retriever to search
+conversation turn embeddings.
+
+All indexes store L2-normalized float32 vectors keyed by integer ids and rank
+by inner product (cosine similarity). Backends:
+- exact: brute-force scan over one contiguous matrix
+- ivf: inverted file with spherical k-means coarse quantization; only the
+  n_probe closest lists are scanned, so query cost is sublinear in the
+  number of stored vectors. Supports incremental inserts and deletes.
+
+Both backends take a storage precision: float32 (default), float16 (half
+the memory) or int8 (per-vector scaled codes, a quarter of the memory plus
+one float32 scale per vector). The quantization helpers are
+utils/quantization.py of the ANN recommendation system, re-exported here.
+"""
+
+import logging
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+# Puts the ANN system on sys.path
+import modules.ann_system
+from utils.quantization import (
+    PRECISIONS, check_precision, dequantize_rows, quantize_rows, quantized_scores, storage_dtype
+)
+
+logger = logging.getLogger(__name__)
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Return float32 copies of the vectors scaled to unit length"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if len(scores) > k:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+class VectorIndex(ABC):
+    """Interface shared by all index backends"""
+    
+    name = "base"
+    
+    @abstractmethod
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        """Insert vectors under new integer ids"""
+        
+    @abstractmethod
+    def remove(self, ids: np.ndarray) -> None:
+        """Delete vectors by id, unknown ids are ignored"""
+        
+    @abstractmethod
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k stored vectors with the highest cosine similarity
+        
+        Returns:
+            Tuple of (ids, similarities), best match first
+        """
+        
+    @abstractmethod
+    def get_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """All stored (ids, vectors)"""
+        
+    @property
+    @abstractmethod
+    def nbytes(self) -> int:
+        """Bytes reserved for the stored vectors"""
+        
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of stored vectors"""
+
+class _VectorBlock:
+    """Growable matrix of vectors with an id column and swap-remove deletes"""
+    
+    def __init__(self, dimension: int, capacity: int = 64, precision: str = "float32"):
+        self.precision = check_precision(precision)
+        self.vectors = np.zeros((capacity, dimension), dtype=storage_dtype(precision))
+        self.scales = np.ones(capacity, dtype=np.float32) if precision == "int8" else None
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        
+    def append(self, ids: np.ndarray, vectors: np.ndarray) -> int:
+        """Append rows, returning the row of the first one"""
+        needed = self.size + len(ids)
+        if needed > len(self.ids):
+            capacity = max(needed, 2 * len(self.ids))
+            grown = np.zeros((capacity, self.vectors.shape[1]), dtype=self.vectors.dtype)
+            grown[:self.size] = self.vectors[:self.size]
+            self.vectors = grown
+            self.ids = np.resize(self.ids, capacity)
+            if self.scales is not None:
+                self.scales = np.resize(self.scales, capacity)
+        first = self.size
+        codes, scales = quantize_rows(vectors, self.precision)
+        self.vectors[first:needed] = codes
+        if self.scales is not None:
+            self.scales[first:needed] = scales
+        self.ids[first:needed] = ids
+        self.size = needed
+        return first
+        
+    def remove_row(self, row: int) -> Optional[int]:
+        """Delete a row by moving the last row into it, returning the moved id"""
+        last = self.size - 1
+        self.size = last
+        if row == last:
+            return None
+        self.vectors[row] = self.vectors[last]
+        if self.scales is not None:
+            self.scales[row] = self.scales[last]
+        self.ids[row] = self.ids[last]
+        return int(self.ids[row])
+        
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Inner product of every stored row with a normalized query"""
+        scales = self.scales[:self.size] if self.scales is not None else None
+        return quantized_scores(self.vectors[:self.size], scales, query)
+        
+    def get_vectors(self) -> np.ndarray:
+        """Stored rows as float32"""
+        scales = self.scales[:self.size] if self.scales is not None else None
+        return dequantize_rows(self.vectors[:self.size], scales)
+        
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes + self.ids.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+class ExactIndex(VectorIndex):
+    """Brute-force index: one matrix-vector product per query"""
+    
+    name = "exact"
+    
+    def __init__(self, precision: str = "float32"):
+        """
+        Args:
+            precision: Storage precision ('float32', 'float16' or 'int8')
+        """
+        self.precision = check_precision(precision)
+        self._block: Optional[_VectorBlock] = None
+        self._rows: Dict[int, int] = {}
+        
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        vectors = normalize_rows(vectors)
+        if self._block is None:
+            self._block = _VectorBlock(vectors.shape[1], precision=self.precision)
+        first = self._block.append(ids, vectors)
+        self._rows.update(zip(np.asarray(ids).tolist(), range(first, first + len(ids))))
+        
+    def remove(self, ids: np.ndarray) -> None:
+        for turn_id in np.asarray(ids).tolist():
+            row = self._rows.pop(turn_id, None)
+            if row is None:
+                continue
+            moved = self._block.remove_row(row)
+            if moved is not None:
+                self._rows[moved] = row
+                
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if not self._rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = normalize_rows(query)[0]
+        scores = self._block.scores(query)
+        top = top_k_indices(scores, k)
+        return self._block.ids[top], scores[top]
+        
+    def get_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """All stored (ids, vectors)"""
+        if self._block is None:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+        return self._block.ids[:self._block.size].copy(), self._block.get_vectors()
+        
+    @property
+    def nbytes(self) -> int:
+        """Bytes reserved for stored vectors, ids and scales"""
+        return self._block.nbytes if self._block is not None else 0
+        
+    def __len__(self) -> int:
+        return len(self._rows)
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted file index with spherical k-means coarse quantization
+    
+    Until min_train_size vectors have been added it behaves as an exact
+    index. It then clusters a sample into n_lists centroids (sqrt of the
+    size when not given) and stores every vector in the list of its closest
+    centroid. Queries scan only the n_probe best lists. New vectors go to
+    their closest existing list; the quantizer is retrained when the index
+    has grown by retrain_growth since the last training.
+    
+    Given centroids (from train_quantizer, possibly of another index), the
+    index starts trained, only assigns vectors and never retrains.
+    """
+    
+    name = "ivf"
+    
+    def __init__(self,
+                 n_lists: Optional[int] = None,
+                 n_probe: int = 8,
+                 min_train_size: int = 4096,
+                 max_train_sample: int = 65536,
+                 kmeans_iterations: int = 10,
+                 retrain_growth: Optional[float] = 4.0,
+                 seed: int = 0,
+                 precision: str = "float32",
+                 centroids: Optional[np.ndarray] = None):
+        """
+        Args:
+            n_lists: Number of inverted lists (default: sqrt of the training size)
+            n_probe: Number of lists scanned per query
+            min_train_size: Vectors needed before the quantizer is trained
+            max_train_sample: Maximum vectors used for k-means
+            kmeans_iterations: Lloyd iterations per training
+            retrain_growth: Retrain when the size grows by this factor (None: never)
+            seed: Random seed for sampling and centroid initialisation
+            precision: Storage precision of the list vectors ('float32',
+                'float16' or 'int8'); centroids stay float32
+            centroids: Trained coarse quantizer to use as is, shared and
+                never written
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_train_size = min_train_size
+        self.max_train_sample = max_train_sample
+        self.kmeans_iterations = kmeans_iterations
+        self.retrain_growth = retrain_growth
+        self._rng = np.random.default_rng(seed)
+        self.precision = check_precision(precision)
+        
+        self._flat = ExactIndex(precision)  # Used until the quantizer is trained
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[_VectorBlock] = []
+        self._locations: Dict[int, Tuple[int, int]] = {}
+        self._trained_size = 0
+        if centroids is not None:
+            self._centroids = centroids
+            self._lists = [_VectorBlock(centroids.shape[1], precision=self.precision) for _ in range(len(centroids))]
+            self.retrain_growth = None
+        
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+        
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = normalize_rows(vectors)
+        if not self.is_trained:
+            self._flat.add(ids, vectors)
+            if len(self._flat) >= self.min_train_size:
+                self._train(*self._flat.get_vectors())
+                self._flat = ExactIndex(self.precision)
+            return
+            
+        self._insert(ids, vectors)
+        if self.retrain_growth and len(self) >= self.retrain_growth * self._trained_size:
+            self._train(*self._get_all_vectors())
+            
+    def remove(self, ids: np.ndarray) -> None:
+        if not self.is_trained:
+            self._flat.remove(ids)
+            return
+        for turn_id in np.asarray(ids).tolist():
+            location = self._locations.pop(turn_id, None)
+            if location is None:
+                continue
+            list_no, row = location
+            moved = self._lists[list_no].remove_row(row)
+            if moved is not None:
+                self._locations[moved] = (list_no, row)
+                
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if not self.is_trained:
+            return self._flat.search(query, k)
+        if not self._locations:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            
+        query = normalize_rows(query)[0]
+        probes = top_k_indices(self._centroids @ query, self.n_probe)
+        id_parts, score_parts = [], []
+        for list_no in probes:
+            block = self._lists[list_no]
+            if block.size == 0:
+                continue
+            id_parts.append(block.ids[:block.size])
+            score_parts.append(block.scores(query))
+        if not id_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            
+        ids = np.concatenate(id_parts)
+        scores = np.concatenate(score_parts)
+        top = top_k_indices(scores, k)
+        return ids[top], scores[top]
+        
+    def __len__(self) -> int:
+        return len(self._flat) if not self.is_trained else len(self._locations)
+        
+    def get_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """All stored (ids, vectors)"""
+        if not self.is_trained:
+            return self._flat.get_vectors()
+        if not self._locations:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+        return self._get_all_vectors()
+        
+    @property
+    def nbytes(self) -> int:
+        """Bytes reserved for stored vectors, ids, scales and centroids"""
+        centroids = self._centroids.nbytes if self._centroids is not None else 0
+        return self._flat.nbytes + centroids + sum(block.nbytes for block in self._lists)
+        
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return _closest_centroids(vectors, self._centroids)
+        
+    def _insert(self, ids: np.ndarray, vectors: np.ndarray):
+        """Append vectors to the lists of their closest centroids"""
+        assignments = self._assign(vectors)
+        for list_no in np.unique(assignments):
+            members = np.flatnonzero(assignments == list_no)
+            first = self._lists[list_no].append(ids[members], vectors[members])
+            for offset, turn_id in enumerate(ids[members].tolist()):
+                self._locations[turn_id] = (int(list_no), first + offset)
+                
+    def _get_all_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        blocks = [block for block in self._lists if block.size]
+        ids = np.concatenate([block.ids[:block.size] for block in blocks])
+        vectors = np.concatenate([block.get_vectors() for block in blocks])
+        return ids, vectors
+        
+    def train_quantizer(self, vectors: np.ndarray, size: Optional[int] = None) -> np.ndarray:
+        """
+        Centroids of a sample of vectors by spherical k-means
+        
+        Args:
+            vectors: Normalized vectors to cluster
+            size: Number of vectors the quantizer is for, which sets the
+                default n_lists (default: len(vectors))
+            
+        Returns:
+            np.ndarray: (n_lists, dimension) normalized centroids
+        """
+        size = size or len(vectors)
+        n_lists = self.n_lists or max(int(np.sqrt(size)), 1)
+        n_lists = min(n_lists, len(vectors))
+        
+        sample = vectors
+        if len(vectors) > self.max_train_sample:
+            sample = vectors[self._rng.choice(len(vectors), self.max_train_sample, replace=False)]
+        centroids = sample[self._rng.choice(len(sample), n_lists, replace=False)].copy()
+        
+        for _ in range(self.kmeans_iterations):
+            assignments = _closest_centroids(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=n_lists)
+            empty = counts == 0
+            if empty.any():
+                # Reseed empty clusters with random sample vectors
+                sums[empty] = sample[self._rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize_rows(sums)
+        return centroids
+        
+    def _train(self, ids: np.ndarray, vectors: np.ndarray):
+        """Cluster a sample with spherical k-means and rebuild all lists"""
+        size = len(vectors)
+        self._centroids = self.train_quantizer(vectors)
+        n_lists = len(self._centroids)
+        self._lists = [_VectorBlock(vectors.shape[1], precision=self.precision) for _ in range(n_lists)]
+        self._locations = {}
+        self._insert(ids, vectors)
+        self._trained_size = size
+        logger.info(f"IVF index trained: {size} vectors in {n_lists} lists")
+
+def _closest_centroids(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 16384) -> np.ndarray:
+    """Closest centroid per vector, computed in chunks to bound memory"""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = vectors[start:start + chunk_size]
+        assignments[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+INDEX_BACKENDS = {
+    ExactIndex.name: ExactIndex,
+    IVFIndex.name: IVFIndex,
+}
+
+def create_vector_index(backend: str = "exact", **params) -> VectorIndex:
+    """Create an index backend by name ('exact' or 'ivf')"""
+    try:
+        return INDEX_BACKENDS[backend](**params)
+    except KeyError:
+        raise ValueError(f"Unknown vector index backend: {backend}")
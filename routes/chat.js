@@ -6,6 +6,7 @@ const { v4: uuidv4 } = require('uuid');
 
 // Import Enhanced Context Interface
 const EnhancedContextInterface = require('../modules/enhanced_context_interface');
+const conversationLog = require('../modules/conversation_log');
 
 const personasPath = path.join(__dirname, '..', 'config', 'personas.json');
 const KB_PATH = path.join(__dirname, '..', 'data', 'knowledge.json');
@@ -843,11 +844,13 @@ function addMessageToHistory(sessionId, role, content) {
   }
   
   // Add new message
-  conversations[sessionId].push({
+  const message = {
     role: role,
     content: content,
     timestamp: new Date().toISOString()
-  });
+  };
+  conversations[sessionId].push(message);
+  conversationLog.appendMessage(sessionId, message);
   
   // Cleanup old messages if conversation gets too long
   if (conversations[sessionId].length > CONVERSATION_CLEANUP_THRESHOLD * 2) {
@@ -903,6 +906,7 @@ function cleanupOldConversations() {
         
         if (lastMessageDate < sevenDaysAgo) {
           delete conversations[sessionId];
+          conversationLog.deleteSession(sessionId);
           cleaned = true;
         }
       }
@@ -2,6 +2,7 @@ const express = require('express');
 const router = express.Router();
 const fs = require('fs');
 const path = require('path');
+const conversationLog = require('../modules/conversation_log');
 
 const CONVERSATIONS_PATH = path.join(__dirname, '..', 'data', 'conversations.json');
 
@@ -68,6 +69,7 @@ router.delete('/:sessionId', (req, res) => {
   
   delete conversations[req.params.sessionId];
   saveConversations(conversations);
+  conversationLog.deleteSession(req.params.sessionId);
   
   res.json({ success: true, message: 'Conversation deleted' });
 });
@@ -75,6 +77,7 @@ router.delete('/:sessionId', (req, res) => {
 // Clear all conversations (admin function)
 router.delete('/', (req, res) => {
   saveConversations({});
+  conversationLog.clearAll();
   res.json({ success: true, message: 'All conversations cleared' });
 });
 
@@ -0,0 +1,38 @@
+"""
+Shared pytest setup: the chat side (modules) and the ANN recommendation
+system (utils, models) import from their own roots, as in production, and
+embeddings come from the offline hashing backend.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+ANN_SYSTEM_PATH = ROOT / 'ANN recommendation system'
+
+for path in (ROOT, ANN_SYSTEM_PATH):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+# Read when utils.embeddings is first imported
+os.environ.setdefault('EMBEDDING_BACKEND', 'hashing')
+
+@pytest.fixture
+def make_retriever():
+    """ANNContextRetriever factory over the bundled ANN system, closed after the test"""
+    from modules.ann_context_retriever import ANNContextRetriever
+    retrievers = []
+    
+    def make(**kwargs):
+        kwargs.setdefault('knowledge_path', None)
+        retriever = ANNContextRetriever(ann_system_path=str(ANN_SYSTEM_PATH), **kwargs)
+        assert retriever.embedding_model is not None
+        retrievers.append(retriever)
+        return retriever
+        
+    yield make
+    for retriever in retrievers:
+        retriever._writer.shutdown()
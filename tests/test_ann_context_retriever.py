@@ -0,0 +1,107 @@
+"""Turn storage and retrieval of the ANN Context Retriever"""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from modules.enhanced_context_manager import EnhancedContextManager
+
+NIVEA = 'Do you sell the nivea moisturizing cream for very dry winter skin'
+KNOWLEDGE_PATH = str(Path(__file__).resolve().parent.parent / 'data' / 'knowledge.json')
+
+def _contents(result):
+    return [turn.content for turn in result.relevant_conversations]
+
+def test_keyword_matches_need_hybrid_retrieval(make_retriever):
+    for hybrid in (False, True):
+        retriever = make_retriever(hybrid_retrieval=hybrid)
+        retriever.add_conversation_turn('user', NIVEA, 'other')
+        retriever.add_conversation_turn('user', 'what time does the store open on friday', 'other')
+        result = retriever.retrieve_relevant_context('nivea', 'current', True)
+        if not hybrid:
+            # Dense only: nothing reaches the similarity threshold
+            assert result.relevant_conversations == []
+            continue
+        [turn] = result.relevant_conversations
+        assert turn.content == NIVEA
+        assert turn.similarity_score < retriever.similarity_threshold
+        assert turn.match == 'keyword'
+        
+def test_keyword_matches_are_labelled_in_the_prompt():
+    manager = EnhancedContextManager.__new__(EnhancedContextManager)
+    prompt = manager.build_system_prompt_with_context([], {
+        'similar_conversations': [
+            {'role': 'user', 'content': 'running shoes', 'similarity': 0.91, 'match': 'semantic'},
+            {'role': 'user', 'content': NIVEA, 'similarity': 0.13, 'match': 'keyword'}
+        ],
+        'recommended_products': [],
+        'knowledge_matches': [],
+        'context_summary': '',
+        'ann_available': True,
+        'retrieval_success': True
+    }, 'nivea', 'en')
+    assert '(similarity: 0.91)' in prompt
+    assert '(keyword match)' in prompt
+    assert '0.13' not in prompt
+
+def test_knowledge_base_is_searched_only_with_hybrid_retrieval(make_retriever):
+    manager = EnhancedContextManager.__new__(EnhancedContextManager)
+    for hybrid in (False, True):
+        retriever = make_retriever(hybrid_retrieval=hybrid, knowledge_path=KNOWLEDGE_PATH)
+        result = retriever.retrieve_relevant_context('nivea cream', 'current', True)
+        prompt = manager.build_system_prompt_with_context([], {
+            'similar_conversations': [],
+            'recommended_products': [],
+            'knowledge_matches': result.knowledge_matches,
+            'context_summary': '',
+            'ann_available': True,
+            'retrieval_success': True
+        }, 'nivea cream', 'en')
+        assert bool(result.knowledge_matches) == hybrid
+        assert ('KNOWLEDGE BASE MATCHES' in prompt) == hybrid
+        
+def test_exact_duplicates_collapse_into_the_stored_turn(make_retriever):
+    retriever = make_retriever(deduplicate=True)
+    retriever.add_conversation_turn('user', NIVEA, 'a')
+    retriever.add_conversation_turn('user', '  ' + NIVEA.upper(), 'b')
+    retriever.add_conversation_turn('model', NIVEA, 'b')
+    assert len(retriever.snapshot) == 2
+    assert retriever.turn_store.duplicates['exact'] == 1
+    [turn] = [turn for turn in retriever.retrieve_relevant_context(NIVEA, 'c', True).relevant_conversations
+              if turn.role == 'user']
+    assert turn.occurrences == 2
+    assert turn.sessions == ['a', 'b']
+
+def test_near_duplicates_collapse_only_when_enabled(make_retriever):
+    for threshold in (None, 0.95):
+        retriever = make_retriever(near_duplicate_threshold=threshold)
+        retriever.add_conversation_turn('user', NIVEA, 'a')
+        retriever.add_conversation_turn('user', NIVEA + '?!', 'b')
+        assert len(retriever.snapshot) == (2 if threshold is None else 1)
+        assert retriever.turn_store.duplicates['near'] == (0 if threshold is None else 1)
+
+def test_exclude_current_session(make_retriever):
+    retriever = make_retriever()
+    retriever.add_conversation_turn('user', NIVEA, 'current')
+    retriever.add_conversation_turn('user', NIVEA + ' please', 'other')
+    for exclude, sessions in ((False, {'current', 'other'}), (True, {'other'})):
+        result = retriever.retrieve_relevant_context(NIVEA, 'current', exclude)
+        assert {turn.session_id for turn in result.relevant_conversations} == sessions
+
+def test_session_exclusion_of_a_repeated_turn(make_retriever):
+    # A collapsed turn keeps the session of its first occurrence
+    for deduplicate, sessions in ((False, {'other'}), (True, set())):
+        retriever = make_retriever(deduplicate=deduplicate)
+        retriever.add_conversation_turn('user', NIVEA, 'current')
+        retriever.add_conversation_turn('user', NIVEA, 'other')
+        result = retriever.retrieve_relevant_context(NIVEA, 'current', True)
+        assert {turn.session_id for turn in result.relevant_conversations} == sessions
+        
+def test_max_age_of_a_repeated_turn(make_retriever):
+    # A collapsed turn keeps the timestamp of its first occurrence
+    old = (datetime.now() - timedelta(days=3)).isoformat()
+    for deduplicate, sessions in ((False, {'recent'}), (True, set())):
+        retriever = make_retriever(deduplicate=deduplicate)
+        retriever.add_conversation_turn('user', NIVEA, 'old', timestamp=old)
+        retriever.add_conversation_turn('user', NIVEA, 'recent')
+        result = retriever.retrieve_relevant_context(NIVEA, 'current', True, max_age=86400)
+        assert {turn.session_id for turn in result.relevant_conversations} == sessions
@@ -0,0 +1,65 @@
+"""Smoke run of every benchmark script with tiny sizes"""
+
+import os
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import ANN_SYSTEM_PATH, ROOT
+
+BENCHMARKS = ROOT / 'benchmarks'
+
+SMOKE_ARGS = {
+    'bench_lexical.py': ['--sizes', '200', '--queries', '5', '--k', '5'],
+    'bench_retrieval.py': ['--sizes', '200', '--queries', '5', '--loop-queries', '2'],
+    'bench_startup.py': ['--runs', '1', '--ann-system-path', str(ANN_SYSTEM_PATH)],
+    'bench_suite.py': ['--sessions', '4', '--turns', '4', '--products', '20', '--iterations', '3',
+                       '--cli-iterations', '1'],
+    'bench_turn_store.py': ['--capacity', '200', '--inserts', '100', '--dedup-capacities', '100',
+                            '--dedup-inserts', '20'],
+    'eval_quantization.py': ['--synthetic', '300', '--queries', '5'],
+    'eval_recall.py': ['--synthetic', '300', '--queries', '5'],
+    'load_test_recommend.py': ['--clients', '2', '--duration', '0.5'],  # --url added by the test
+}
+
+class _RecommendHandler(BaseHTTPRequestHandler):
+    """Stand-in for the ANN app's /recommend"""
+    
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = b'{"recommendations": []}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        
+    def log_message(self, format, *args):
+        pass
+
+def test_every_benchmark_has_smoke_args():
+    assert sorted(path.name for path in BENCHMARKS.glob('*.py')) == sorted(SMOKE_ARGS)
+
+@pytest.mark.parametrize('script', sorted(SMOKE_ARGS))
+def test_benchmark_runs(script):
+    args = list(SMOKE_ARGS[script])
+    server = None
+    if script == 'load_test_recommend.py':
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _RecommendHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        args += ['--url', f'http://127.0.0.1:{server.server_port}']
+    try:
+        result = subprocess.run(
+            [sys.executable, str(BENCHMARKS / script), *args],
+            cwd=ROOT, env={**os.environ, 'EMBEDDING_BACKEND': 'hashing'},
+            capture_output=True, text=True, timeout=300
+        )
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert result.stdout.strip()
@@ -0,0 +1,23 @@
+"""Traditional context fallback of the context bridge"""
+
+from modules import context_bridge
+from modules.conversation_log import ConversationLog
+
+def test_fallback_reuses_one_log_per_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'conversations.jsonl')
+    writer = ConversationLog(path)
+    writer.append('s', {'role': 'user', 'content': 'first', 'timestamp': '2024-01-01T00:00:00'})
+    opened = []
+    
+    class CountingLog(ConversationLog):
+        def __init__(self, *args, **kwargs):
+            opened.append(args)
+            super().__init__(*args, **kwargs)
+            
+    monkeypatch.setattr(context_bridge, 'ConversationLog', CountingLog)
+    monkeypatch.setattr(context_bridge, '_conversation_logs', {})
+    assert [m['content'] for m in context_bridge.load_traditional_context(path, 's')] == ['first']
+    writer.append('s', {'role': 'model', 'content': 'second', 'timestamp': '2024-01-01T00:00:01'})
+    # Caught up incrementally by the kept log, not reopened
+    assert [m['content'] for m in context_bridge.load_traditional_context(path, 's')] == ['first', 'second']
+    assert len(opened) == 1
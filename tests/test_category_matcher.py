@@ -0,0 +1,44 @@
+"""Category extraction from conversations (utils/category_matcher.py)"""
+
+import json
+
+from conftest import ANN_SYSTEM_PATH
+from utils.category_matcher import CategoryMatcher
+
+SYNONYMS_PATH = ANN_SYSTEM_PATH / 'data' / 'category_synonyms.json'
+
+def _matcher(categories):
+    return CategoryMatcher.from_file(categories, SYNONYMS_PATH)
+
+def _all_categories():
+    with open(SYNONYMS_PATH, encoding='utf-8') as f:
+        return list(json.load(f))
+
+def test_synonym_inside_a_longer_word_is_ignored():
+    sentence = "peux-tu me montrer une crème pour la peau"
+    assert _matcher(_all_categories()).extract([sentence]) == 'skincare'
+    # The shipped catalogue has no skincare products: no filter, not Electronics
+    assert _matcher(['Electronics', 'Fitness', 'Sportswear', 'food']).extract([sentence]) is None
+
+def test_whole_words_match_at_text_edges_and_punctuation():
+    matcher = _matcher(_all_categories())
+    assert matcher.extract(['shoes']) == 'Sportswear'
+    assert matcher.extract(['I need new headphones, please']) == 'Electronics'
+    assert matcher.extract(['skinny jeans']) is None
+    assert matcher.extract(['أريد شعر']) == 'haircare'
+    assert matcher.extract(['الشعراء']) is None
+
+def test_arabic_article_and_clitics_before_a_synonym():
+    matcher = _matcher(_all_categories())
+    assert matcher.extract(['الشعر جاف']) == 'haircare'
+    assert matcher.extract(['شامبو للشعر']) == 'haircare'
+    assert matcher.extract(['كريم للبشرة']) == 'skincare'
+    assert matcher.extract(['عندي مشكل في البشرة']) == 'skincare'
+    assert matcher.extract(['وبشرة جافة']) == 'skincare'
+    # A prefix is not any leading letters, and the word must still end
+    assert matcher.extract(['مبشرة']) is None
+    assert matcher.extract(['الشعراء']) is None
+
+def test_last_mentioned_category_wins():
+    matcher = _matcher(_all_categories())
+    assert matcher.extract(['running shoes', 'actually a yoga mat']) == 'Fitness'
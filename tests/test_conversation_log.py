@@ -0,0 +1,57 @@
+"""ConversationLog compaction with writers that do not take the file lock"""
+
+import json
+import os
+import threading
+
+from modules import conversation_log
+from modules.conversation_log import ConversationLog
+
+def _message(i):
+    return {'role': 'user', 'content': f'message {i}', 'timestamp': f'2024-01-01T00:00:{i:02d}'}
+
+def _unlocked_append(path, session_id, i):
+    """One write per record through the path, as the Node.js writer does"""
+    with open(path, 'ab') as f:
+        f.write((json.dumps({**_message(i), 'session_id': session_id}) + '\n').encode('utf-8'))
+
+def test_compact_keeps_live_messages(tmp_path):
+    log = ConversationLog(str(tmp_path / 'conversations.jsonl'))
+    log.append_many([('a', _message(i)) for i in range(3)] + [('b', _message(3))])
+    log.delete_session('b')
+    stats = log.compact(keep_last=2)
+    assert stats['messages'] == 2
+    assert log.sessions() == ['a']
+    assert [m['content'] for m in log.get_session('a')] == ['message 1', 'message 2']
+
+def test_compact_carries_over_appends_to_the_replaced_file(tmp_path, monkeypatch):
+    path = tmp_path / 'conversations.jsonl'
+    log = ConversationLog(str(path))
+    log.append_many([('a', _message(i)) for i in range(3)])
+    # Opened before the rename, written after compaction first read the old file
+    stale = open(path, 'ab')
+    replace = os.replace
+    
+    def replace_then_append(src, dst):
+        replace(src, dst)
+        
+        def write():
+            stale.write((json.dumps({**_message(3), 'session_id': 'a'}) + '\n').encode('utf-8'))
+            stale.close()
+            
+        threading.Timer(0.03, write).start()
+        
+    monkeypatch.setattr(conversation_log.os, 'replace', replace_then_append)
+    log.compact()
+    assert [m['content'] for m in log.get_session('a')] == [f'message {i}' for i in range(4)]
+
+def test_compact_with_a_concurrent_unlocked_writer(tmp_path):
+    path = tmp_path / 'conversations.jsonl'
+    log = ConversationLog(str(path))
+    count = 300
+    writer = threading.Thread(target=lambda: [_unlocked_append(path, 'a', i % 60) for i in range(count)])
+    writer.start()
+    while writer.is_alive():
+        log.compact()
+    log.compact()
+    assert len(log.get_session('a')) == count
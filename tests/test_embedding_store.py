@@ -0,0 +1,98 @@
+"""Persistent embedding store (utils/embedding_store.py)"""
+
+import threading
+
+import numpy as np
+
+from utils.embedding_store import EmbeddingStore
+
+def _vectors(count, dimension=8, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+
+def test_round_trip_after_flush(tmp_path):
+    store = EmbeddingStore(tmp_path, 'test-model')
+    texts = [f'text {i}' for i in range(10)]
+    vectors = _vectors(len(texts))
+    keys = [store.key(text) for text in texts]
+    store.put(keys, vectors)
+    store.flush()
+    
+    reopened = EmbeddingStore(tmp_path, 'test-model')
+    assert len(reopened) == len(texts)
+    found = reopened.lookup(keys[::-1])
+    np.testing.assert_array_equal(np.stack(found), vectors[::-1])
+    assert reopened.lookup([reopened.key('missing')]) == [None]
+    
+def test_model_name_is_part_of_the_key(tmp_path):
+    store = EmbeddingStore(tmp_path, 'test-model')
+    store.put([store.key('text')], _vectors(1))
+    store.flush()
+    other = EmbeddingStore(tmp_path, 'other-model')
+    assert other.lookup([other.key('text')]) == [None]
+    
+def test_get_embeddings_encodes_only_misses(tmp_path):
+    store = EmbeddingStore(tmp_path, 'test-model')
+    calls = []
+    
+    def encode(texts):
+        calls.append(list(texts))
+        return _vectors(len(texts), seed=len(calls))
+        
+    first = store.get_embeddings(['a', 'b'], encode)
+    second = store.get_embeddings(['b', 'c', 'a'], encode)
+    assert calls == [['a', 'b'], ['c']]
+    np.testing.assert_array_equal(second[0], first[1])
+    np.testing.assert_array_equal(second[2], first[0])
+    
+def test_background_flush_keeps_entries_visible(tmp_path):
+    store = EmbeddingStore(tmp_path, 'test-model', flush_every=64)
+    vectors = _vectors(1000)
+    keys = [store.key(f'text {i}') for i in range(len(vectors))]
+    errors = []
+    
+    def read(stored):
+        # Every entry put before must stay visible while flushes run
+        for _ in range(20):
+            found = store.lookup(keys[:stored])
+            if any(vector is None for vector in found):
+                errors.append(stored)
+                
+    for start in range(0, len(keys), 50):
+        store.put(keys[start:start + 50], vectors[start:start + 50])
+        reader = threading.Thread(target=read, args=(start + 50,))
+        reader.start()
+        reader.join()
+    store.close()
+    
+    assert errors == []
+    assert store._pending == {}
+    reopened = EmbeddingStore(tmp_path, 'test-model')
+    assert len(reopened) == len(keys)
+    np.testing.assert_array_equal(np.stack(reopened.lookup(keys)), vectors)
+    
+def test_lookup_during_a_flush_reads_one_file(tmp_path):
+    store = EmbeddingStore(tmp_path, 'test-model')
+    vectors = _vectors(200)
+    keys = [store.key(f'text {i}') for i in range(len(vectors))]
+    store.put(keys[::2], vectors[::2])
+    store.flush()
+    store.put(keys[1::2], vectors[1::2])
+    
+    class FlushOnRead:
+        """The mapped file; a flush merges the rest of the keys, shifting rows, as the lookup reads it"""
+        
+        def __init__(self, records):
+            self.records = records
+            
+        def __len__(self):
+            return len(self.records)
+            
+        def __getitem__(self, field):
+            if field == 'key' and store._pending:
+                store.flush()
+            return self.records[field]
+            
+    store._records = FlushOnRead(store._records)
+    found = store.lookup(keys[::2])
+    np.testing.assert_array_equal(np.stack(found), vectors[::2])
+    assert len(store._records) == len(keys)
@@ -0,0 +1,30 @@
+"""Incremental refresh of the Enhanced Context Manager"""
+
+import json
+import os
+
+from conftest import ANN_SYSTEM_PATH
+from modules.enhanced_context_manager import EnhancedContextManager
+
+def _write(path, messages, mtime):
+    path.write_text(json.dumps({'session': messages}), encoding='utf-8')
+    os.utime(path, (mtime, mtime))
+
+def test_refresh_compares_parsed_timestamps(tmp_path):
+    path = tmp_path / 'conversations.json'
+    first = {'role': 'user', 'content': 'do you sell sunscreen', 'timestamp': '2024-01-01T10:00:00Z'}
+    _write(path, [first], 1_700_000_000)
+    manager = EnhancedContextManager(conversations_path=str(path), ann_system_path=str(ANN_SYSTEM_PATH))
+    try:
+        assert len(manager.ann_retriever.snapshot) == 1
+        # Later than the first message, though it sorts before it as a string
+        later = {'role': 'model', 'content': 'yes, spf 50', 'timestamp': '2024-01-01T10:00:00.500Z'}
+        _write(path, [first, later], 1_700_000_100)
+        assert manager.refresh_conversations() == 1
+        # Earlier, written with an offset: sorts after both as a string
+        earlier = {'role': 'user', 'content': 'hello', 'timestamp': '2024-01-01T10:59:00+02:00'}
+        _write(path, [first, later, earlier], 1_700_000_200)
+        assert manager.refresh_conversations() == 0
+        assert len(manager.ann_retriever.snapshot) == 2
+    finally:
+        manager.ann_retriever._writer.shutdown()
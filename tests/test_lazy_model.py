@@ -0,0 +1,41 @@
+"""LazyModel retries failed loads with a backoff"""
+
+import time
+
+import pytest
+
+from utils.lazy_model import LazyModel
+
+class _Model:
+    def encode(self, texts):
+        return [[1.0, 0.0] for _ in texts]
+
+class _FlakyLoader:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+        
+    def __call__(self, model_name):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise OSError('model files not downloaded yet')
+        return _Model()
+
+def test_failed_load_is_retried_after_the_backoff():
+    loader = _FlakyLoader(failures=2)
+    model = LazyModel('flaky', loader=loader, requires=(), retry_backoff=0.05)
+    with pytest.raises(OSError):
+        model.get()
+    # Within the backoff the error is raised without another load
+    with pytest.raises(OSError):
+        model.get()
+    assert loader.calls == 1 and not model.available
+    time.sleep(0.06)
+    assert model.available
+    with pytest.raises(OSError):
+        model.get()
+    assert loader.calls == 2 and model.get_stats()['failures'] == 2
+    time.sleep(0.11)  # the backoff doubled
+    assert model.encode(['hello']).shape == (1, 2)
+    assert loader.calls == 3 and model.loaded
+    assert model.get_stats()['error'] is None
@@ -0,0 +1,36 @@
+"""Metrics registry shared by the chat side and the ANN system"""
+
+import gc
+
+import modules.metrics
+import utils.metrics
+from utils.metrics import MetricsRegistry
+
+class _Component:
+    def collect(self):
+        return [('component_value', 'gauge', 'A value', 1)]
+
+def _names(registry):
+    return [name for name, _, _, _ in registry.families()]
+
+def test_one_implementation():
+    assert modules.metrics.MetricsRegistry is MetricsRegistry
+    assert modules.metrics.REGISTRY is not utils.metrics.REGISTRY
+
+def test_bound_method_collectors_do_not_keep_their_object_alive():
+    registry = MetricsRegistry('stage_seconds')
+    component = _Component()
+    registry.register_collector('component', component.collect)
+    assert _names(registry) == ['component_value']
+    del component
+    gc.collect()
+    assert _names(registry) == []
+    assert registry._collectors == {}
+
+def test_unregister_collector():
+    registry = MetricsRegistry('stage_seconds')
+    registry.register_collector('constant', lambda: [('constant_value', 'gauge', 'A value', 1)])
+    assert _names(registry) == ['constant_value']
+    registry.unregister_collector('constant')
+    registry.unregister_collector('constant')
+    assert _names(registry) == []
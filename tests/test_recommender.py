@@ -0,0 +1,36 @@
+"""Catalogue reloads of the ANN recommendation system"""
+
+import json
+
+from models import recommender as recommender_module
+from models.recommender import Recommender
+from utils.boost_log import BoostLog
+
+def _product(product_id, description):
+    return {
+        'id': product_id, 'title': f'Product {product_id}', 'description': description,
+        'category': 'Skincare', 'popularity': 0.5, 'stock': 3, 'recency': 0.5, 'personal': 0.0,
+        'seller_boost': 0.0
+    }
+
+def test_boosts_compacted_during_a_reload_are_kept(tmp_path, monkeypatch):
+    products_path = tmp_path / 'products.json'
+    products_path.write_text(json.dumps([_product(1, 'cream'), _product(2, 'serum')]))
+    boost_log = BoostLog(products_path, compact_every=10 ** 6, compact_interval=3600)
+    recommender = Recommender(str(products_path), boost_log=boost_log)
+    recommender.update_seller_boost(1, 0.9)
+
+    # An edit to re-encode, then a compaction between reading the products and the swap
+    products_path.write_text(json.dumps([_product(1, 'cream'), _product(2, 'night serum')]))
+    get_embeddings = recommender_module.get_embeddings
+
+    def compact_then_encode(texts):
+        boost_log.compact()
+        return get_embeddings(texts)
+
+    monkeypatch.setattr(recommender_module, 'get_embeddings', compact_then_encode)
+    recommender.reload()
+    assert boost_log.compactions == 1
+    assert recommender.products[0]['seller_boost'] == 0.9
+    assert recommender.catalogue.seller_boost[0] == 0.9
+    recommender.close()
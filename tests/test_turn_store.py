@@ -0,0 +1,64 @@
+"""TurnStore snapshots and segment indexes"""
+
+import threading
+
+import numpy as np
+
+from modules.turn_store import TurnStore
+from modules.vector_index import IVFIndex
+
+TIMESTAMP = '2024-01-01T00:00:00'
+
+def _vectors(count, dimension=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+
+def test_snapshot_is_isolated_from_concurrent_writes():
+    store = TurnStore(64)
+    vectors = _vectors(2000)
+    for i in range(64):
+        store.add('user', f'turn {i}', TIMESTAMP, f'session {i % 4}', vectors[i])
+    snapshot = store.snapshot
+    turns = dict(snapshot.iter_turns())
+    results = [snapshot.search(vectors[i], 5) for i in range(8)]
+    
+    def write():
+        # Evicts every turn the snapshot holds, many times over
+        for i in range(64, len(vectors)):
+            store.add('user', f'turn {i}', TIMESTAMP, f'session {i % 4}', vectors[i])
+            
+    writer = threading.Thread(target=write)
+    writer.start()
+    while writer.is_alive():
+        assert len(snapshot) == 64
+        assert dict(snapshot.iter_turns()) == turns
+        for i, (ids, scores) in enumerate(results):
+            found_ids, found_scores = snapshot.search(vectors[i], 5)
+            assert np.array_equal(found_ids, ids) and np.allclose(found_scores, scores)
+    writer.join()
+    assert len(store.snapshot) == 64
+    assert not set(turns) & set(dict(store.snapshot.iter_turns()))
+
+def test_ivf_segments_share_a_quantizer_trained_off_the_writer(monkeypatch):
+    training_threads = []
+    train_quantizer = IVFIndex.train_quantizer
+    
+    def record(self, *args, **kwargs):
+        training_threads.append(threading.current_thread())
+        return train_quantizer(self, *args, **kwargs)
+        
+    monkeypatch.setattr(IVFIndex, 'train_quantizer', record)
+    store = TurnStore(10000, index_backend='ivf', index_params={'min_train_size': 64, 'retrain_growth': None})
+    vectors = _vectors(600)
+    for i in range(300):
+        store.add('user', f'turn {i}', TIMESTAMP, 'session', vectors[i])
+    if store._trainer is not None:
+        store._trainer.join()
+    for i in range(300, 600):
+        store.add('user', f'turn {i}', TIMESTAMP, 'session', vectors[i])
+        
+    assert len(training_threads) == 1
+    assert training_threads[0] is not threading.current_thread()
+    indexes = [segment.index for segment in store.snapshot.segments if isinstance(segment.index, IVFIndex)]
+    assert indexes and all(index._centroids is store._centroids for index in indexes)
+    ids, _ = store.snapshot.search(vectors[500], 1)
+    assert store.snapshot.get(int(ids[0]))[1] == 'turn 500'
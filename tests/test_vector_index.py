@@ -0,0 +1,17 @@
+"""Vector index backends"""
+
+import numpy as np
+import pytest
+
+from modules.vector_index import ExactIndex, IVFIndex, VectorIndex
+
+def test_backends_implement_the_whole_interface():
+    ExactIndex()
+    IVFIndex()
+    
+    class SearchOnly(VectorIndex):
+        def search(self, query, k):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            
+    with pytest.raises(TypeError):
+        SearchOnly()